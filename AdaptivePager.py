@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+自适应翻页搜索
+- 先取第1页；只有第1页的邮箱/联系指示比例足够高的查询才继续翻页
+- 后续页面并发请求（每批DISCOVERY_PARALLEL_PAGES页），最多DISCOVERY_MAX_PAGES页
+- 每页统计新增（未见过的URL）结果比例，边际新增率低于阈值时停止翻页
+- 翻页日志交给调用方的log回调（默认写入logging），不直接print到stdout，不污染调用方的机器可读输出
+有效的查询能拿到更多唯一结果，而不是被放弃后再花一次LLM调用生成新查询
+"""
+
+import os
+import logging
+import threading
+import concurrent.futures
+
+
+class AdaptivePager:
+    # 与各引擎搜索结果质量分析一致的联系指示词
+    CONTACT_WORDS = ['contact', 'email', 'reach']
+
+    def __init__(self, fetch_page, max_pages=None, parallel_pages=None, min_indicator_rate=0.2, min_new_rate=0.3,
+                 log=None):
+        if max_pages is None:
+            max_pages = int(os.environ.get('DISCOVERY_MAX_PAGES', '4'))
+        if parallel_pages is None:
+            parallel_pages = int(os.environ.get('DISCOVERY_PARALLEL_PAGES', '2'))
+        self.fetch_page = fetch_page  # (query, pageno, **fetch_params) -> 结果列表
+        self.max_pages = max(1, max_pages)
+        self.parallel_pages = max(1, parallel_pages)
+        self.min_indicator_rate = min_indicator_rate
+        self.min_new_rate = min_new_rate
+        self.log = log or logging.getLogger(__name__).info  # message -> None
+
+        self.lock = threading.Lock()
+        self.stats = {'queries': 0, 'deep_queries': 0, 'pages': 0, 'results': 0, 'stop_reasons': {}}
+
+    def indicator_rate(self, results):
+        """含@或联系指示词的结果比例"""
+        if not results:
+            return 0.0
+        hits = 0
+        for result in results:
+            text = f"{result.get('title', '')} {result.get('content', '')}".lower()
+            if '@' in text or any(word in text for word in self.CONTACT_WORDS):
+                hits += 1
+        return hits / len(results)
+
+    def search(self, query, start_page=1, **fetch_params):
+        """翻页搜索，返回 (去重后的结果, 翻页信息)；fetch_params（如time_range）原样传给每一页的请求"""
+        first = self.fetch_page(query, start_page, **fetch_params) or []
+        rate = self.indicator_rate(first)
+        info = {'pages': [start_page], 'last_page': start_page, 'indicator_rate': round(rate, 2),
+                'new_rates': [], 'stop_reason': None}
+
+        seen = set()
+        merged = []
+        self.merge(first, seen, merged)
+
+        if not first:
+            info['stop_reason'] = 'empty'
+        elif self.max_pages == 1:
+            info['stop_reason'] = 'max_pages'
+        elif rate < self.min_indicator_rate:
+            info['stop_reason'] = 'low_indicators'
+        else:
+            info['stop_reason'] = self.fetch_more(query, start_page, len(first), seen, merged, info, fetch_params)
+            self.log(f"      📄 翻页{len(info['pages'])}页: 共{len(merged)}个唯一结果 "
+                  f"(新增率{info['new_rates']}, 停止: {info['stop_reason']})")
+
+        with self.lock:
+            self.stats['queries'] += 1
+            self.stats['deep_queries'] += len(info['pages']) > 1
+            self.stats['pages'] += len(info['pages'])
+            self.stats['results'] += len(merged)
+            reasons = self.stats['stop_reasons']
+            reasons[info['stop_reason']] = reasons.get(info['stop_reason'], 0) + 1
+        return merged, info
+
+    def fetch_more(self, query, start_page, page_size, seen, merged, info, fetch_params):
+        """按批并发请求后续页面，返回停止原因"""
+        next_page = start_page + 1
+        last_allowed = start_page + self.max_pages - 1
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.parallel_pages) as executor:
+            while next_page <= last_allowed:
+                pages = list(range(next_page, min(next_page + self.parallel_pages, last_allowed + 1)))
+                batches = list(executor.map(lambda page: self.fetch_page(query, page, **fetch_params) or [], pages))
+                next_page += len(pages)
+
+                stop_reason = None
+                for page, results in zip(pages, batches):
+                    # 同批已请求的页面仍然合并（请求成本已经付出），但不再继续翻页
+                    new_count = self.merge(results, seen, merged)
+                    info['pages'].append(page)
+                    if results:
+                        info['last_page'] = page  # 最后一个有结果的页，游标从其后继续
+                    new_rate = new_count / page_size
+                    info['new_rates'].append(round(new_rate, 2))
+                    if not results:
+                        stop_reason = stop_reason or 'empty'
+                    elif new_rate < self.min_new_rate:
+                        stop_reason = stop_reason or 'diminishing'
+                if stop_reason:
+                    return stop_reason
+        return 'max_pages'
+
+    @staticmethod
+    def merge(results, seen, merged):
+        """合并未见过的URL，返回新增数量"""
+        added = 0
+        for result in results:
+            url = result.get('url')
+            if url and url in seen:
+                continue
+            if url:
+                seen.add(url)
+            merged.append(result)
+            added += 1
+        return added
+
+    def summary(self):
+        """返回翻页统计"""
+        with self.lock:
+            stats = dict(self.stats, stop_reasons=dict(self.stats['stop_reasons']))
+        stats['avg_pages'] = round(stats['pages'] / stats['queries'], 2) if stats['queries'] else None
+        return stats
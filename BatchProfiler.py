@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+批量用户画像生成器
+- 一次提示词打包N条邮箱记录，要求模型返回JSON数组（每条记录一个对象）
+- 逐条校验返回的对象，只对校验失败的记录重新请求
+- 按num_ctx估算输入+输出token，自动划分批次
+- 通过Ollama的format传入数组schema做约束解码
+- 固定的生成要求放在system提示词中，各批次共享同一前缀，Ollama可复用已计算的KV缓存
+- 提供router时每个批次按延迟目标选模型，负载过高时该批次跳过（由调用方回退到模板）；
+  有截止时间时模型仍在预热则在剩余时间内等待，而不是直接跳过
+50个潜在客户只需几次LLM调用，而不是50次调用加50秒等待
+"""
+
+import json
+import time
+
+from OllamaClient import OllamaError
+
+
+class BatchProfiler:
+    # 粗略估算：平均每个token约3个字符（英文约4个，中文更少，取保守值）
+    CHARS_PER_TOKEN = 3
+
+    def __init__(self, ollama, model, fields, instructions, num_ctx=4096, max_batch_size=10,
+                 tokens_per_profile=150, max_repair_rounds=2, temperature=0.3, timeout=180,
+                 router=None, task='profile'):
+        self.ollama = ollama
+        self.model = model
+        self.router = router  # ModelRouter，为None时固定使用model
+        self.task = task
+        self.fields = fields  # 字段名 -> 类型（str / list / float）
+        self.instructions = instructions
+        self.num_ctx = num_ctx
+        self.max_batch_size = max_batch_size
+        self.tokens_per_profile = tokens_per_profile
+        self.max_repair_rounds = max_repair_rounds
+        self.temperature = temperature
+        self.timeout = timeout
+
+        self.stats = {'llm_calls': 0, 'records': 0, 'profiled': 0, 'repaired': 0, 'failed': 0, 'degraded_batches': 0}
+
+    def estimate_tokens(self, text):
+        return len(text) // self.CHARS_PER_TOKEN + 1
+
+    def plan_batches(self, items):
+        """按上下文窗口划分批次：输入记录 + 预计输出 不超过num_ctx的90%"""
+        budget = (int(self.num_ctx * 0.9) - self.estimate_tokens(self.system_prompt())
+                  - self.estimate_tokens(self.build_prompt([])))
+        batches = []
+        batch, used = [], 0
+        for item in items:
+            cost = self.estimate_tokens(json.dumps(item, ensure_ascii=False)) + self.tokens_per_profile
+            if batch and (used + cost > budget or len(batch) >= self.max_batch_size):
+                batches.append(batch)
+                batch, used = [], 0
+            batch.append(item)
+            used += cost
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def record_schema(self, email=None):
+        """单条画像的JSON Schema（指定email时固定为该邮箱）"""
+        kinds = {
+            str: {'type': 'string', 'minLength': 1},
+            list: {'type': 'array', 'items': {'type': 'string'}, 'minItems': 1},
+            float: {'type': 'number'}
+        }
+        properties = {'email': {'type': 'string', 'enum': [email]} if email else {'type': 'string'}}
+        properties.update({name: kinds[kind] for name, kind in self.fields.items()})
+        return {'type': 'object', 'properties': properties, 'required': list(properties)}
+
+    def batch_schema(self, count):
+        """批量输出的数组schema：count个带id的画像对象"""
+        item = self.record_schema()
+        item['properties'] = {'id': {'type': 'integer'}, **item['properties']}
+        item['required'] = ['id'] + item['required']
+        return {'type': 'array', 'items': item, 'minItems': count, 'maxItems': count}
+
+    def system_prompt(self):
+        """固定的批量画像要求（所有批次相同，作为可复用的前缀）"""
+        placeholders = {str: '"..."', list: '["...", "..."]', float: '0.0'}
+        schema = ', '.join(f'"{name}": {placeholders.get(kind, "...")}' for name, kind in self.fields.items())
+
+        return f"""{self.instructions}
+
+The user sends records as one JSON object per line.
+Return ONLY a JSON array with one object per record, copying each record's "id" and "email":
+[{{"id": 0, "email": "...", {schema}}}]
+
+No explanations, no markdown."""
+
+    def build_prompt(self, items):
+        """构建批量画像提示词（只包含本批次的记录）"""
+        records = '\n'.join(json.dumps(item, ensure_ascii=False) for item in items)
+
+        return f"""Records (one JSON object per line):
+{records}
+
+Return exactly {len(items)} objects:"""
+
+    @staticmethod
+    def parse_array(text):
+        """从模型输出中提取JSON数组"""
+        start, end = text.find('['), text.rfind(']') + 1
+        if start != -1 and end > start:
+            try:
+                data = json.loads(text[start:end])
+                if isinstance(data, list):
+                    return data
+            except ValueError:
+                pass
+
+        # 部分模型会包一层对象，例如 {"profiles": [...]}，或者只返回单个对象
+        start, end = text.find('{'), text.rfind('}') + 1
+        if start != -1 and end > start:
+            try:
+                data = json.loads(text[start:end])
+            except ValueError:
+                return []
+            if isinstance(data, dict):
+                for value in data.values():
+                    if isinstance(value, list):
+                        return value
+                return [data]
+        return []
+
+    def validate(self, element, items_by_id, items_by_email):
+        """校验单个返回对象，返回 (记录id, 画像) 或 None"""
+        if not isinstance(element, dict):
+            return None
+
+        try:
+            record_id = int(element.get('id'))
+        except (TypeError, ValueError):
+            record_id = None
+        email = str(element.get('email', '')).strip().lower()
+        item = items_by_id.get(record_id) or items_by_email.get(email)
+        if not item or (email and email != item['email'].lower()):
+            return None
+
+        profile = {'email': item['email']}
+        for name, kind in self.fields.items():
+            value = element.get(name)
+            if kind is float:
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    return None
+                value = float(value)
+            elif kind is list:
+                if not isinstance(value, list) or not value:
+                    return None
+            elif not isinstance(value, str) or not value.strip():
+                return None
+            profile[name] = value
+        return item['id'], profile
+
+    def run_batch(self, batch, fresh, timeout=None, wait=False):
+        """请求一个批次，返回 {记录id: 画像}（仅包含校验通过的记录）
+        wait=True时模型仍在预热则在timeout内等待，等待时间计入timeout"""
+        model = self.model
+        if self.router:
+            started_at = time.time()
+            model = self.router.route(self.task, wait=timeout if wait else None)
+            if wait and timeout:
+                timeout -= time.time() - started_at
+                if timeout <= 0:
+                    model = None
+            if model is None:
+                self.stats['degraded_batches'] += 1
+                print(f"      ⚠️  所有画像模型都无法满足延迟目标，本批次使用模板")
+                return {}
+
+        self.stats['llm_calls'] += 1
+        options = {
+            'temperature': self.temperature,
+            'num_ctx': self.num_ctx,
+            'num_predict': self.tokens_per_profile * len(batch)
+        }
+        try:
+            text = self.ollama.generate(model, self.build_prompt(batch), options=options,
+                                        system=self.system_prompt(), format=self.batch_schema(len(batch)),
+                                        timeout=timeout or self.timeout,
+                                        fresh=fresh, priority='bulk')
+        except OllamaError as e:
+            print(f"      ⚠️  批量画像请求失败: {e}")
+            return {}
+
+        items_by_id = {item['id']: item for item in batch}
+        items_by_email = {item['email'].lower(): item for item in batch}
+        profiles = {}
+        for element in self.parse_array(text):
+            validated = self.validate(element, items_by_id, items_by_email)
+            if validated and validated[0] not in profiles:
+                profiles[validated[0]] = validated[1]
+        return profiles
+
+    def profile(self, records, on_profile=None, deadline_at=None):
+        """为一组记录生成画像，返回与records等长的列表（失败的位置为None）
+
+        每条记录必须包含email字段，其余字段原样提供给模型作为上下文。
+        on_profile(index, profile) 在每个批次校验通过后立即回调；
+        deadline_at 为截止时间戳，到期后不再发起新的批次。
+        """
+        items = [{'id': i, **record} for i, record in enumerate(records)]
+        results = [None] * len(records)
+        pending = items
+        self.stats['records'] += len(records)
+
+        for attempt in range(self.max_repair_rounds + 1):
+            if not pending:
+                break
+            batches = self.plan_batches(pending)
+            print(f"   🧠 批量画像: {len(pending)}条记录 → {len(batches)}次LLM调用"
+                  + (f" (第{attempt}次补问)" if attempt else ""))
+
+            for batch in batches:
+                timeout = None
+                if deadline_at is not None:
+                    timeout = min(self.timeout, deadline_at - time.time())
+                    if timeout <= 0:
+                        break
+                # 补问时同样的提示词可能已缓存了无效输出，需要新采样
+                for record_id, profile in self.run_batch(batch, fresh=attempt > 0, timeout=timeout,
+                                                          wait=deadline_at is not None).items():
+                    results[record_id] = profile
+                    if attempt:
+                        self.stats['repaired'] += 1
+                    if on_profile:
+                        on_profile(record_id, profile)
+
+            pending = [item for item in pending if results[item['id']] is None]
+
+        self.stats['profiled'] += sum(1 for profile in results if profile)
+        self.stats['failed'] += len(pending)
+        return results
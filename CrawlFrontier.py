@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+全局最优优先爬取前沿
+- 所有策略、所有轮次共享同一个待爬取URL优先队列
+- 按URL关键词、搜索摘要信号（@符号、联系指示词）和域名历史产出打分
+- 提供ranker（ResultRanker）时，每批结果的标题和摘要一次性做向量化相关性打分并计入分数
+- 每次取出当前价值最高的URL，受全局抓取预算约束
+"""
+
+import os
+import heapq
+import itertools
+from urllib.parse import urlparse
+
+
+class CrawlFrontier:
+    # URL路径关键词权重：越可能包含个人联系方式的页面分越高
+    URL_TOKEN_WEIGHTS = {
+        'contact': 3.0, 'team': 2.5, 'people': 2.5, 'staff': 2.5, 'leadership': 2.5,
+        'about': 2.0, 'founder': 2.0, 'management': 2.0, 'directory': 1.0,
+        'press': 1.5, 'media': 1.0, 'speaker': 1.0, 'author': 1.0,
+        'login': -2.0, 'signup': -2.0, 'register': -2.0, 'cart': -2.0,
+        'privacy': -2.0, 'terms': -2.0, 'careers': -1.5, 'jobs': -1.5,
+        'news': -1.0, 'blog': -0.5, 'tag': -1.0, 'search': -1.0, '.pdf': -1.0
+    }
+    CONTACT_WORDS = ['contact', 'email', 'reach']
+
+    def __init__(self, domain_memory=None, fetch_budget=None, ranker=None, known_emails=None):
+        self.domain_memory = domain_memory
+        self.known_emails = known_emails  # 当前活动已返回的邮箱，域名记忆据此判断已产出的域名是否还值得爬取
+        self.ranker = ranker
+        if fetch_budget is None:
+            fetch_budget = int(os.environ.get('DISCOVERY_FETCH_BUDGET', '0')) or None
+        self.fetch_budget = fetch_budget  # None表示不限制
+        self.fetched = 0
+        self.skipped = 0  # 被域名记忆跳过的URL数
+
+        self.heap = []
+        self.pending = {}  # url -> 条目，堆中失效条目通过比对分数跳过
+        self.visited = set()
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def remaining_budget(self):
+        if self.fetch_budget is None:
+            return None
+        return max(0, self.fetch_budget - self.fetched)
+
+    def score(self, site, rank=0, total=1, relevance=0.0):
+        """估算URL产出新个人邮箱的价值"""
+        url = site.get('url', '')
+        parsed = urlparse(url)
+        path = (parsed.path + '?' + parsed.query).lower()
+
+        score = relevance
+        for token, weight in self.URL_TOKEN_WEIGHTS.items():
+            if token in path:
+                score += weight
+
+        # 搜索摘要信号（与search_with_advanced_logging中的质量分析一致）
+        text = f"{site.get('title', '')} {site.get('content', '')}".lower()
+        if '@' in text:
+            score += 3.0
+        if any(word in text for word in self.CONTACT_WORDS):
+            score += 1.0
+
+        # 搜索引擎排名靠前的结果略微加分
+        if total > 0:
+            score += 1.0 - rank / total
+
+        # 域名历史：平均每页产出邮箱越多越优先，近期失败的降级
+        if self.domain_memory:
+            stats = self.domain_memory.domain_stats(url)
+            if stats and stats['pages_fetched']:
+                score += min(3.0, 2.0 * stats['emails_found'] / stats['pages_fetched'])
+            decision, _ = self.domain_memory.decide(url, self.known_emails)
+            if decision == 'deprioritize':
+                score -= 2.0
+
+        return score
+
+    def push(self, site, rank=0, total=1, relevance=0.0, **meta):
+        """加入一个候选URL，返回是否入队（已访问或被域名记忆跳过的不入队）"""
+        url = site.get('url')
+        if not url or url in self.visited:
+            return False
+        if self.domain_memory:
+            decision, _ = self.domain_memory.decide(url, self.known_emails)
+            if decision == 'skip':
+                self.visited.add(url)
+                self.skipped += 1
+                return False
+
+        score = self.score(site, rank, total, relevance)
+        existing = self.pending.get(url)
+        if existing:
+            # 被多个查询命中的URL小幅加分，保留首次发现时的来源信息
+            score = max(score, existing['score']) + 0.5
+            meta = existing['meta']
+
+        entry = {
+            'url': url,
+            'title': site.get('title', ''),
+            'content': site.get('content', ''),
+            'score': score,
+            'relevance': relevance,
+            'meta': meta
+        }
+        self.pending[url] = entry
+        heapq.heappush(self.heap, (-score, next(self.counter), url))
+        return True
+
+    def push_results(self, results, **meta):
+        """把一批搜索结果按排名加入前沿，返回入队数量"""
+        relevance = self.ranker.relevance(results) if self.ranker else [0.0] * len(results)
+        return sum(self.push(result, rank, len(results), float(relevance[rank]), **meta)
+                   for rank, result in enumerate(results))
+
+    def pop(self, count):
+        """取出价值最高的count个URL（受全局抓取预算约束）"""
+        budget = self.remaining_budget()
+        if budget is not None:
+            count = min(count, budget)
+
+        sites = []
+        while self.heap and len(sites) < count:
+            neg_score, _, url = heapq.heappop(self.heap)
+            entry = self.pending.get(url)
+            if not entry or entry['score'] != -neg_score:
+                continue  # 失效条目
+            del self.pending[url]
+            self.visited.add(url)
+            sites.append(entry)
+
+        self.fetched += len(sites)
+        return sites
+
+    def pending_sites(self, limit=None):
+        """按分数从高到低返回未访问的URL"""
+        sites = sorted(self.pending.values(), key=lambda e: e['score'], reverse=True)
+        return sites[:limit] if limit else sites
+
+    def to_state(self):
+        """导出状态，用于任务检查点"""
+        return {
+            'pending': self.pending_sites(),
+            'visited': list(self.visited),
+            'fetched': self.fetched,
+            'fetch_budget': self.fetch_budget
+        }
+
+    def load_state(self, state):
+        """从检查点恢复（重新打分以反映最新域名历史）"""
+        self.visited = set(state.get('visited', []))
+        self.fetched = state.get('fetched', 0)
+        self.fetch_budget = state.get('fetch_budget', self.fetch_budget)
+        for site in state.get('pending', []):
+            self.push(site, relevance=site.get('relevance', 0.0), **site.get('meta', {}))
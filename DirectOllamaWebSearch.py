@@ -19,11 +19,14 @@ from datetime import datetime
 from urllib.parse import quote, unquote
 from bs4 import BeautifulSoup
 import random
+from OllamaClient import get_ollama_client
+from ToolAgentLoop import ToolAgentLoop
 
 class DirectOllamaWebSearch:
     def __init__(self):
         # 本地Ollama配置
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
         
         # 搜索会话配置
         self.session = requests.Session()
@@ -346,100 +349,11 @@ class DirectOllamaWebSearch:
                 }
             ]
             
-            # 第一次调用Ollama
-            response = requests.post(f"{self.ollama_url}/api/chat", json={
-                'model': model,
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                'tools': tools,
-                'stream': False,
-                'options': {
-                    'temperature': 0.7,
-                    'num_ctx': 4096
-                }
-            }, timeout=60)
-            
-            if response.status_code == 200:
-                data = response.json()
-                message = data.get('message', {})
-                
-                # 检查是否有工具调用
-                tool_calls = message.get('tool_calls', [])
-                
-                if tool_calls:
-                    print(f"   🛠️  Ollama请求进行{len(tool_calls)}次网络搜索")
-                    
-                    # 执行网络搜索
-                    tool_results = []
-                    for i, tool_call in enumerate(tool_calls):
-                        function_name = tool_call['function']['name']
-                        arguments = tool_call['function']['arguments']
-                        
-                        print(f"      🔧 执行搜索 {i+1}: {function_name}")
-                        
-                        if function_name == 'web_search_emails':
-                            result = self.web_search_and_extract_emails(**arguments)
-                            tool_results.append({
-                                'tool_call_id': tool_call.get('id', f'call_{i}'),
-                                'function_name': function_name,
-                                'result': result
-                            })
-                        
-                        # 搜索间隔
-                        time.sleep(3)
-                    
-                    # 将搜索结果发送回Ollama
-                    if tool_results:
-                        print(f"   🧠 将搜索结果发送回Ollama进行分析...")
-                        
-                        messages = [
-                            {'role': 'user', 'content': prompt},
-                            message,
-                        ]
-                        
-                        # 添加工具结果
-                        for tool_result in tool_results:
-                            messages.append({
-                                'role': 'tool',
-                                'content': json.dumps(tool_result['result'], ensure_ascii=False),
-                                'tool_call_id': tool_result['tool_call_id']
-                            })
-                        
-                        # 最终调用
-                        final_response = requests.post(f"{self.ollama_url}/api/chat", json={
-                            'model': model,
-                            'messages': messages,
-                            'stream': False,
-                            'options': {
-                                'temperature': 0.3,
-                                'num_ctx': 4096
-                            }
-                        }, timeout=60)
-                        
-                        if final_response.status_code == 200:
-                            final_data = final_response.json()
-                            final_message = final_data.get('message', {})
-                            
-                            return {
-                                'success': True,
-                                'response': final_message.get('content', ''),
-                                'tool_calls': tool_calls,
-                                'tool_results': tool_results
-                            }
-                
-                # 没有工具调用的普通响应
-                return {
-                    'success': True,
-                    'response': message.get('content', ''),
-                    'tool_calls': [],
-                    'tool_results': []
-                }
-            else:
-                return {'success': False, 'error': f'Ollama API error: {response.status_code}'}
+            # 多轮Agent循环：同一轮的多个搜索并发执行，搜索结果按token预算压缩后回传
+            agent = ToolAgentLoop(self.ollama, model, tools, {
+                'web_search_emails': self.web_search_and_extract_emails
+            }, options={'temperature': 0.7}, final_options={'temperature': 0.3}, timeout=60, max_workers=3)
+            return agent.run(prompt)
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+长时间邮箱发现任务的检查点
+- 定期把任务状态（轮次、已完成策略、候选邮箱、验证结果、统计）写入磁盘
+  （策略间最多每DISCOVERY_CHECKPOINT_INTERVAL秒写一次，轮次结束和完成时强制写入）
+- 按job_id恢复：崩溃、部署或超时后重启的worker从最后一个检查点继续
+- 保留策略：超过DISCOVERY_CHECKPOINT_TTL_HOURS的检查点和超出DISCOVERY_CHECKPOINT_MAX_FILES的最旧检查点被清理；
+  自动生成job_id的任务完成后删除检查点（结果已直接返回）
+"""
+
+import os
+import json
+import time
+import uuid
+
+
+class DiscoveryCheckpoint:
+    def __init__(self, cache_dir, job_id=None, min_interval=None, ttl_hours=None, max_files=None):
+        self.checkpoint_dir = os.path.join(cache_dir, 'checkpoints')
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self.auto_generated = not job_id  # 调用方未提供job_id
+        self.job_id = job_id or self.new_job_id()
+        self.checkpoint_file = os.path.join(self.checkpoint_dir, f'{self.job_id}.json')
+        if min_interval is None:
+            min_interval = float(os.environ.get('DISCOVERY_CHECKPOINT_INTERVAL', '30'))
+        self.min_interval = min_interval  # 两次检查点之间的最短间隔（秒），force=True时忽略
+        self.last_saved = 0
+        if ttl_hours is None:
+            ttl_hours = float(os.environ.get('DISCOVERY_CHECKPOINT_TTL_HOURS', '72'))
+        if max_files is None:
+            max_files = int(os.environ.get('DISCOVERY_CHECKPOINT_MAX_FILES', '200'))
+        self.sweep(ttl_hours * 3600, max_files)
+
+    def sweep(self, ttl, max_files):
+        """清理过期检查点，并只保留最新的max_files个（当前任务的检查点不清理），返回清理数量"""
+        now = time.time()
+        try:
+            files = []
+            for name in os.listdir(self.checkpoint_dir):
+                path = os.path.join(self.checkpoint_dir, name)
+                if path == self.checkpoint_file or not name.endswith(('.json', '.tmp')):
+                    continue
+                files.append((os.path.getmtime(path), path))
+        except OSError:
+            return 0
+
+        files.sort(reverse=True)
+        removed = 0
+        for index, (mtime, path) in enumerate(files):
+            if now - mtime > ttl or index >= max_files:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    @staticmethod
+    def new_job_id():
+        """生成新的任务ID"""
+        return f"{time.strftime('%Y%m%d%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def exists(self):
+        return os.path.exists(self.checkpoint_file)
+
+    def load(self):
+        """加载检查点，不存在或损坏时返回None"""
+        if not self.exists():
+            return None
+        try:
+            with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def save(self, state, force=False):
+        """原子写入检查点，返回是否实际写入"""
+        now = time.time()
+        if not force and now - self.last_saved < self.min_interval:
+            return False
+
+        data = dict(state)
+        data['job_id'] = self.job_id
+        data['checkpointed_at'] = now
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.checkpoint_file)
+        self.last_saved = now
+        return True
+
+    def delete(self):
+        """删除检查点（自动生成job_id的任务完成后调用）"""
+        try:
+            os.remove(self.checkpoint_file)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+按活动(session_id)持久化的邮箱发现游标
+- 记录策略进度（策略轮次 + 轮内策略序号）
+- 记录每个查询下一次应请求的SearxNG页码
+- 保存尚未访问的候选URL（爬取前沿）
+- 保存已发现但尚未返回的候选邮箱（储备）
+"再要N个"的请求从上次停下的位置继续，而不是从第1轮重新开始
+"""
+
+import os
+import json
+import time
+import hashlib
+
+
+class DiscoveryCursor:
+    def __init__(self, cache_dir, industry, session_id, max_frontier=200, max_reserve=500):
+        industry_hash = hashlib.md5(industry.lower().strip().encode()).hexdigest()[:12]
+        session_hash = hashlib.md5(str(session_id).encode()).hexdigest()[:8]
+        self.cursor_file = os.path.join(cache_dir, f'discovery_cursor_{industry_hash}_{session_hash}.json')
+        self.max_frontier = max_frontier
+        self.max_reserve = max_reserve
+
+        self.strategy_round = 1
+        self.strategy_index = 0
+        self.query_pages = {}
+        self.frontier = []
+        self.reserve = []
+        self.resumed = self.load()
+
+    def load(self):
+        """加载游标，返回是否存在历史游标"""
+        if not os.path.exists(self.cursor_file):
+            return False
+        try:
+            with open(self.cursor_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.strategy_round = data.get('strategy_round', 1)
+            self.strategy_index = data.get('strategy_index', 0)
+            self.query_pages = data.get('query_pages', {})
+            self.frontier = data.get('frontier', [])
+            self.reserve = data.get('reserve', [])
+            return True
+        except Exception:
+            return False
+
+    def save(self):
+        """原子写入游标"""
+        data = {
+            'strategy_round': self.strategy_round,
+            'strategy_index': self.strategy_index,
+            'query_pages': self.query_pages,
+            'frontier': self.frontier[:self.max_frontier],
+            'reserve': self.reserve[:self.max_reserve],
+            'updated_at': time.time()
+        }
+        tmp_file = self.cursor_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.cursor_file)
+
+    def set_position(self, strategy_round, strategy_index):
+        """记录当前策略位置（strategy_index为下一个待执行的策略序号）"""
+        self.strategy_round = strategy_round
+        self.strategy_index = strategy_index
+
+    def next_page(self, query):
+        """返回该查询下一次应请求的页码"""
+        return self.query_pages.get(query, 1)
+
+    def advance_page(self, query, pages=1):
+        """该查询的当前页（翻页时为连续pages页）已处理，下次请求其后一页"""
+        self.query_pages[query] = self.next_page(query) + pages
+
+    def set_frontier(self, sites):
+        """保存全局爬取前沿中尚未访问的URL（按价值从高到低）"""
+        self.frontier = [
+            {'url': site['url'], 'title': site.get('title', ''), 'content': site.get('content', '')}
+            for site in sites[:self.max_frontier]
+        ]
+
+    def take_reserve(self, returned_emails):
+        """取出储备中尚未返回过的候选邮箱"""
+        reserve = [e for e in self.reserve if e['email'] not in returned_emails]
+        self.reserve = []
+        return reserve
+
+    def set_reserve(self, candidates, returned_emails):
+        """保存本次未返回的候选邮箱，供下次请求直接使用"""
+        seen = set(returned_emails)
+        self.reserve = []
+        for candidate in candidates:
+            if candidate['email'] not in seen:
+                self.reserve.append(candidate)
+                seen.add(candidate['email'])
+        del self.reserve[self.max_reserve:]
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+域名爬取记忆（带负缓存）
+- 持久化记录每个域名的最近爬取时间、抓取页数、发现邮箱数和失败原因
+- 近期爬过且所有已抓取页面都无产出的域名在TTL内直接跳过（负缓存）
+- 近期已产出邮箱的域名，只有当这些邮箱都已返回给当前活动时才在TTL内跳过（会被全部丢弃）；
+  记忆在所有活动间共享，其他活动从未见过这些邮箱时仍然爬取
+- 近期失败的域名降低优先级，连续失败过多则跳过
+- 保存时在文件锁内重新读取磁盘上的记录并合并本次运行改动的域名，多个worker互不覆盖；
+  所有TTL都已过期的记录被清理，超过max_domains时只保留最近活跃的域名
+"""
+
+import os
+import json
+import time
+import threading
+import contextlib
+from urllib.parse import urlparse
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，只保证进程内互斥
+    fcntl = None
+
+
+class DomainCrawlMemory:
+    def __init__(self, cache_dir, empty_ttl_hours=24 * 7, productive_ttl_hours=24 * 3,
+                 failure_ttl_hours=24, max_failures=3, max_domain_emails=100, max_domains=None):
+        self.memory_file = os.path.join(cache_dir, 'domain_crawl_memory.json')
+        self.lock_file = self.memory_file + '.lock'
+        self.empty_ttl = empty_ttl_hours * 3600
+        self.productive_ttl = productive_ttl_hours * 3600
+        self.failure_ttl = failure_ttl_hours * 3600
+        self.max_failures = max_failures
+        self.max_domain_emails = max_domain_emails  # 每个域名保存的已发现邮箱上限
+        if max_domains is None:
+            max_domains = int(os.environ.get('DISCOVERY_DOMAIN_MEMORY_MAX', '50000'))
+        self.max_domains = max_domains
+
+        # 本次运行开始前的记录才参与TTL判断，避免同一次运行内同域名的其他页面被跳过
+        self.session_start = time.time()
+        self.lock = threading.Lock()
+        self.domains = self.load()
+        self.dirty = {}  # 本次运行更新过的域名 -> 更新前的计数基线，保存时只合并这些域名的增量
+
+    def load(self):
+        """加载域名爬取表"""
+        if not os.path.exists(self.memory_file):
+            return {}
+        try:
+            with open(self.memory_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    @contextlib.contextmanager
+    def file_lock(self):
+        """跨进程互斥（读-合并-写期间持有）"""
+        with open(self.lock_file, 'a') as handle:
+            if fcntl:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def save(self):
+        """合并其他worker写入的记录后原子写入域名爬取表，并清理过期和超量的记录"""
+        with self.file_lock():
+            domains = self.load()
+            with self.lock:
+                for domain, baseline in self.dirty.items():
+                    ours = self.domains.get(domain)
+                    if ours:
+                        theirs = domains.get(domain)
+                        domains[domain] = self.merge_entry(theirs, ours, baseline) if theirs else ours
+                domains = self.evict(domains)
+                self.domains = domains
+                self.dirty = {}
+                data = json.dumps(domains, ensure_ascii=False)
+            tmp_file = f'{self.memory_file}.{os.getpid()}.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_file, self.memory_file)
+
+    def merge_entry(self, theirs, ours, baseline):
+        """合并同一域名的两份记录：计数加上本次运行的增量，邮箱取并集，最近事件以较新的为准"""
+        merged = dict(theirs)
+        for key in ('pages_fetched', 'emails_found'):
+            merged[key] = theirs.get(key, 0) + ours.get(key, 0) - baseline.get(key, 0)
+        if (ours.get('last_crawl') or 0) >= (theirs.get('last_crawl') or 0):
+            merged['last_crawl'] = ours.get('last_crawl')
+            merged['last_emails_found'] = ours.get('last_emails_found', 0)
+        if (ours.get('last_failure') or 0) >= (theirs.get('last_failure') or 0):
+            merged['last_failure'] = ours.get('last_failure')
+            merged['last_failure_reason'] = ours.get('last_failure_reason')
+        newest_ours = max(ours.get('last_crawl') or 0, ours.get('last_failure') or 0)
+        newest_theirs = max(theirs.get('last_crawl') or 0, theirs.get('last_failure') or 0)
+        merged['consecutive_failures'] = (ours if newest_ours >= newest_theirs else theirs).get('consecutive_failures', 0)
+
+        emails = list(theirs.get('emails', []))
+        for email in ours.get('emails', []):
+            if email not in emails and len(emails) < self.max_domain_emails:
+                emails.append(email)
+        merged['emails'] = emails
+        reasons = dict(theirs.get('failure_reasons', {}))
+        for reason, count in ours.get('failure_reasons', {}).items():
+            reasons[reason] = max(reasons.get(reason, 0), count)
+        merged['failure_reasons'] = reasons
+        return merged
+
+    def evict(self, domains):
+        """丢弃所有TTL都已过期的记录（不再影响调度），超过max_domains时只保留最近活跃的"""
+        now = time.time()
+        horizon = max(self.empty_ttl, self.productive_ttl, self.failure_ttl)
+
+        def last_activity(entry):
+            return max(entry.get('last_crawl') or 0, entry.get('last_failure') or 0)
+
+        kept = {domain: entry for domain, entry in domains.items() if now - last_activity(entry) < horizon}
+        if len(kept) > self.max_domains:
+            newest = sorted(kept.items(), key=lambda item: last_activity(item[1]), reverse=True)[:self.max_domains]
+            kept = dict(newest)
+        return kept
+
+    @staticmethod
+    def get_domain(url):
+        """从URL提取域名（去掉www.前缀）"""
+        netloc = urlparse(url).netloc.lower()
+        return netloc[4:] if netloc.startswith('www.') else netloc
+
+    def record_crawl(self, url, emails):
+        """记录一次成功抓取及该页发现的邮箱地址"""
+        domain = self.get_domain(url)
+        if not domain:
+            return
+        with self.lock:
+            entry = self.domains.setdefault(domain, self._new_entry())
+            self.dirty.setdefault(domain, {key: entry[key] for key in ('pages_fetched', 'emails_found')})
+            entry['last_crawl'] = time.time()
+            entry['pages_fetched'] += 1
+            entry['emails_found'] += len(emails)
+            entry['last_emails_found'] = len(emails)
+            entry['consecutive_failures'] = 0
+            known = entry.setdefault('emails', [])
+            for email in emails:
+                if email not in known and len(known) < self.max_domain_emails:
+                    known.append(email)
+
+    def record_failure(self, url, reason):
+        """记录一次抓取失败及原因"""
+        domain = self.get_domain(url)
+        if not domain:
+            return
+        with self.lock:
+            entry = self.domains.setdefault(domain, self._new_entry())
+            self.dirty.setdefault(domain, {key: entry[key] for key in ('pages_fetched', 'emails_found')})
+            entry['last_failure'] = time.time()
+            entry['last_failure_reason'] = reason
+            entry['consecutive_failures'] += 1
+            entry['failure_reasons'][reason] = entry['failure_reasons'].get(reason, 0) + 1
+
+    def domain_stats(self, url):
+        """返回域名的爬取记录副本，没有记录时返回None"""
+        with self.lock:
+            entry = self.domains.get(self.get_domain(url))
+            return dict(entry) if entry else None
+
+    def decide(self, url, known_emails=None):
+        """返回该URL的调度决策: crawl / deprioritize / skip，以及原因
+        known_emails为当前活动已返回的邮箱；未提供时不因"已产出"跳过"""
+        domain = self.get_domain(url)
+        with self.lock:
+            entry = self.domains.get(domain)
+            if not entry:
+                return 'crawl', '新域名'
+            entry = dict(entry, emails=list(entry.get('emails', [])))
+
+        now = time.time()
+        last_crawl = entry.get('last_crawl')
+        if last_crawl and last_crawl < self.session_start:
+            age = now - last_crawl
+            # 以该域名所有已抓取页面的总产出判断，单个页面无邮箱不代表整个域名无产出
+            if entry['pages_fetched'] and entry['emails_found'] == 0 and age < self.empty_ttl:
+                return 'skip', f'{age / 3600:.0f}小时前爬取{entry["pages_fetched"]}页无邮箱'
+            domain_emails = entry.get('emails')
+            if (domain_emails and known_emails is not None and age < self.productive_ttl
+                    and all(email in known_emails for email in domain_emails)):
+                return 'skip', f'{age / 3600:.0f}小时前已产出的{len(domain_emails)}个邮箱都已返回过'
+
+        last_failure = entry.get('last_failure')
+        if last_failure and now - last_failure < self.failure_ttl:
+            if entry['consecutive_failures'] >= self.max_failures:
+                return 'skip', f'连续失败{entry["consecutive_failures"]}次 ({entry["last_failure_reason"]})'
+            return 'deprioritize', f'近期失败 ({entry["last_failure_reason"]})'
+
+        return 'crawl', '已过TTL'
+
+    @staticmethod
+    def _new_entry():
+        return {
+            'last_crawl': None,
+            'pages_fetched': 0,
+            'emails_found': 0,
+            'last_emails_found': 0,
+            'emails': [],
+            'last_failure': None,
+            'last_failure_reason': None,
+            'consecutive_failures': 0,
+            'failure_reasons': {}
+        }
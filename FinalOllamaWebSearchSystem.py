@@ -20,11 +20,17 @@ from urllib.parse import quote, unquote
 from bs4 import BeautifulSoup
 import random
 import concurrent.futures
+from OllamaClient import get_ollama_client, OllamaSchemaError
+from JsonSchema import query_list_schema
+from StreamingQueryDispatcher import StreamingQueryDispatcher
 
 class FinalOllamaWebSearchSystem:
     def __init__(self):
         # 本地Ollama配置
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
+        # 流式模式：边生成查询边搜索（OLLAMA_STREAM_QUERIES=0 回到先生成完再搜索）
+        self.stream_queries = os.environ.get('OLLAMA_STREAM_QUERIES', '1') != '0'
         
         # 网络搜索配置
         self.session = requests.Session()
@@ -60,53 +66,89 @@ class FinalOllamaWebSearchSystem:
 
 行业: {industry}
 
-请返回5个搜索查询，每行一个:
-1. 
-2. 
-3. 
-4. 
-5. 
+请返回JSON格式，queries中恰好5个搜索查询:
+{{"queries": ["查询1", "查询2", "查询3", "查询4", "查询5"]}}
 
-只返回查询，不要解释:"""
+只返回JSON，不要解释:"""
 
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': 'qwen2.5:0.5b',
-                'prompt': prompt,
-                'stream': False,
-                'options': {'temperature': 0.7, 'num_ctx': 1024}
-            }, timeout=30)
-            
-            if response.status_code == 200:
-                result = response.json()['response'].strip()
-                
-                # 提取查询
-                queries = []
-                for line in result.split('\n'):
-                    line = line.strip()
-                    if line and (line.startswith(('1.', '2.', '3.', '4.', '5.')) or len(line) > 10):
-                        # 清理行号
-                        cleaned = re.sub(r'^\d+\.\s*', '', line).strip()
-                        if cleaned and len(cleaned) > 5:
-                            queries.append(cleaned)
-                
-                if queries:
-                    print(f"   ✅ Ollama生成了{len(queries)}个搜索查询")
-                    return queries[:5]
+            try:
+                result = self.ollama.generate_json('qwen2.5:0.5b', prompt, query_list_schema(5),
+                                                   options={'temperature': 0.7, 'num_ctx': 1024}, timeout=30,
+                                                   priority='interactive')
+                queries = [query.strip() for query in result['queries']]
+                print(f"   ✅ Ollama生成了{len(queries)}个搜索查询")
+                return queries
+            except OllamaSchemaError as e:
+                print(f"   ⚠️  {e}")
             
             # 备用查询
             print(f"   ⚠️  使用备用搜索查询")
-            return [
-                f"{industry} company contact email address",
-                f"{industry} business CEO founder email",
-                f"{industry} company customer service email",
-                f"{industry} startup contact information",
-                f"{industry} company sales email directory"
-            ]
+            return self.backup_search_queries(industry)
             
         except Exception as e:
             print(f"   ❌ Ollama查询生成失败: {str(e)}")
             return [f"{industry} company email contact"]
     
+    def backup_search_queries(self, industry):
+        """Ollama不可用时的备用搜索查询"""
+        return [
+            f"{industry} company contact email address",
+            f"{industry} business CEO founder email",
+            f"{industry} company customer service email",
+            f"{industry} startup contact information",
+            f"{industry} company sales email directory"
+        ]
+    
+    def stream_search_queries_with_ollama(self, industry):
+        """流式生成搜索查询：每行一个查询，生成中逐行产出"""
+        print(f"🧠 Ollama流式生成'{industry}'行业的搜索策略...")
+        
+        prompt = f"""为{industry}行业生成5个不同的网络搜索查询来找到公司邮箱地址。
+
+要求:
+1. 每个查询都应该能找到真实的商业邮箱
+2. 针对不同类型的联系人(CEO, 销售, 客服等)
+3. 包含具体的行业关键词
+4. 适合在搜索引擎中使用
+
+行业: {industry}
+
+每行输出一个搜索查询，共5行，不要编号、不要引号、不要解释:"""
+
+        return self.ollama.generate_lines('qwen2.5:0.5b', prompt,
+                                          options={'temperature': 0.7, 'num_ctx': 1024},
+                                          timeout=30, priority='interactive')
+    
+    def stream_search_for_emails(self, industry, max_emails):
+        """边生成查询边搜索，返回 (已执行的查询, 找到的邮箱)"""
+        dispatcher = StreamingQueryDispatcher(self.search_web_for_emails, max_queries=5)
+        dispatcher.start(self.stream_search_queries_with_ollama(industry),
+                         fallback_queries=self.backup_search_queries(industry))
+        
+        all_emails = []
+        unique_emails = set()
+        for index, query, emails in dispatcher.results():
+            print(f"\n📍 搜索策略 {index + 1} 完成: {query}")
+            if not emails:
+                print(f"   ⚠️  本次搜索未找到邮箱")
+                continue
+            
+            all_emails.extend(emails)
+            unique_emails.update(email_data['email'] for email_data in emails)
+            print(f"   ✅ 本次搜索找到{len(emails)}个邮箱")
+            
+            if len(unique_emails) >= max_emails:
+                print(f"   🎯 已达到目标邮箱数量，停止生成和剩余搜索")
+                dispatcher.cancel()
+                break
+        
+        summary = dispatcher.summary()
+        if summary['error']:
+            print(f"   ⚠️  流式查询生成中断，已用备用查询补齐: {summary['error']}")
+        print(f"   ⏱️  首条查询 {summary['first_query_seconds']}s，首批结果 {summary['first_result_seconds']}s，"
+              f"生成耗时 {summary['generation_seconds']}s")
+        return summary['queries'], all_emails
+    
     def search_web_for_emails(self, query):
         """执行网络搜索并直接提取邮箱"""
         try:
@@ -259,15 +301,10 @@ class FinalOllamaWebSearchSystem:
 
 简洁回答，重点突出实用信息:"""
 
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': 'qwen2.5:0.5b',
-                'prompt': prompt,
-                'stream': False,
-                'options': {'temperature': 0.3, 'num_ctx': 1024}
-            }, timeout=20)
+            response_text = self.ollama.generate('qwen2.5:0.5b', prompt, options={'temperature': 0.3, 'num_ctx': 1024}, timeout=20)
             
-            if response.status_code == 200:
-                analysis = response.json()['response'].strip()
+            if response_text:
+                analysis = response_text
                 print(f"   ✅ Ollama分析完成")
                 return analysis
             else:
@@ -277,18 +314,12 @@ class FinalOllamaWebSearchSystem:
             print(f"   ❌ Ollama分析错误: {str(e)}")
             return f"找到{len(emails_data)}个邮箱，分析功能暂时不可用"
     
-    def find_emails_with_ollama_web_search(self, industry, max_emails=5):
-        """使用Ollama网络搜索功能发现邮箱"""
-        print(f"🤖 启动Ollama网络搜索邮箱发现: {industry}")
-        print(f"🎯 目标: {max_emails}个邮箱")
-        print("=" * 60)
-        
-        # 1. 使用Ollama生成搜索策略
+    def search_with_generated_queries(self, industry, max_emails):
+        """先生成全部查询再逐条搜索，返回 (查询列表, 找到的邮箱)"""
         search_queries = self.generate_search_queries_with_ollama(industry)
         
         all_emails = []
         
-        # 2. 执行每个搜索查询
         for i, query in enumerate(search_queries, 1):
             print(f"\n📍 搜索策略 {i}/{len(search_queries)}")
             
@@ -314,6 +345,20 @@ class FinalOllamaWebSearchSystem:
             # 搜索间隔
             time.sleep(2)
         
+        return search_queries, all_emails
+    
+    def find_emails_with_ollama_web_search(self, industry, max_emails=5):
+        """使用Ollama网络搜索功能发现邮箱"""
+        print(f"🤖 启动Ollama网络搜索邮箱发现: {industry}")
+        print(f"🎯 目标: {max_emails}个邮箱")
+        print("=" * 60)
+        
+        # 1-2. 流式模式：Ollama每生成一个查询就立即搜索
+        if self.stream_queries:
+            search_queries, all_emails = self.stream_search_for_emails(industry, max_emails)
+        else:
+            search_queries, all_emails = self.search_with_generated_queries(industry, max_emails)
+        
         # 3. 去重并限制数量
         unique_emails = {}
         for email_data in all_emails:
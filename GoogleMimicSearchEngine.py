@@ -26,11 +26,45 @@ import urllib.request
 from threading import Lock, Thread
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from OllamaClient import get_ollama_client, OllamaSchemaError
+from JsonSchema import contact_profile_schema
+from BatchProfiler import BatchProfiler
 
 class GoogleMimicSearchEngine:
+    # Fixed profile instructions, identical for every contact (shared KV prefix)
+    PROFILE_SYSTEM_PROMPT = """Generate a professional user profile for the email contact given by the user, based on the company information found.
+
+Generate a realistic profile including:
+- Full name (based on email prefix if possible)
+- Job title/role
+- Company description
+- Industry
+- Professional background
+
+Format as JSON, copying the given email and company:
+{
+  "name": "Full Name",
+  "email": "the given email",
+  "title": "Job Title",
+  "company": "the given company",
+  "industry": "Industry Name",
+  "background": "Brief professional background"
+}"""
+
     def __init__(self):
         self.scrapingdog_api_key = os.getenv('SCRAPINGDOG_API_KEY', '689e1eadbec7a9c318cc34e9')
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
+        
+        # Batched profiling: several contacts per llama3.2 call
+        self.profiler = BatchProfiler(
+            self.ollama, 'llama3.2',
+            fields={'name': str, 'title': str, 'company': str, 'industry': str, 'background': str},
+            instructions=("Generate a realistic professional profile for each email contact below, "
+                          "based on the company information found. Infer the full name from the "
+                          "email prefix if possible."),
+            num_ctx=4096
+        )
         
         # Human-like session configuration
         self.session = requests.Session()
@@ -82,15 +116,11 @@ Target: {target_type}
 
 Return ONLY the search query, nothing else:"""
 
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': 'qwen2.5:0.5b',
-                'prompt': prompt,
-                'stream': False,
-                'options': {'temperature': 0.7, 'num_ctx': 512}
-            }, timeout=10)
+            response_text = self.ollama.generate('qwen2.5:0.5b', prompt, options={'temperature': 0.7, 'num_ctx': 512}, timeout=10,
+                                                 priority='interactive')
             
-            if response.status_code == 200:
-                query = response.json()['response'].strip().strip('"').strip("'")
+            if response_text:
+                query = response_text.strip('"').strip("'")
                 print(f"🧠 Ollama generated query: '{query}'")
                 return query
             else:
@@ -313,76 +343,44 @@ Return ONLY the search query, nothing else:"""
         try:
             print(f"   🧠 Generating user profile for {email_data['email']}...")
             
-            prompt = f"""Generate a professional user profile for this email contact based on the company information found:
-
-Email: {email_data['email']}
+            # Only the per-contact data is sent as the prompt; the fixed instructions live in the
+            # system prompt so Ollama can reuse their evaluated KV prefix across contacts
+            prompt = f"""Email: {email_data['email']}
 Company: {email_data['company_name']}
 Company URL: {email_data['company_url']}
 Context: {email_data['snippet'][:200]}...
 
-Generate a realistic profile including:
-- Full name (based on email prefix if possible)
-- Job title/role
-- Company description
-- Industry
-- Professional background
-
-Format as JSON:
-{{
-  "name": "Full Name",
-  "email": "{email_data['email']}",
-  "title": "Job Title", 
-  "company": "{email_data['company_name']}",
-  "industry": "Industry Name",
-  "background": "Brief professional background"
-}}
-
 Return ONLY the JSON, no explanations:"""
 
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': 'llama3.2',
-                'prompt': prompt,
-                'stream': False,
-                'options': {'temperature': 0.3, 'num_ctx': 1024}
-            }, timeout=15)
-            
-            if response.status_code == 200:
-                profile_text = response.json()['response'].strip()
-                
-                # Try to parse JSON
-                try:
-                    # Extract JSON from response
-                    json_start = profile_text.find('{')
-                    json_end = profile_text.rfind('}') + 1
-                    if json_start != -1 and json_end > json_start:
-                        profile_json = json.loads(profile_text[json_start:json_end])
-                        
-                        print(f"      ✅ Generated profile for {profile_json.get('name', 'Unknown')}")
-                        return profile_json
-                    else:
-                        raise ValueError("No JSON found")
-                        
-                except (json.JSONDecodeError, ValueError):
-                    # Fallback profile
-                    email_prefix = email_data['email'].split('@')[0]
-                    fallback_profile = {
-                        "name": email_prefix.replace('.', ' ').replace('_', ' ').title(),
-                        "email": email_data['email'],
-                        "title": "Professional",
-                        "company": email_data['company_name'],
-                        "industry": "Business",
-                        "background": f"Professional at {email_data['company_name']}"
-                    }
-                    print(f"      ⚠️  JSON parsing failed, using fallback profile")
-                    return fallback_profile
-            else:
-                print(f"      ❌ Ollama profile generation failed")
-                return None
+            # Schema-constrained output; invalid JSON is repaired once before falling back
+            try:
+                profile_json = self.ollama.generate_json(
+                    'llama3.2', prompt, contact_profile_schema(email_data['email']),
+                    system=self.PROFILE_SYSTEM_PROMPT,
+                    options={'temperature': 0.3, 'num_ctx': 1024}, timeout=15, priority='bulk'
+                )
+                print(f"      ✅ Generated profile for {profile_json['name']}")
+                return profile_json
+            except OllamaSchemaError as e:
+                print(f"      ⚠️  {e}, using fallback profile")
+                return self.fallback_profile(email_data)
                 
         except Exception as e:
             print(f"      ❌ Profile generation error: {str(e)}")
             return None
     
+    def fallback_profile(self, email_data):
+        """Basic profile derived from the email prefix and company name"""
+        email_prefix = email_data['email'].split('@')[0]
+        return {
+            "name": email_prefix.replace('.', ' ').replace('_', ' ').title(),
+            "email": email_data['email'],
+            "title": "Professional",
+            "company": email_data['company_name'],
+            "industry": "Business",
+            "background": f"Professional at {email_data['company_name']}"
+        }
+    
     def process_single_page_parallel(self, query, page):
         """Process a single Google results page and return all emails found"""
         page_emails = []
@@ -491,24 +489,27 @@ Return ONLY the JSON, no explanations:"""
         """Generate user profiles for all found emails"""
         print(f"\n🧠 Generating user profiles for {len(emails)} emails...")
         
+        # Several contacts per prompt; only contacts whose profile failed validation are re-asked
+        records = [{
+            'email': email_data['email'],
+            'company': email_data['company_name'],
+            'company_url': email_data['company_url'],
+            'context': email_data['snippet'][:200]
+        } for email_data in emails]
+        generated = self.profiler.profile(records)
+        
         profiles = []
-        for i, email_data in enumerate(emails):
-            print(f"👤 Profile {i + 1}/{len(emails)}: {email_data['email']}")
-            
-            profile = self.generate_user_profile_with_ollama(email_data)
+        for email_data, profile in zip(emails, generated):
             if profile:
-                # Merge profile with email data
-                full_profile = {**email_data, **profile}
-                profiles.append(full_profile)
-                
-                # Log profile generation
                 print(f"   ✅ Profile generated for {profile.get('name', 'Unknown')}")
             else:
-                print(f"   ❌ Profile generation failed for {email_data['email']}")
+                profile = self.fallback_profile(email_data)
+                print(f"   ⚠️  Using fallback profile for {email_data['email']}")
             
-            # Small delay between profile generations
-            time.sleep(1)
+            # Merge profile with email data
+            profiles.append({**email_data, **profile})
         
+        print(f"   🧠 {self.profiler.stats['llm_calls']} LLM calls for {len(emails)} profiles")
         return profiles
 
 def main():
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+对冲式LLM结果
+- 模板结果立即可用，调用方无需等待LLM
+- 后台线程在截止时间内运行LLM，结果到达后逐条替换对应记录并推送更新
+- 超过截止时间的结果丢弃，已被使用（take）的记录不再替换
+模型足够快时得到LLM质量，模型慢或挂起时只付出模板延迟
+"""
+
+import time
+import threading
+
+
+class HedgedRecords:
+    def __init__(self, records, deadline, kind='record', on_update=None):
+        self.records = list(records)
+        self.sources = ['template'] * len(self.records)
+        self.consumed = set()
+        self.kind = kind
+        self.on_update = on_update
+        self.started_at = time.time()
+        self.deadline_at = self.started_at + deadline
+
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.error = None
+        self.stats = {'replaced': 0, 'late': 0, 'skipped_consumed': 0, 'first_update_seconds': None}
+
+    def __len__(self):
+        return len(self.records)
+
+    def remaining(self):
+        """距截止时间的剩余秒数"""
+        return max(0.0, self.deadline_at - time.time())
+
+    def start(self, producer):
+        """后台运行producer(replace, timeout)，timeout为到截止时间的剩余秒数"""
+        thread = threading.Thread(target=self._run, args=(producer,), daemon=True)
+        thread.start()
+        return self
+
+    def _run(self, producer):
+        try:
+            producer(self.replace, self.remaining())
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.done.set()
+
+    def take(self, index):
+        """取出一条记录用于执行，之后到达的LLM结果不再替换它"""
+        with self.lock:
+            self.consumed.add(index)
+            return self.records[index]
+
+    def pending_indices(self):
+        """尚未被取用的记录位置"""
+        with self.lock:
+            return [i for i in range(len(self.records)) if i not in self.consumed]
+
+    def replace(self, index, record):
+        """用LLM结果替换一条记录，返回是否替换成功"""
+        with self.lock:
+            if time.time() > self.deadline_at:
+                self.stats['late'] += 1
+                return False
+            if index in self.consumed:
+                self.stats['skipped_consumed'] += 1
+                return False
+            self.records[index] = record
+            self.sources[index] = 'llm'
+            self.stats['replaced'] += 1
+            if self.stats['first_update_seconds'] is None:
+                self.stats['first_update_seconds'] = round(time.time() - self.started_at, 2)
+
+        if self.on_update:
+            self.on_update({'type': f'{self.kind}_update', 'index': index, 'record': record, 'source': 'llm'})
+        return True
+
+    def wait(self):
+        """等待LLM完成或到达截止时间，返回当前记录（未替换的仍为模板）"""
+        self.done.wait(self.remaining())
+        return self.snapshot()
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.records)
+
+    def summary(self):
+        """返回对冲统计"""
+        with self.lock:
+            return {
+                **self.stats,
+                'total': len(self.records),
+                'llm_records': self.sources.count('llm'),
+                'completed': self.done.is_set(),
+                'error': self.error
+            }
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+多后端对冲搜索
+- 按优先级启动第一个后端，hedge_delay秒内没有足够结果就再启动下一个（对冲请求），
+  某个后端失败或结果不足时立即启动下一个，不再逐个等满超时
+- 第一个结果数足够的响应胜出，尚未启动的后端不再启动，仍在执行的请求被放弃
+- 已到达的所有响应合并，按规范化URL去重（忽略协议、www、末尾斜杠、片段和跟踪参数）
+- 后端是普通的可调用对象 search_fn(query, max_results) -> [{'url', 'title', 'content'}]，可以用本地桩函数测试
+"""
+
+import os
+import time
+import threading
+import concurrent.futures
+
+from URLUtils import canonical_url
+
+
+class HedgedSearch:
+    def __init__(self, backends, hedge_delay=None, min_results=5, timeout=20):
+        if hedge_delay is None:
+            hedge_delay = float(os.environ.get('SEARCH_HEDGE_DELAY', '1.5'))
+        self.backends = list(backends)  # [(名称, search_fn)]，按优先级排列
+        self.hedge_delay = hedge_delay
+        self.min_results = min_results
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.backend_stats = {name: {'launched': 0, 'wins': 0, 'failures': 0, 'abandoned': 0, 'total_latency': 0.0,
+                                     'completed': 0} for name, _ in self.backends}
+
+    def search(self, query, max_results=10):
+        """对冲搜索，返回 (去重后的结果, 本次搜索信息)"""
+        started_at = time.time()
+        deadline_at = started_at + self.timeout
+        sufficient = min(self.min_results, max_results)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(self.backends)))
+        pending = {}  # future -> (名称, 启动时间)
+        responses = []  # [(名称, 结果)]，按到达顺序
+        next_index, next_launch_at = 0, started_at
+        winner = None
+
+        try:
+            while True:
+                now = time.time()
+                if next_index < len(self.backends) and (now >= next_launch_at or not pending):
+                    name, search_fn = self.backends[next_index]
+                    next_index += 1
+                    pending[executor.submit(search_fn, query, max_results)] = (name, now)
+                    self.count(name, 'launched')
+                    next_launch_at = now + self.hedge_delay
+                    continue
+                if not pending or now >= deadline_at:
+                    break
+
+                wait_until = min(deadline_at, next_launch_at) if next_index < len(self.backends) else deadline_at
+                done, _ = concurrent.futures.wait(pending, timeout=max(0.0, wait_until - now),
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name, launched_at = pending.pop(future)
+                    try:
+                        results = future.result() or []
+                        self.count(name, 'completed', latency=time.time() - launched_at)
+                    except Exception as e:
+                        print(f"      ❌ {name} 搜索失败: {e}")
+                        self.count(name, 'failures')
+                        continue
+                    if results:
+                        responses.append((name, results))
+                    if len(results) >= sufficient and winner is None:
+                        winner = name
+                if winner:
+                    break
+                if done:
+                    next_launch_at = time.time()  # 失败或结果不足：立即对冲下一个后端
+        finally:
+            # 放弃仍在执行的请求、取消尚未开始的请求，不等待它们结束
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        abandoned = [name for name, _ in pending.values()]
+        for name in abandoned:
+            self.count(name, 'abandoned')
+        if winner:
+            self.count(winner, 'wins')
+
+        # 胜出的响应排在前面，其余已到达的响应补充去重
+        responses.sort(key=lambda response: response[0] != winner)
+        merged = self.merge([results for _, results in responses], max_results)
+        info = {
+            'winner': winner,
+            'responded': [name for name, _ in responses],
+            'abandoned': abandoned,
+            'launched': next_index,
+            'seconds': round(time.time() - started_at, 2)
+        }
+        print(f"      📊 对冲搜索: {len(merged)}个唯一结果 (胜出: {winner or '无'}, "
+              f"启动{next_index}个后端, 放弃: {abandoned or '无'}, {info['seconds']}秒)")
+        return merged, info
+
+    def count(self, name, field, latency=None):
+        with self.lock:
+            stats = self.backend_stats[name]
+            stats[field] += 1
+            if latency is not None:
+                stats['total_latency'] += latency
+
+    @classmethod
+    def merge(cls, result_lists, max_results=None):
+        """按规范化URL合并多个结果列表，保留首次出现的结果（标题/摘要为空时用后来者补充）"""
+        merged = {}
+        for results in result_lists:
+            for result in results:
+                url = result.get('url')
+                if not url:
+                    continue
+                key = canonical_url(url)
+                existing = merged.get(key)
+                if existing is None:
+                    merged[key] = dict(result)
+                else:
+                    for field in ('title', 'content'):
+                        if not existing.get(field) and result.get(field):
+                            existing[field] = result[field]
+        values = list(merged.values())
+        return values[:max_results] if max_results else values
+
+    def summary(self):
+        """返回各后端的启动、胜出、失败与放弃次数"""
+        with self.lock:
+            return {name: {**{key: value for key, value in stats.items() if key != 'total_latency'},
+                           'avg_latency': round(stats['total_latency'] / stats['completed'], 2) if stats['completed'] else None}
+                    for name, stats in self.backend_stats.items()}
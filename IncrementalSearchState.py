@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+增量搜索状态（按活动持久化）
+- 记录每个活动（行业+session_id）每个策略族的上次运行时间
+- 再次运行时按距上次运行的时间选择SearxNG time_range（day/week/month/year），只取上次之后的新结果
+- 保存已处理结果（已爬取，或预览已解析且不需要爬取）的规范化URL水位，搜索结果在解析预览和入队爬取之前就跳过这些URL
+- 仍在爬取前沿中等待的URL不记入水位，下次运行时仍会被处理
+- 策略族上次运行超过一年（或从未运行）时不限时间范围
+"""
+
+import os
+import json
+import time
+import hashlib
+
+from URLUtils import canonical_url
+
+
+class IncrementalSearchState:
+    # (最大间隔秒数, SearxNG time_range)，按间隔从小到大选择能覆盖的最小时间范围
+    TIME_RANGES = [(86400, 'day'), (7 * 86400, 'week'), (31 * 86400, 'month'), (365 * 86400, 'year')]
+
+    def __init__(self, cache_dir, industry, session_id=None, max_seen_urls=20000, margin_hours=6):
+        industry_hash = hashlib.md5(industry.lower().strip().encode()).hexdigest()[:12]
+        session_hash = hashlib.md5(str(session_id).encode()).hexdigest()[:8] if session_id else 'default'
+        self.state_file = os.path.join(cache_dir, f'incremental_search_{industry_hash}_{session_hash}.json')
+        self.max_seen_urls = max_seen_urls
+        self.margin = margin_hours * 3600  # 搜索引擎收录有延迟，时间窗口多留一些余量
+
+        self.run_started = time.time()
+        self.families = {}  # 策略族 -> {'last_run', 'runs'}
+        self.seen_urls = {}  # 规范化URL -> 首次处理时间
+        self.families_run = set()
+        self.stats = {'windowed_queries': 0, 'full_queries': 0, 'results': 0, 'skipped_seen': 0, 'new_urls': 0,
+                      'processed_urls': 0}
+        self.resumed = self.load()
+
+    def load(self):
+        """加载增量状态，返回是否存在历史记录"""
+        if not os.path.exists(self.state_file):
+            return False
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.families = data.get('families', {})
+            self.seen_urls = data.get('seen_urls', {})
+            return True
+        except Exception:
+            return False
+
+    def save(self):
+        """原子写入增量状态（URL水位超过上限时丢弃最早的记录）"""
+        if len(self.seen_urls) > self.max_seen_urls:
+            newest = sorted(self.seen_urls.items(), key=lambda item: item[1])[-self.max_seen_urls:]
+            self.seen_urls = dict(newest)
+        data = {
+            'families': self.families,
+            'seen_urls': self.seen_urls,
+            'updated_at': time.time()
+        }
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_file, self.state_file)
+
+    def time_range(self, family):
+        """该策略族本次应使用的time_range；从未运行或间隔超过一年时返回None（不限时间）"""
+        entry = self.families.get(family)
+        if not entry:
+            return None
+        gap = self.run_started - entry['last_run'] + self.margin
+        for max_gap, time_range in self.TIME_RANGES:
+            if gap <= max_gap:
+                return time_range
+        return None
+
+    def filter_new(self, results, time_range=None):
+        """跳过已处理过的URL，返回新结果（不修改水位，处理完成后由mark_processed记录）"""
+        self.stats['windowed_queries' if time_range else 'full_queries'] += 1
+        self.stats['results'] += len(results)
+        new_results = []
+        for result in results:
+            url = result.get('url')
+            if not url:
+                continue
+            if canonical_url(url) in self.seen_urls:
+                self.stats['skipped_seen'] += 1
+                continue
+            new_results.append(result)
+        self.stats['new_urls'] += len(new_results)
+        return new_results
+
+    def mark_processed(self, urls):
+        """记录已处理（已爬取，或预览已解析且不再等待爬取）的URL水位"""
+        now = time.time()
+        for url in urls:
+            if not url:
+                continue
+            key = canonical_url(url)
+            if key not in self.seen_urls:
+                self.seen_urls[key] = now
+                self.stats['processed_urls'] += 1
+
+    def mark_family(self, family):
+        """记录本次运行执行过的策略族（完成时统一写入运行时间）"""
+        self.families_run.add(family)
+
+    def finish(self):
+        """本次运行结束：执行过的策略族的上次运行时间记为本次开始时间（开始后发布的结果下次仍会覆盖）"""
+        for family in self.families_run:
+            entry = self.families.setdefault(family, {'last_run': 0.0, 'runs': 0})
+            entry['last_run'] = self.run_started
+            entry['runs'] += 1
+
+    def summary(self):
+        """返回增量搜索统计"""
+        return {
+            **self.stats,
+            'resumed': self.resumed,
+            'families_run': sorted(self.families_run),
+            'known_families': len(self.families),
+            'seen_urls': len(self.seen_urls)
+        }
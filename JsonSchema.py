@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+LLM结构化输出的JSON Schema
+- 通过Ollama的format参数约束模型直接按schema输出
+- validate() 严格校验返回值（Ollama只保证语法，字段长度、数量、枚举仍需检查）
+- 提供各引擎共用的查询列表与用户画像schema
+"""
+
+import json
+
+
+def validate(value, schema, path='$'):
+    """按schema校验value，返回错误列表（空列表表示通过）
+
+    支持本项目用到的子集：type、properties、required、items、
+    minItems、maxItems、minLength、minimum、maximum、enum。
+    """
+    expected = schema.get('type')
+    checks = {
+        'object': lambda v: isinstance(v, dict),
+        'array': lambda v: isinstance(v, list),
+        'string': lambda v: isinstance(v, str),
+        'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+        'boolean': lambda v: isinstance(v, bool)
+    }
+    if expected in checks and not checks[expected](value):
+        return [f'{path}: 应为{expected}，实际为{type(value).__name__}']
+
+    errors = []
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f'{path}: 取值不在{schema["enum"]}中')
+
+    if expected == 'object':
+        for name in schema.get('required', []):
+            if name not in value:
+                errors.append(f'{path}.{name}: 缺少必填字段')
+        for name, sub_schema in schema.get('properties', {}).items():
+            if name in value:
+                errors.extend(validate(value[name], sub_schema, f'{path}.{name}'))
+    elif expected == 'array':
+        if len(value) < schema.get('minItems', 0):
+            errors.append(f'{path}: 至少需要{schema["minItems"]}项，实际{len(value)}项')
+        if 'maxItems' in schema and len(value) > schema['maxItems']:
+            errors.append(f'{path}: 最多{schema["maxItems"]}项，实际{len(value)}项')
+        if 'items' in schema:
+            for i, item in enumerate(value):
+                errors.extend(validate(item, schema['items'], f'{path}[{i}]'))
+    elif expected == 'string':
+        if len(value.strip()) < schema.get('minLength', 0):
+            errors.append(f'{path}: 长度不足{schema["minLength"]}')
+    elif expected in ('number', 'integer'):
+        if 'minimum' in schema and value < schema['minimum']:
+            errors.append(f'{path}: 小于最小值{schema["minimum"]}')
+        if 'maximum' in schema and value > schema['maximum']:
+            errors.append(f'{path}: 大于最大值{schema["maximum"]}')
+
+    return errors
+
+
+def parse(text, schema):
+    """解析模型输出并校验，返回 (value, errors)"""
+    try:
+        value = json.loads(text)
+    except ValueError as e:
+        return None, [f'$: JSON解析失败 ({e})']
+    return value, validate(value, schema)
+
+
+def query_list_schema(count, field='queries', min_length=5):
+    """搜索查询列表：{"queries": ["...", ...]}，恰好count条"""
+    return {
+        'type': 'object',
+        'properties': {
+            field: {
+                'type': 'array',
+                'items': {'type': 'string', 'minLength': min_length},
+                'minItems': count,
+                'maxItems': count
+            }
+        },
+        'required': [field]
+    }
+
+
+def contact_profile_schema(email, extra_properties=None):
+    """联系人画像（name/email/title/company/industry/background），email固定为被画像的邮箱"""
+    properties = {
+        'name': {'type': 'string', 'minLength': 2},
+        'email': {'type': 'string', 'enum': [email]},
+        'title': {'type': 'string', 'minLength': 2},
+        'company': {'type': 'string', 'minLength': 1},
+        'industry': {'type': 'string', 'minLength': 2},
+        'background': {'type': 'string', 'minLength': 5}
+    }
+    properties.update(extra_properties or {})
+    return {'type': 'object', 'properties': properties, 'required': list(properties)}
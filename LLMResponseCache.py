@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+持久化LLM响应缓存（内容寻址）
+- 键 = 接口 + 模型 + 提示词/消息 + 选项 的SHA256，相同请求命中同一条目
+- 条目按TTL过期，超过条目上限时按最近使用时间淘汰
+- 同一行业的策略生成提示词每次都相同，重复行业无需再走一次GPU
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+class LLMResponseCache:
+    # 参与缓存键的请求字段（stream、keep_alive等不影响输出的字段不参与）
+    KEY_FIELDS = ['model', 'prompt', 'system', 'messages', 'tools', 'format', 'options', 'raw']
+
+    def __init__(self, cache_dir=None, ttl_hours=None, max_entries=None):
+        if cache_dir is None:
+            cache_dir = os.environ.get('OLLAMA_CACHE_DIR') or os.path.join(
+                os.path.dirname(os.path.abspath(__file__)), '.email_cache', 'llm_cache')
+        if ttl_hours is None:
+            ttl_hours = float(os.environ.get('OLLAMA_CACHE_TTL_HOURS', str(24 * 7)))
+        if max_entries is None:
+            max_entries = int(os.environ.get('OLLAMA_CACHE_MAX_ENTRIES', '2000'))
+
+        self.cache_dir = cache_dir
+        self.ttl = ttl_hours * 3600
+        self.max_entries = max_entries
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.entry_count = sum(1 for name in os.listdir(self.cache_dir) if name.endswith('.json'))
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'stores': 0, 'evictions': 0, 'bypassed': 0}
+
+    def key(self, path, payload):
+        """计算请求的内容寻址键"""
+        material = {'path': path}
+        for field in self.KEY_FIELDS:
+            if payload.get(field) not in (None, {}, []):
+                material[field] = payload[field]
+        encoded = json.dumps(material, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def entry_file(self, key):
+        return os.path.join(self.cache_dir, f'{key}.json')
+
+    def get(self, key):
+        """返回缓存的响应，未命中或已过期返回None"""
+        entry_file = self.entry_file(key)
+        try:
+            with open(entry_file, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self.lock:
+                self.stats['misses'] += 1
+            return None
+
+        if time.time() - entry.get('created_at', 0) > self.ttl:
+            self._remove(entry_file)
+            with self.lock:
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+            return None
+
+        try:
+            os.utime(entry_file)  # 更新最近使用时间，供淘汰排序
+        except OSError:
+            pass
+        with self.lock:
+            self.stats['hits'] += 1
+        return entry['response']
+
+    def put(self, key, response):
+        """原子写入一条响应，超过上限时淘汰最久未使用的条目"""
+        entry_file = self.entry_file(key)
+        is_new = not os.path.exists(entry_file)
+        tmp_file = f'{entry_file}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'created_at': time.time(), 'response': response}, f, ensure_ascii=False)
+            os.replace(tmp_file, entry_file)
+        except OSError:
+            self._remove(tmp_file)
+            return
+
+        with self.lock:
+            self.stats['stores'] += 1
+            if is_new:
+                self.entry_count += 1
+            over_limit = self.entry_count > self.max_entries
+        if over_limit:
+            self.evict()
+
+    def bypass(self):
+        """记录一次为获得新采样而跳过的查找"""
+        with self.lock:
+            self.stats['bypassed'] += 1
+
+    def evict(self):
+        """按最近使用时间淘汰到上限的90%"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.json'):
+                continue
+            entry_file = os.path.join(self.cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(entry_file), entry_file))
+            except OSError:
+                continue
+
+        entries.sort()
+        excess = len(entries) - int(self.max_entries * 0.9)
+        removed = sum(self._remove(entry_file) for _, entry_file in entries[:max(0, excess)])
+
+        with self.lock:
+            self.entry_count = len(entries) - removed
+            self.stats['evictions'] += removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    def summary(self):
+        """返回缓存统计"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = self.entry_count
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+进程级LLM优先级调度器
+- 并发上限与Ollama服务端并行槽位数一致（OLLAMA_NUM_PARALLEL），多出的请求排队而不是挤在服务端
+- 三个优先级：interactive（策略/查询生成）> validation（分析、工具调用等辅助调用）> bulk（批量画像）
+- 每个优先级的队列有上限，满了直接拒绝；排队超时同样拒绝，调用方回退到模板结果
+- 记录每个优先级的排队等待时间
+"""
+
+import os
+import time
+import itertools
+import threading
+from contextlib import contextmanager
+
+
+class LLMQueueFull(Exception):
+    """LLM请求队列已满或排队超时"""
+
+
+class LLMScheduler:
+    PRIORITIES = ['interactive', 'validation', 'bulk']
+
+    # 各优先级默认队列上限与最长排队时间（秒，None表示不限）
+    DEFAULT_MAX_QUEUE = {'interactive': 32, 'validation': 64, 'bulk': 256}
+    DEFAULT_MAX_WAIT = {'interactive': 30, 'validation': 60, 'bulk': None}
+
+    def __init__(self, max_concurrency=None, max_queue=None, max_wait=None):
+        if max_concurrency is None:
+            max_concurrency = int(os.environ.get('OLLAMA_NUM_PARALLEL', '4'))
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = {**self.DEFAULT_MAX_QUEUE, **(max_queue or {})}
+        self.max_wait = {**self.DEFAULT_MAX_WAIT, **(max_wait or {})}
+
+        self.condition = threading.Condition()
+        self.running = 0
+        self.queues = {priority: [] for priority in self.PRIORITIES}
+        self.tickets = itertools.count()
+
+        self.stats = {
+            priority: {'submitted': 0, 'started': 0, 'rejected': 0, 'timed_out': 0,
+                       'total_wait': 0.0, 'max_wait': 0.0}
+            for priority in self.PRIORITIES
+        }
+
+    def _next_ticket(self):
+        """当前应获得槽位的请求：最高优先级队列的队首"""
+        for priority in self.PRIORITIES:
+            if self.queues[priority]:
+                return self.queues[priority][0]
+        return None
+
+    @contextmanager
+    def slot(self, priority='validation'):
+        """占用一个并发槽位，按优先级排队；队列满或排队超时抛出LLMQueueFull"""
+        if priority not in self.queues:
+            raise ValueError(f'未知优先级: {priority}')
+
+        enqueued_at = time.time()
+        with self.condition:
+            stats = self.stats[priority]
+            stats['submitted'] += 1
+            if len(self.queues[priority]) >= self.max_queue[priority]:
+                stats['rejected'] += 1
+                raise LLMQueueFull(f'{priority}队列已满 ({self.max_queue[priority]})')
+
+            ticket = next(self.tickets)
+            self.queues[priority].append(ticket)
+            max_wait = self.max_wait[priority]
+            deadline = enqueued_at + max_wait if max_wait is not None else None
+
+            while self.running >= self.max_concurrency or self._next_ticket() != ticket:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    self.queues[priority].remove(ticket)
+                    stats['timed_out'] += 1
+                    self.condition.notify_all()
+                    raise LLMQueueFull(f'{priority}请求排队超过{max_wait}秒')
+                self.condition.wait(remaining)
+
+            self.queues[priority].pop(0)
+            self.running += 1
+            waited = time.time() - enqueued_at
+            stats['started'] += 1
+            stats['total_wait'] += waited
+            stats['max_wait'] = max(stats['max_wait'], waited)
+            self.condition.notify_all()
+
+        try:
+            yield waited
+        finally:
+            with self.condition:
+                self.running -= 1
+                self.condition.notify_all()
+
+    def summary(self):
+        """返回调度统计（含各优先级平均排队时间和当前队列长度）"""
+        with self.condition:
+            summary = {
+                'max_concurrency': self.max_concurrency,
+                'running': self.running,
+                'priorities': {}
+            }
+            for priority in self.PRIORITIES:
+                stats = dict(self.stats[priority])
+                stats['queued'] = len(self.queues[priority])
+                stats['avg_wait'] = round(stats['total_wait'] / stats['started'], 3) if stats['started'] else None
+                summary['priorities'][priority] = stats
+        return summary
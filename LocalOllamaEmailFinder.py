@@ -19,11 +19,16 @@ from urllib.parse import urlparse, quote, urljoin
 from bs4 import BeautifulSoup
 import concurrent.futures
 import random
+from OllamaClient import get_ollama_client
+from JsonSchema import contact_profile_schema
+from HedgedSearch import HedgedSearch
+from SearxNGPool import get_searxng_pool
 
 class LocalOllamaEmailFinder:
     def __init__(self):
         # 本地Ollama配置
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
         
         # 本地爬虫配置
         self.session = requests.Session()
@@ -38,6 +43,10 @@ class LocalOllamaEmailFinder:
         # 邮箱匹配模式
         self.email_pattern = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
         
+        # 多后端对冲搜索：SEARCH_HEDGE_DELAY秒内没有足够结果就同时请求下一个后端
+        self.searxng = get_searxng_pool()
+        self.hedged_search = HedgedSearch(self.search_backends())
+        
         print("🤖 Local Ollama Email Finder 已初始化")
         print("   🧠 AI引擎: 本地Ollama (完全离线)")
         print("   🔍 搜索引擎: 本地智能爬虫")
@@ -45,23 +54,36 @@ class LocalOllamaEmailFinder:
         print("   🚫 外部API: 零依赖")
         print("   ⚡ 优势: 完全自主，隐私安全")
         
+    # generate_search_strategy 的输出schema
+    STRATEGY_SCHEMA = {
+        'type': 'object',
+        'properties': {
+            'search_queries': {'type': 'array', 'items': {'type': 'string', 'minLength': 5}, 'minItems': 3, 'maxItems': 8},
+            'website_types': {'type': 'array', 'items': {'type': 'string', 'minLength': 1}, 'minItems': 1},
+            'industry_keywords': {'type': 'array', 'items': {'type': 'string', 'minLength': 1}, 'minItems': 1}
+        },
+        'required': ['search_queries', 'website_types', 'industry_keywords']
+    }
+    
+    def ask_ollama_json(self, prompt, schema, model='qwen2.5:0.5b', temperature=0.7, priority='validation'):
+        """按JSON Schema约束输出，返回校验通过的对象，失败返回None"""
+        try:
+            return self.ollama.generate_json(model, prompt, schema,
+                                             options={'temperature': temperature, 'num_ctx': 2048}, timeout=30,
+                                             priority=priority)
+        except Exception as e:
+            print(f"❌ Ollama结构化输出失败: {str(e)}")
+            return None
+    
     def ask_ollama(self, prompt, model='qwen2.5:0.5b', temperature=0.7):
         """与本地Ollama交互的通用方法"""
         try:
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': model,
-                'prompt': prompt,
-                'stream': False,
-                'options': {
-                    'temperature': temperature,
-                    'num_ctx': 2048
-                }
-            }, timeout=30)
+            response_text = self.ollama.generate(model, prompt, options={'temperature': temperature, 'num_ctx': 2048}, timeout=30)
             
-            if response.status_code == 200:
-                return response.json()['response'].strip()
+            if response_text:
+                return response_text
             else:
-                print(f"⚠️  Ollama API错误: {response.status_code}")
+                print(f"⚠️  Ollama返回空响应")
                 return None
                 
         except Exception as e:
@@ -100,24 +122,15 @@ class LocalOllamaEmailFinder:
 
 只返回JSON，不要其他文字:"""
 
-        response = self.ask_ollama(prompt, temperature=0.3)
+        strategy = self.ask_ollama_json(prompt, self.STRATEGY_SCHEMA, temperature=0.3, priority='interactive')
         
-        if response:
-            try:
-                # 提取JSON
-                json_start = response.find('{')
-                json_end = response.rfind('}') + 1
-                if json_start != -1 and json_end > json_start:
-                    strategy = json.loads(response[json_start:json_end])
-                    
-                    print(f"   ✅ 生成了搜索策略:")
-                    print(f"      📝 搜索查询: {len(strategy.get('search_queries', []))}个")
-                    print(f"      🌐 网站类型: {len(strategy.get('website_types', []))}个")
-                    print(f"      🔑 行业关键词: {len(strategy.get('industry_keywords', []))}个")
-                    
-                    return strategy
-            except json.JSONDecodeError:
-                pass
+        if strategy:
+            print(f"   ✅ 生成了搜索策略:")
+            print(f"      📝 搜索查询: {len(strategy['search_queries'])}个")
+            print(f"      🌐 网站类型: {len(strategy['website_types'])}个")
+            print(f"      🔑 行业关键词: {len(strategy['industry_keywords'])}个")
+            
+            return strategy
         
         # 备用策略
         print("   ⚠️  使用备用搜索策略")
@@ -140,57 +153,55 @@ class LocalOllamaEmailFinder:
         }
     
     def search_web_intelligently(self, query, max_results=10):
-        """智能网络搜索 - 使用多个搜索引擎"""
+        """智能网络搜索 - 多个搜索后端对冲并发，取第一个足够的结果"""
         print(f"   🔍 搜索: {query}")
         
-        search_engines = [
-            {
-                'name': 'DuckDuckGo',
-                'url': 'https://duckduckgo.com/html/',
-                'params': {'q': query}
-            },
-            {
-                'name': 'Bing', 
-                'url': 'https://www.bing.com/search',
-                'params': {'q': query, 'count': max_results}
-            }
-        ]
-        
-        all_urls = []
-        
-        for engine in search_engines:
-            try:
-                print(f"      📡 尝试{engine['name']}...")
-                
-                response = self.session.get(
-                    engine['url'], 
-                    params=engine['params'], 
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    urls = self.extract_urls_from_search_results(response.text, engine['name'])
-                    all_urls.extend(urls)
-                    print(f"         ✅ 找到{len(urls)}个URLs")
-                    
-                    if len(all_urls) >= max_results:
-                        break
-                else:
-                    print(f"         ❌ {engine['name']} 失败: {response.status_code}")
-                
-                # 搜索引擎间延迟
-                time.sleep(random.uniform(2, 4))
-                
-            except Exception as e:
-                print(f"         ❌ {engine['name']} 错误: {str(e)}")
-                continue
-        
-        # 去重并限制数量
-        unique_urls = list(set(all_urls))[:max_results]
+        results, _ = self.hedged_search.search(query, max_results)
+        unique_urls = [result['url'] for result in results]
         print(f"      📊 总共收集到{len(unique_urls)}个唯一URLs")
         
         return unique_urls
     
+    def search_backends(self):
+        """按SEARCH_BACKENDS（逗号分隔，默认 searxng,duckduckgo,bing,tavily）构建搜索后端；未配置Key的Tavily跳过"""
+        available = {
+            'searxng': ('SearxNG', self.search_searxng),
+            'duckduckgo': ('DuckDuckGo', self.search_duckduckgo),
+            'bing': ('Bing', self.search_bing),
+            'tavily': ('Tavily', self.search_tavily) if os.environ.get('TAVILY_API_KEY') else None
+        }
+        names = os.environ.get('SEARCH_BACKENDS', 'searxng,duckduckgo,bing,tavily')
+        return [available[name] for name in (n.strip().lower() for n in names.split(','))
+                if available.get(name)]
+    
+    def search_searxng(self, query, max_results):
+        response = self.searxng.get({'q': query, 'format': 'json', 'categories': 'general'}, timeout=10)
+        response.raise_for_status()
+        return [{'url': result.get('url', ''), 'title': result.get('title', ''), 'content': result.get('content', '')}
+                for result in response.json().get('results', [])[:max_results]]
+    
+    def search_html_engine(self, engine_name, url, params):
+        response = self.session.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        return [{'url': found_url} for found_url in self.extract_urls_from_search_results(response.text, engine_name)]
+    
+    def search_duckduckgo(self, query, max_results):
+        return self.search_html_engine('DuckDuckGo', 'https://duckduckgo.com/html/', {'q': query})
+    
+    def search_bing(self, query, max_results):
+        return self.search_html_engine('Bing', 'https://www.bing.com/search', {'q': query, 'count': max_results})
+    
+    def search_tavily(self, query, max_results):
+        response = self.session.post('https://api.tavily.com/search', json={
+            'api_key': os.environ.get('TAVILY_API_KEY'),
+            'query': query,
+            'search_depth': 'basic',
+            'max_results': max_results
+        }, timeout=15)
+        response.raise_for_status()
+        return [{'url': result.get('url', ''), 'title': result.get('title', ''), 'content': result.get('content', '')}
+                for result in response.json().get('results', [])]
+    
     def extract_urls_from_search_results(self, html, engine_name):
         """从搜索结果页面提取URLs"""
         soup = BeautifulSoup(html, 'html.parser')
@@ -336,49 +347,45 @@ class LocalOllamaEmailFinder:
   "company": "{result['company_name']}",
   "industry": "推测的行业",
   "background": "简要背景描述",
-  "confidence": "信心度(0.1-1.0)"
+  "confidence": 0.8
 }}
 
 只返回JSON:"""
 
-                    response = self.ask_ollama(prompt, model='llama3.2', temperature=0.3)
+                    schema = contact_profile_schema(email, {
+                        'confidence': {'type': 'number', 'minimum': 0.1, 'maximum': 1.0}
+                    })
+                    profile = self.ask_ollama_json(prompt, schema, model='llama3.2', temperature=0.3, priority='bulk')
                     
-                    if response:
-                        try:
-                            json_start = response.find('{')
-                            json_end = response.rfind('}') + 1
-                            if json_start != -1:
-                                profile = json.loads(response[json_start:json_end])
-                                
-                                # 添加额外信息
-                                profile.update({
-                                    'source_url': result['url'],
-                                    'page_title': result['page_title'],
-                                    'content_snippet': result['content_snippet'],
-                                    'found_at': datetime.now().isoformat(),
-                                    'analysis_method': 'local_ollama'
-                                })
-                                
-                                analyzed_emails.append(profile)
-                                print(f"         ✅ 生成profile: {profile.get('name', 'Unknown')}")
-                                
-                        except json.JSONDecodeError:
-                            print(f"         ⚠️  Profile生成失败，使用基础信息")
-                            # 基础profile
-                            email_prefix = email.split('@')[0]
-                            basic_profile = {
-                                'name': email_prefix.replace('.', ' ').replace('_', ' ').title(),
-                                'email': email,
-                                'title': 'Professional',
-                                'company': result['company_name'],
-                                'industry': 'Business',
-                                'background': f"Professional at {result['company_name']}",
-                                'confidence': 0.5,
-                                'source_url': result['url'],
-                                'found_at': datetime.now().isoformat(),
-                                'analysis_method': 'basic_extraction'
-                            }
-                            analyzed_emails.append(basic_profile)
+                    if profile:
+                        # 添加额外信息
+                        profile.update({
+                            'source_url': result['url'],
+                            'page_title': result['page_title'],
+                            'content_snippet': result['content_snippet'],
+                            'found_at': datetime.now().isoformat(),
+                            'analysis_method': 'local_ollama'
+                        })
+                        
+                        analyzed_emails.append(profile)
+                        print(f"         ✅ 生成profile: {profile['name']}")
+                    else:
+                        print(f"         ⚠️  Profile生成失败，使用基础信息")
+                        # 基础profile
+                        email_prefix = email.split('@')[0]
+                        basic_profile = {
+                            'name': email_prefix.replace('.', ' ').replace('_', ' ').title(),
+                            'email': email,
+                            'title': 'Professional',
+                            'company': result['company_name'],
+                            'industry': 'Business',
+                            'background': f"Professional at {result['company_name']}",
+                            'confidence': 0.5,
+                            'source_url': result['url'],
+                            'found_at': datetime.now().isoformat(),
+                            'analysis_method': 'basic_extraction'
+                        }
+                        analyzed_emails.append(basic_profile)
                     
                     # 分析间隔
                     time.sleep(1)
@@ -476,7 +483,8 @@ class LocalOllamaEmailFinder:
             'strategy': strategy,
             'total_websites_scraped': len(all_email_results),
             'total_emails_found': len(final_results),
-            'search_method': 'local_ollama_ai'
+            'search_method': 'local_ollama_ai',
+            'search_backends': self.hedged_search.summary()  # 各搜索后端的启动/胜出/失败/放弃次数
         }
 
 def main():
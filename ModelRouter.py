@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+按延迟目标路由模型
+- 每类任务有一组候选模型（从大到小）和延迟目标（秒）
+- 按每个模型最近的EWMA延迟、失败率和当前排队长度，选能满足目标的最大模型
+- 都不满足时降级到更小的模型，再不行返回None，调用方使用模板结果
+- 被降级的模型定期放行一次探测请求，恢复后自动回到大模型
+- 提供readiness时跳过未就绪的模型（预热中、服务不可达、模型未下载）；readiness不应阻塞，
+  大模型仍在加载时直接降级到已就绪的小模型或模板
+- 后台/对冲调用方可传入route(task, wait=秒)：所有候选都还在预热时，在该时间内等待最小的模型加载完成，
+  而不是把"仍在加载"当作"无法满足目标"直接返回模板
+- 路由决策与各模型状态通过summary()输出
+"""
+
+import os
+import time
+import threading
+from collections import deque
+
+
+class ModelRouter:
+    DEFAULT_LATENCY_TARGETS = {'fast': 10.0, 'general': 20.0, 'profile': 90.0}
+
+    def __init__(self, ollama, tiers, latency_targets=None, priorities=None, alpha=0.3,
+                 window=20, max_failure_rate=0.5, min_samples=3, probe_interval=60, readiness=None, usable=None):
+        self.ollama = ollama
+        self.readiness = readiness  # model -> bool（不阻塞），例如ModelWarmup.ready
+        self.usable = usable  # (model, timeout) -> bool（等待预热结束），例如ModelWarmup.usable
+        self.tiers = tiers  # 任务 -> [模型, ...]，从大到小
+        self.latency_targets = {**self.DEFAULT_LATENCY_TARGETS, **(latency_targets or {})}
+        for task in tiers:
+            # OLLAMA_SLO_<TASK> 覆盖任务的延迟目标，例如 OLLAMA_SLO_PROFILE=60
+            override = os.environ.get(f'OLLAMA_SLO_{task.upper()}')
+            if override:
+                self.latency_targets[task] = float(override)
+        self.priorities = priorities or {}  # 任务 -> 调度优先级，用于估算排队
+        self.alpha = alpha
+        self.window = window
+        self.max_failure_rate = max_failure_rate
+        self.min_samples = min_samples
+        self.probe_interval = probe_interval
+
+        self.lock = threading.Lock()
+        self.model_stats = {}
+        self.decisions = {task: {} for task in tiers}
+
+        ollama.add_listener(self.observe)
+
+    def stats_for(self, model):
+        """返回模型的状态条目（调用方需持有lock）"""
+        return self.model_stats.setdefault(model, {
+            'ewma_latency': None, 'outcomes': deque(maxlen=self.window),
+            'calls': 0, 'failures': 0, 'last_routed': 0.0
+        })
+
+    def observe(self, model, latency, failed):
+        """OllamaClient在每次实际调用（非缓存命中）结束后回调"""
+        with self.lock:
+            stats = self.stats_for(model)
+            stats['calls'] += 1
+            stats['outcomes'].append(bool(failed))
+            if failed:
+                stats['failures'] += 1
+            previous = stats['ewma_latency']
+            stats['ewma_latency'] = latency if previous is None else self.alpha * latency + (1 - self.alpha) * previous
+
+    def queue_factor(self, task):
+        """当前排队造成的延迟放大系数：1 + 排在本任务前面的请求数 / 并发槽位"""
+        scheduler = getattr(self.ollama, 'scheduler', None)
+        if not scheduler:
+            return 1.0
+        summary = scheduler.summary()
+        priority = self.priorities.get(task, 'interactive')
+        queued = 0
+        for name in scheduler.PRIORITIES:
+            queued += summary['priorities'][name]['queued']
+            if name == priority:
+                break
+        return 1.0 + queued / summary['max_concurrency']
+
+    def estimate(self, model, task):
+        """模型此刻完成该任务的预计延迟（无样本时返回None）"""
+        with self.lock:
+            latency = self.stats_for(model)['ewma_latency']
+        return None if latency is None else latency * self.queue_factor(task)
+
+    def failure_rate(self, model):
+        with self.lock:
+            outcomes = self.stats_for(model)['outcomes']
+            if len(outcomes) < self.min_samples:
+                return 0.0
+            return sum(outcomes) / len(outcomes)
+
+    def route(self, task, wait=None):
+        """为任务选择模型；返回None表示所有候选都无法满足目标，调用方应使用模板
+        wait为后台/对冲调用方剩余的时间预算（秒）：所有候选都未就绪时最多等待这么久，等最小的模型加载完成"""
+        candidates = self.tiers.get(task, [])
+        if wait and wait > 0 and candidates and self.readiness and self.usable \
+                and not any(self.readiness(model) for model in candidates):
+            self.usable(candidates[-1], timeout=wait)
+
+        target = self.latency_targets.get(task)
+        chosen, reason = None, 'template'
+        now = time.time()
+
+        for model in candidates:
+            if self.readiness and not self.readiness(model):
+                continue
+            with self.lock:
+                probe_due = now - self.stats_for(model)['last_routed'] >= self.probe_interval
+            estimate = self.estimate(model, task)
+            healthy = self.failure_rate(model) <= self.max_failure_rate
+            fast_enough = estimate is None or target is None or estimate <= target
+            if healthy and fast_enough:
+                chosen, reason = model, 'slo'
+                break
+            if probe_due:
+                # 降级的模型定期放行一次，避免旧的慢样本让它永远回不来
+                chosen, reason = model, 'probe'
+                break
+
+        with self.lock:
+            if chosen:
+                self.stats_for(chosen)['last_routed'] = now
+            key = chosen or 'template'
+            counts = self.decisions.setdefault(task, {})
+            counts[key] = counts.get(key, 0) + 1
+
+        if chosen != (candidates[0] if candidates else None):
+            print(f"   🔀 模型路由: {task} → {key} ({reason})")
+        return chosen
+
+    def summary(self):
+        """返回路由决策计数与各模型状态"""
+        with self.lock:
+            models = {}
+            for model, stats in self.model_stats.items():
+                outcomes = stats['outcomes']
+                models[model] = {
+                    'calls': stats['calls'],
+                    'failures': stats['failures'],
+                    'ewma_latency': round(stats['ewma_latency'], 3) if stats['ewma_latency'] is not None else None,
+                    'recent_failure_rate': round(sum(outcomes) / len(outcomes), 3) if outcomes else None
+                }
+            return {
+                'latency_targets': {task: self.latency_targets.get(task) for task in self.tiers},
+                'decisions': {task: dict(counts) for task, counts in self.decisions.items()},
+                'models': models
+            }
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+模型预热与就绪检查
+- 引擎启动时在后台检查 /api/tags，对配置的模型发送零token生成请求（带keep_alive）把模型加载进显存
+- 模型加载与SearxNG搜索等工作重叠，第一次LLM调用不再在用户任务中途承担几十秒的加载时间
+- ready(model) 不阻塞：预热中、服务不可达或模型不存在时返回False，路由据此选择已就绪的更小模型或模板
+- usable(model) 等待该模型预热完成（供明确需要该模型的调用方，以及有截止时间的后台路由使用）
+- 常驻进程中（OLLAMA_KEEPWARM=1）按观测到的调用间隔定时重新预热，有流量的模型不会在keep_alive到期时被卸载
+"""
+
+import os
+import re
+import time
+import threading
+import concurrent.futures
+
+import requests
+
+
+class ModelWarmup:
+    # 预热后仍不可用的状态；'failed'（例如加载超时）仍可尝试调用
+    UNUSABLE_STATES = ('missing', 'unreachable')
+
+    def __init__(self, ollama, models, keep_alive=None, load_timeout=180, idle_factor=3, max_idle=None):
+        self.ollama = ollama
+        self.models = list(dict.fromkeys(models))
+        self.keep_alive = keep_alive or ollama.keep_alive
+        self.load_timeout = load_timeout
+        self.idle_factor = idle_factor  # 流量间隔的几倍时间内没有新调用就不再保温
+        self.max_idle = max_idle if max_idle is not None else float(os.environ.get('OLLAMA_KEEPWARM_MAX_IDLE', '7200'))
+
+        self.lock = threading.Lock()
+        self.started = False
+        self.done = threading.Event()
+        self.model_events = {model: threading.Event() for model in self.models}
+        self.states = {model: {'state': 'pending', 'load_seconds': None, 'error': None, 'warmups': 0}
+                       for model in self.models}
+        self.report = None
+
+        # 观测到的流量：上次调用时间、EWMA调用间隔、上次预热时间
+        self.traffic = {}
+        self.stop_event = threading.Event()
+        self.keepwarm_thread = None
+
+        ollama.add_listener(self.observe)
+
+    def start(self):
+        """后台执行预热（重复调用无效），返回self"""
+        with self.lock:
+            if self.started:
+                return self
+            self.started = True
+        threading.Thread(target=self.warmup, daemon=True).start()
+        return self
+
+    def warmup(self, models=None):
+        """检查 /api/tags 并并发预热模型（默认全部），返回就绪报告"""
+        started_at = time.time()
+        models = list(models or self.models)
+        available = self.available_models()
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, len(models))) as executor:
+            for model in models:
+                if available is None:
+                    self.set_state(model, 'unreachable', error='Ollama服务不可达')
+                elif self.normalize(model) not in available:
+                    self.set_state(model, 'missing', error='模型未下载 (ollama pull)')
+                else:
+                    executor.submit(self.warm_model, model)
+
+        ready = [model for model in self.models if self.states[model]['state'] == 'ready']
+        self.report = {
+            'reachable': available is not None,
+            'ready': len(ready) == len(self.models),
+            'ready_models': ready,
+            'models': {model: dict(state) for model, state in self.states.items()},
+            'seconds': round(time.time() - started_at, 2)
+        }
+        if self.report['ready']:
+            print(f"   🔥 模型预热完成: {', '.join(ready)} ({self.report['seconds']}秒)")
+        else:
+            not_ready = {model: self.states[model]['state'] for model in self.models if model not in ready}
+            print(f"   ⚠️  模型未全部就绪: {not_ready}")
+        self.done.set()
+
+        if os.environ.get('OLLAMA_KEEPWARM', '0') == '1':
+            self.start_keepwarm()
+        return self.report
+
+    def available_models(self):
+        """读取 /api/tags，服务不可达时返回None"""
+        try:
+            response = self.ollama.session.get(f"{self.ollama.base_url}/api/tags",
+                                               timeout=(self.ollama.connect_timeout, 10))
+            response.raise_for_status()
+            return {self.normalize(entry.get('name') or entry.get('model', ''))
+                    for entry in response.json().get('models', [])}
+        except (requests.RequestException, ValueError) as e:
+            print(f"   ❌ 无法连接Ollama ({self.ollama.base_url}): {e}")
+            return None
+
+    def warm_model(self, model):
+        """零token生成：只加载模型，不生成内容（空提示词时Ollama仅加载模型）"""
+        started_at = time.time()
+        try:
+            data = self.ollama.post('/api/generate', {
+                'model': model,
+                'prompt': '',
+                'stream': False,
+                'keep_alive': self.keep_alive,
+                'options': {'num_predict': 0}
+            }, timeout=self.load_timeout)
+            load_seconds = data.get('load_duration', 0) / 1e9 or time.time() - started_at
+            self.set_state(model, 'ready', load_seconds=round(load_seconds, 2))
+        except Exception as e:
+            # 不只是OllamaError：JSON解码失败、逃出重试的网络异常等也要结束预热，否则usable()会一直等到超时
+            self.set_state(model, 'failed', error=f'{type(e).__name__}: {e}')
+        finally:
+            self.model_events[model].set()
+            with self.lock:
+                self.traffic.setdefault(model, {'last_used': None, 'gap': None, 'last_warm': 0.0})['last_warm'] = time.time()
+
+    def set_state(self, model, state, load_seconds=None, error=None):
+        with self.lock:
+            entry = self.states[model]
+            entry['state'] = state
+            entry['error'] = error
+            if state == 'ready':
+                entry['warmups'] += 1
+                entry['load_seconds'] = load_seconds
+        self.model_events[model].set()
+
+    def ready(self, model):
+        """非阻塞就绪检查（供ModelRouter使用）：预热中的模型本次视为未就绪，路由改用其他模型或模板"""
+        if not self.started or model not in self.model_events:
+            return True
+        state = self.states[model]['state']
+        return state != 'pending' and state not in self.UNUSABLE_STATES
+
+    def usable(self, model, timeout=None):
+        """等待模型预热结束；服务不可达或模型不存在时返回False（未预热的模型视为可用）"""
+        event = self.model_events.get(model)
+        if not self.started or event is None:
+            return True
+        event.wait(self.load_timeout if timeout is None else timeout)
+        return self.states[model]['state'] not in self.UNUSABLE_STATES
+
+    def wait(self, timeout=None):
+        """等待预热完成，返回就绪报告（未完成时为None）"""
+        self.done.wait(timeout)
+        return self.report
+
+    def observe(self, model, latency, failed):
+        """OllamaClient每次实际调用后回调，记录流量"""
+        now = time.time()
+        with self.lock:
+            entry = self.traffic.setdefault(model, {'last_used': None, 'gap': None, 'last_warm': 0.0})
+            if entry['last_used'] is not None:
+                gap = now - entry['last_used']
+                entry['gap'] = gap if entry['gap'] is None else 0.3 * gap + 0.7 * entry['gap']
+            entry['last_used'] = now
+
+    @staticmethod
+    def parse_duration(value):
+        """把keep_alive（'30m'、'1h'、'300'、'5m30s'）转换为秒；负数表示永久常驻，返回None"""
+        value = str(value).strip()
+        if re.fullmatch(r'-?\d+(\.\d+)?', value):
+            seconds = float(value)
+        else:
+            units = {'h': 3600, 'm': 60, 's': 1}
+            parts = re.findall(r'(\d+(?:\.\d+)?)([hms])', value)
+            seconds = sum(float(number) * units[unit] for number, unit in parts)
+        return None if seconds < 0 else seconds
+
+    def due_models(self, now=None):
+        """需要重新预热的模型：最近有流量，且距上次调用/预热已接近keep_alive到期"""
+        keep_alive = self.parse_duration(self.keep_alive)
+        if not keep_alive:
+            return []
+        now = now or time.time()
+        due = []
+        with self.lock:
+            for model in self.models:
+                entry = self.traffic.get(model)
+                if not entry or entry['last_used'] is None:
+                    continue  # 启动后从未被调用过，不保温
+                # 流量越稀疏，保温窗口越长，但至少一个keep_alive、至多max_idle
+                horizon = min(max(self.idle_factor * (entry['gap'] or 0), keep_alive), self.max_idle)
+                if now - entry['last_used'] > horizon:
+                    continue
+                last_activity = max(entry['last_used'], entry['last_warm'])
+                if now - last_activity >= keep_alive * 0.75:
+                    due.append(model)
+        return due
+
+    def start_keepwarm(self, interval=None):
+        """常驻进程中定时保温有流量的模型"""
+        keep_alive = self.parse_duration(self.keep_alive)
+        if not keep_alive or self.keepwarm_thread:
+            return
+        interval = interval or max(5.0, min(60.0, keep_alive / 4))
+
+        def loop():
+            while not self.stop_event.wait(interval):
+                for model in self.due_models():
+                    if self.states[model]['state'] in self.UNUSABLE_STATES:
+                        continue
+                    print(f"   🔥 保温模型: {model}")
+                    self.warm_model(model)
+
+        self.keepwarm_thread = threading.Thread(target=loop, daemon=True)
+        self.keepwarm_thread.start()
+        print(f"   🔥 模型保温已启用 (每{interval:.0f}秒检查，keep_alive={self.keep_alive})")
+
+    def stop(self):
+        self.stop_event.set()
+
+    @staticmethod
+    def normalize(model):
+        """Ollama把未带标签的模型报告为 '<name>:latest'"""
+        return model if ':' in model else f'{model}:latest'
+
+    def summary(self):
+        """返回就绪报告与保温统计"""
+        with self.lock:
+            return {
+                'report': self.report,
+                'keepwarm': self.keepwarm_thread is not None,
+                'models': {model: dict(state) for model, state in self.states.items()}
+            }
+
+
+_warmups = {}
+_warmups_lock = threading.Lock()
+
+
+def get_model_warmup(ollama, models):
+    """返回进程内共享的预热器（同一Ollama服务只预热一次；后续引擎追加的模型单独预热）"""
+    with _warmups_lock:
+        warmup = _warmups.get(ollama.base_url)
+        if warmup is None:
+            warmup = _warmups[ollama.base_url] = ModelWarmup(ollama, models)
+            return warmup
+        missing = [model for model in dict.fromkeys(models) if model not in warmup.model_events]
+    if missing:
+        with warmup.lock:
+            for model in missing:
+                warmup.models.append(model)
+                warmup.model_events[model] = threading.Event()
+                warmup.states[model] = {'state': 'pending', 'load_seconds': None, 'error': None, 'warmups': 0}
+        if warmup.started:
+            threading.Thread(target=warmup.warmup, args=(missing,), daemon=True).start()
+    return warmup
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+客户端请求攒批器
+- 把几毫秒内到达的 /api/generate 请求合并为一次 /api/batch_generate 调用（Modal端点提供）
+- 服务端按并行槽位并发执行，逐条流式返回；每条结果到达即唤醒对应的调用方
+- 缩容到零的远程端点上，很多小提示词（画像、查询变体）不再各付一次HTTP往返和调度开销
+- 提供调度器时每批只占用一个调度槽位（按批内最高优先级排队），单条请求不再各占槽位，
+  否则一批永远不超过并行槽位数
+"""
+
+import json
+import time
+import queue
+import threading
+import contextlib
+import concurrent.futures
+
+import requests
+
+from LLMScheduler import LLMScheduler, LLMQueueFull
+
+
+class OllamaBatchError(Exception):
+    """批量请求中的单条请求失败（retryable表示连接错误、超时或5xx，可以重试）"""
+
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class OllamaBatcher:
+    def __init__(self, base_url, session=None, window_ms=5, max_batch=16, timeout=300, max_inflight_batches=4,
+                 scheduler=None):
+        self.url = f"{base_url.rstrip('/')}/api/batch_generate"
+        self.session = session or requests.Session()
+        self.scheduler = scheduler  # 每批占用一个槽位
+        self.window = window_ms / 1000.0
+        self.max_batch = max_batch
+        self.timeout = timeout
+
+        self.pending = queue.Queue()
+        self.senders = concurrent.futures.ThreadPoolExecutor(max_workers=max_inflight_batches)
+        self.lock = threading.Lock()
+        self.stats = {'batches': 0, 'items': 0, 'failed_items': 0, 'max_batch_size': 0}
+
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    def submit(self, payload, priority='validation'):
+        """提交一个 /api/generate 请求体，返回Future（结果为Ollama的响应JSON）"""
+        future = concurrent.futures.Future()
+        self.pending.put((payload, future, priority))
+        return future
+
+    def generate(self, payload, timeout=None, priority='validation'):
+        """提交并等待结果，失败抛出OllamaBatchError"""
+        try:
+            return self.submit(payload, priority).result(timeout or self.timeout)
+        except concurrent.futures.TimeoutError:
+            raise OllamaBatchError(f'批量请求超过{timeout or self.timeout}秒未返回')
+
+    def _collect(self):
+        """收集窗口期内的请求，凑成一批后交给发送线程"""
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.time() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.senders.submit(self._send, batch)
+
+    def _send(self, batch):
+        """发送一批请求，逐行解析流式结果并完成对应的Future"""
+        with self.lock:
+            self.stats['batches'] += 1
+            self.stats['items'] += len(batch)
+            self.stats['max_batch_size'] = max(self.stats['max_batch_size'], len(batch))
+
+        error, retryable = None, True
+        priority = min((priority for _, _, priority in batch), key=LLMScheduler.PRIORITIES.index)
+        try:
+            with self.scheduler.slot(priority) if self.scheduler else contextlib.nullcontext():
+                payloads = [dict(payload, stream=False) for payload, _, _ in batch]
+                with self.session.post(self.url, json={'requests': payloads}, stream=True,
+                                       timeout=(5, self.timeout)) as response:
+                    if response.status_code != 200:
+                        error = f"HTTP {response.status_code}: {response.text[:200]}"
+                        retryable = response.status_code >= 500
+                    else:
+                        for line in response.iter_lines():
+                            if not line:
+                                continue
+                            item = json.loads(line)
+                            future = batch[item.pop('index')][1]
+                            if 'error' in item:
+                                # 服务端单条请求的4xx（如模型不存在）重试无意义
+                                future.set_exception(OllamaBatchError(
+                                    item['error'], retryable=not str(item['error']).startswith('HTTP 4')))
+                            else:
+                                future.set_result(item)
+        except LLMQueueFull as e:
+            error, retryable = f'LLM请求被调度器拒绝: {e}', False
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(OllamaBatchError(error or '批量响应中缺少该请求的结果', retryable=retryable))
+        failed = sum(1 for _, future, _ in batch if future.exception() is not None)
+        if failed:
+            with self.lock:
+                self.stats['failed_items'] += failed
+
+    def summary(self):
+        """返回攒批统计"""
+        with self.lock:
+            stats = dict(self.stats)
+        stats['avg_batch_size'] = round(stats['items'] / stats['batches'], 2) if stats['batches'] else None
+        return stats
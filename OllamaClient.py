@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+共享Ollama客户端
+- 所有引擎共用一个连接池HTTP会话，避免每次调用重新建连
+- 连接/读取超时，单个卡住的生成不会拖死整个任务
+- keep_alive 固定模型常驻显存，避免调用之间被卸载
+- 带抖动的指数退避重试（连接错误、超时、5xx）
+- 按模型统计调用延迟与token用量
+- 持久化响应缓存：相同模型+提示词+选项直接返回缓存结果（fresh=True跳过查找以获得新采样）
+- 结构化输出：generate_json 通过format传入JSON Schema，严格校验并有限次修复
+- 优先级调度：并发不超过服务端并行槽位，策略生成优先于辅助调用和批量画像
+- 流式生成：generate_lines 按行产出生成中的文本，调用方可以边生成边执行
+- 攒批：OLLAMA_BATCH_WINDOW_MS>0 时几毫秒内的生成请求合并为一次 /api/batch_generate（需Modal端点），
+  每批占用一个调度槽位，与单条请求一样重试并统计指标
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import contextlib
+import requests
+from requests.adapters import HTTPAdapter
+from LLMResponseCache import LLMResponseCache
+import JsonSchema
+from LLMScheduler import LLMScheduler, LLMQueueFull
+from OllamaBatcher import OllamaBatcher, OllamaBatchError
+
+
+class OllamaError(Exception):
+    """Ollama调用在重试后仍然失败"""
+
+
+class OllamaSchemaError(OllamaError):
+    """结构化输出在修复后仍不符合schema"""
+
+
+class OllamaClient:
+    def __init__(self, base_url=None, connect_timeout=5, read_timeout=120, keep_alive=None,
+                 max_retries=2, backoff=0.5, pool_size=16, cache=None, scheduler=None):
+        self.base_url = (base_url or os.environ.get('OLLAMA_URL', 'http://localhost:11434')).rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.keep_alive = keep_alive or os.environ.get('OLLAMA_KEEP_ALIVE', '30m')
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # OLLAMA_CACHE=0 关闭响应缓存
+        if cache is None and os.environ.get('OLLAMA_CACHE', '1') != '0':
+            cache = LLMResponseCache()
+        self.cache = cache or None
+
+        # 同一Ollama服务的所有调用共用一个调度器（客户端按URL在进程内共享）
+        self.scheduler = scheduler or LLMScheduler()
+
+        # 远程Modal端点上把并发的小请求攒成一批发送（0表示关闭；普通Ollama服务没有批量接口）
+        batch_window_ms = float(os.environ.get('OLLAMA_BATCH_WINDOW_MS', '0'))
+        self.batcher = (OllamaBatcher(self.base_url, self.session, window_ms=batch_window_ms, scheduler=self.scheduler)
+                        if batch_window_ms > 0 else None)
+
+        self.metrics_lock = threading.Lock()
+        self.model_metrics = {}
+        self.listeners = []
+
+    def is_batched(self, path):
+        return self.batcher is not None and path == '/api/generate'
+
+    def post(self, path, payload, timeout=None, priority='validation'):
+        """POST到Ollama API，失败时带抖动重试，返回解析后的JSON（攒批的请求同样重试）"""
+        read_timeout = timeout or self.read_timeout
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            if self.is_batched(path):
+                try:
+                    return self.batcher.generate(payload, read_timeout, priority)
+                except OllamaBatchError as e:
+                    last_error = f"批量请求失败: {e}"
+                    if not e.retryable:
+                        break
+                self.record(payload.get('model'), retried=attempt < self.max_retries)
+                continue
+            try:
+                response = self.session.post(f"{self.base_url}{path}", json=payload,
+                                             timeout=(self.connect_timeout, read_timeout))
+                if response.status_code == 200:
+                    return response.json()
+                last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code < 500:
+                    break  # 4xx（如模型不存在）重试无意义
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = f"{type(e).__name__}: {e}"
+            self.record(payload.get('model'), retried=attempt < self.max_retries)
+
+        raise OllamaError(last_error)
+
+    def generate(self, model, prompt, options=None, system=None, format=None, timeout=None,
+                 keep_alive=None, raw=False, fresh=False, cache_if=None, priority='validation', **extra):
+        """调用 /api/generate，返回生成的文本（raw=True时返回完整响应）
+
+        fresh=True 表示调用方需要新的采样（例如同一提示词多轮生成不同查询），
+        temperature > 0 时跳过缓存查找，新结果仍写入缓存。
+        cache_if(text) 返回False的响应不写入缓存。
+        priority 为调度优先级：interactive / validation / bulk。
+        """
+        payload = {
+            'model': model,
+            'prompt': prompt,
+            'stream': False,
+            'keep_alive': keep_alive or self.keep_alive,
+            'options': options or {},
+            **extra
+        }
+        if system:
+            payload['system'] = system
+        if format:
+            payload['format'] = format
+
+        data = self.cached_post('/api/generate', payload, timeout, fresh,
+                                cache_if and (lambda data: cache_if(data.get('response', ''))), priority)
+        return data if raw else data.get('response', '').strip()
+
+    def generate_lines(self, model, prompt, options=None, system=None, timeout=None, keep_alive=None,
+                       fresh=False, priority='interactive', **extra):
+        """流式调用 /api/generate，每生成完整的一行就产出该行（已去除首尾空白，跳过空行）
+
+        整个生成期间占用一个调度槽位；调用方提前停止迭代时连接随即关闭、槽位释放。
+        缓存命中时直接按行产出缓存的响应；完整生成的响应写入缓存，与generate共用缓存键。
+        """
+        payload = {
+            'model': model,
+            'prompt': prompt,
+            'stream': True,
+            'keep_alive': keep_alive or self.keep_alive,
+            'options': options or {},
+            **extra
+        }
+        if system:
+            payload['system'] = system
+
+        key = None
+        if self.cache:
+            key = self.cache.key('/api/generate', payload)
+            if fresh and payload['options'].get('temperature', 0.8) > 0:
+                self.cache.bypass()
+            else:
+                data = self.cache.get(key)
+                if data is not None:
+                    self.record(model, cache_hit=True)
+                    for line in data.get('response', '').splitlines():
+                        if line.strip():
+                            yield line.strip()
+                    return
+
+        try:
+            with self.scheduler.slot(priority):
+                start_time = time.time()
+                try:
+                    response = self.open_stream('/api/generate', payload, timeout)
+                except OllamaError:
+                    self.record(model, latency=time.time() - start_time, failed=True)
+                    raise
+                text, pending, final = '', '', {}
+                try:
+                    for raw_line in response.iter_lines():
+                        if not raw_line:
+                            continue
+                        chunk = json.loads(raw_line)
+                        if chunk.get('error'):
+                            raise OllamaError(chunk['error'])
+                        piece = chunk.get('response', '')
+                        text += piece
+                        pending += piece
+                        while '\n' in pending:
+                            line, pending = pending.split('\n', 1)
+                            if line.strip():
+                                yield line.strip()
+                        if chunk.get('done'):
+                            final = chunk
+                            break
+                except (requests.RequestException, ValueError) as e:
+                    self.record(model, latency=time.time() - start_time, failed=True)
+                    raise OllamaError(f"流式响应中断: {e}")
+                except OllamaError:
+                    self.record(model, latency=time.time() - start_time, failed=True)
+                    raise
+                finally:
+                    response.close()
+
+                if pending.strip():
+                    yield pending.strip()
+                self.record(model, latency=time.time() - start_time, data=final)
+        except LLMQueueFull as e:
+            raise OllamaError(f'LLM请求被调度器拒绝: {e}')
+
+        if key and final and text.strip():
+            self.cache.put(key, {**final, 'response': text})
+
+    def open_stream(self, path, payload, timeout=None):
+        """建立流式请求，连接失败时带抖动重试（开始接收后不再重试），返回响应对象"""
+        read_timeout = timeout or self.read_timeout
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+            try:
+                response = self.session.post(f"{self.base_url}{path}", json=payload, stream=True,
+                                             timeout=(self.connect_timeout, read_timeout))
+                if response.status_code == 200:
+                    return response
+                last_error = f"HTTP {response.status_code}: {response.text[:200]}"
+                response.close()
+                if response.status_code < 500:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = f"{type(e).__name__}: {e}"
+            self.record(payload.get('model'), retried=attempt < self.max_retries)
+
+        raise OllamaError(last_error)
+
+    def generate_json(self, model, prompt, schema, options=None, timeout=None, max_repairs=1,
+                      fresh=False, priority='validation', **kwargs):
+        """按JSON Schema生成结构化输出，返回校验通过的对象
+
+        schema通过format参数交给Ollama做约束解码；返回值仍经过严格校验，
+        不通过时把错误反馈给模型修复，最多max_repairs次，仍失败抛出OllamaSchemaError。
+        """
+        is_valid = lambda text: not JsonSchema.parse(text, schema)[1]
+        text = self.generate(model, prompt, options=options, format=schema, timeout=timeout,
+                             fresh=fresh, cache_if=is_valid, priority=priority, **kwargs)
+
+        for attempt in range(max_repairs + 1):
+            value, errors = JsonSchema.parse(text, schema)
+            if not errors:
+                self.record_json(model, first_pass=attempt == 0, repaired=attempt > 0)
+                if attempt > 0 and self.cache:
+                    # 修复结果记在原始请求的缓存键下，重复请求不必再走一遍生成+修复
+                    original = {'model': model, 'prompt': prompt, 'options': options or {}, 'format': schema, **kwargs}
+                    self.cache.put(self.cache.key('/api/generate', original), {'response': text})
+                return value
+            if attempt == max_repairs:
+                break
+
+            repair_prompt = f"""{prompt}
+
+Your previous answer did not match the required JSON schema:
+{text[:1500]}
+
+Problems:
+{chr(10).join('- ' + error for error in errors[:8])}
+
+Return the corrected JSON only:"""
+            text = self.generate(model, repair_prompt, options=options, format=schema, timeout=timeout,
+                                 fresh=True, cache_if=is_valid, priority=priority, **kwargs)
+
+        self.record_json(model, first_pass=False, repaired=False)
+        raise OllamaSchemaError(f"结构化输出修复{max_repairs}次后仍无效: {'; '.join(errors[:3])}")
+
+    def chat(self, model, messages, tools=None, options=None, format=None, timeout=None,
+             keep_alive=None, raw=False, fresh=False, priority='validation', **extra):
+        """调用 /api/chat，返回助手消息（raw=True时返回完整响应）"""
+        payload = {
+            'model': model,
+            'messages': messages,
+            'stream': False,
+            'keep_alive': keep_alive or self.keep_alive,
+            'options': options or {},
+            **extra
+        }
+        if tools:
+            payload['tools'] = tools
+        if format:
+            payload['format'] = format
+
+        data = self.cached_post('/api/chat', payload, timeout, fresh, priority=priority)
+        return data if raw else data.get('message', {})
+
+    def cached_post(self, path, payload, timeout, fresh=False, cache_if=None, priority='validation'):
+        """先查响应缓存，未命中时调用Ollama并写入缓存（命中缓存不占用调度槽位）"""
+        if not self.cache:
+            return self.timed_post(path, payload, timeout, priority)
+
+        key = self.cache.key(path, payload)
+        # Ollama默认temperature为0.8；temperature为0时输出确定，fresh无意义
+        if fresh and payload['options'].get('temperature', 0.8) > 0:
+            self.cache.bypass()
+        else:
+            data = self.cache.get(key)
+            if data is not None:
+                self.record(payload['model'], cache_hit=True)
+                return data
+
+        data = self.timed_post(path, payload, timeout, priority)
+        message = data.get('message', {})
+        if data.get('response', '').strip() or message.get('content') or message.get('tool_calls'):
+            if cache_if is None or cache_if(data):  # 空响应、不合格的结构化输出不缓存
+                self.cache.put(key, data)
+        return data
+
+    def timed_post(self, path, payload, timeout, priority='validation'):
+        """经调度器排队后POST，统计服务延迟与token（排队时间由调度器统计）
+        攒批的请求不单独占用槽位，由攒批器每批占用一个"""
+        try:
+            with contextlib.nullcontext() if self.is_batched(path) else self.scheduler.slot(priority):
+                start_time = time.time()
+                try:
+                    data = self.post(path, payload, timeout, priority)
+                except OllamaError:
+                    self.record(payload['model'], latency=time.time() - start_time, failed=True)
+                    raise
+        except LLMQueueFull as e:
+            raise OllamaError(f'LLM请求被调度器拒绝: {e}')
+        self.record(payload['model'], latency=time.time() - start_time, data=data)
+        return data
+
+    def model_entry(self, model):
+        """返回模型的指标条目（调用方需持有metrics_lock）"""
+        return self.model_metrics.setdefault(model, {
+            'calls': 0, 'failures': 0, 'retries': 0, 'cache_hits': 0,
+            'json_calls': 0, 'json_first_pass_failures': 0, 'json_repaired': 0, 'json_failures': 0,
+            'total_latency': 0.0, 'max_latency': 0.0,
+            'prompt_tokens': 0, 'completion_tokens': 0,
+            'prompt_eval_seconds': 0.0, 'eval_seconds': 0.0, 'load_seconds': 0.0
+        })
+
+    def add_listener(self, listener):
+        """注册listener(model, latency, failed)，每次实际调用Ollama结束后回调（缓存命中不回调）"""
+        self.listeners.append(listener)
+
+    def record(self, model, latency=None, data=None, failed=False, retried=False, cache_hit=False):
+        """记录单次调用指标"""
+        with self.metrics_lock:
+            metrics = self.model_entry(model)
+            if retried:
+                metrics['retries'] += 1
+            if cache_hit:
+                metrics['cache_hits'] += 1
+            if latency is None:
+                return
+            metrics['calls'] += 1
+            metrics['total_latency'] += latency
+            metrics['max_latency'] = max(metrics['max_latency'], latency)
+            if failed:
+                metrics['failures'] += 1
+            if data:
+                # Ollama的duration字段单位为纳秒
+                metrics['prompt_tokens'] += data.get('prompt_eval_count', 0)
+                metrics['completion_tokens'] += data.get('eval_count', 0)
+                metrics['prompt_eval_seconds'] += data.get('prompt_eval_duration', 0) / 1e9
+                metrics['eval_seconds'] += data.get('eval_duration', 0) / 1e9
+                metrics['load_seconds'] += data.get('load_duration', 0) / 1e9
+
+        for listener in self.listeners:
+            listener(model, latency, failed)
+
+    def record_json(self, model, first_pass, repaired):
+        """记录一次结构化输出的结果：首次即通过 / 修复后通过 / 最终失败"""
+        with self.metrics_lock:
+            metrics = self.model_entry(model)
+            metrics['json_calls'] += 1
+            if not first_pass:
+                metrics['json_first_pass_failures'] += 1
+            if repaired:
+                metrics['json_repaired'] += 1
+            elif not first_pass:
+                metrics['json_failures'] += 1
+
+    def metrics(self):
+        """返回按模型汇总的调用指标"""
+        with self.metrics_lock:
+            snapshot = {model: dict(metrics) for model, metrics in self.model_metrics.items()}
+        for metrics in snapshot.values():
+            calls = metrics['calls']
+            metrics['avg_latency'] = round(metrics['total_latency'] / calls, 3) if calls else None
+            # 复用KV前缀时prompt_eval_count只计入新评估的token，这两项随之下降
+            metrics['avg_prompt_tokens'] = round(metrics['prompt_tokens'] / calls, 1) if calls else None
+            metrics['avg_prompt_eval_seconds'] = round(metrics['prompt_eval_seconds'] / calls, 3) if calls else None
+            metrics['tokens_per_second'] = (round(metrics['completion_tokens'] / metrics['eval_seconds'], 1)
+                                            if metrics['eval_seconds'] else None)
+            metrics['json_parse_failure_rate'] = (round(metrics['json_first_pass_failures'] / metrics['json_calls'], 3)
+                                                  if metrics['json_calls'] else None)
+        return snapshot
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_ollama_client(base_url=None):
+    """返回进程内共享的Ollama客户端（按base_url复用连接池和指标）"""
+    base_url = (base_url or os.environ.get('OLLAMA_URL', 'http://localhost:11434')).rstrip('/')
+    with _clients_lock:
+        if base_url not in _clients:
+            _clients[base_url] = OllamaClient(base_url)
+        return _clients[base_url]
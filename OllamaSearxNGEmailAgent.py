@@ -21,19 +21,77 @@ from urllib.parse import quote, urlencode
 from bs4 import BeautifulSoup
 import concurrent.futures
 import threading
+from OllamaClient import get_ollama_client
+from JsonSchema import query_list_schema
+from BatchProfiler import BatchProfiler
+from HedgedRecords import HedgedRecords
+from ModelRouter import ModelRouter
+from ModelWarmup import get_model_warmup
+from ResultRanker import ResultRanker
+from AdaptivePager import AdaptivePager
+from SearxNGPool import get_searxng_pool, default_searxng_urls
 
 class OllamaSearxNGEmailAgent:
-    def __init__(self):
+    def __init__(self, on_update=None):
         # Ollama配置
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
         self.models = {
             'fast': 'qwen2.5:0.5b',  # 快速模型用于策略生成
             'general': 'qwen2.5:0.5b',  # 通用模型
             'profile': 'llama3.2'  # 高质量模型用于用户画像生成
         }
         
-        # SearxNG配置 - JSON格式已启用
-        self.searxng_url = 'http://localhost:8080'
+        # 按延迟目标路由：每类任务选当前能满足延迟目标的最大模型，负载高时降级到小模型或模板
+        # （OLLAMA_SLO_FAST / OLLAMA_SLO_PROFILE 调整目标秒数）
+        self.model_tiers = {
+            'fast': ['llama3.2', 'qwen2.5:0.5b'],
+            'general': ['llama3.2', 'qwen2.5:0.5b'],
+            'profile': ['llama3.2', 'qwen2.5:0.5b']
+        }
+        # 启动时后台预热所有候选模型，与搜索并行加载；路由跳过预热中和不可用的模型，
+        # 对冲的后台调用在截止时间内等待最小的模型加载完成
+        self.warmup = get_model_warmup(
+            self.ollama, [model for models in self.model_tiers.values() for model in models]
+        ).start()
+        self.router = ModelRouter(self.ollama, self.model_tiers, priorities={'profile': 'bulk'},
+                                  readiness=self.warmup.ready, usable=self.warmup.usable)
+        
+        # 批量画像：一次调用处理多个邮箱，失败的回退到模板画像（OLLAMA_BATCH_PROFILES=0 仅用模板）
+        self.llm_profiles_enabled = os.environ.get('OLLAMA_BATCH_PROFILES', '1') != '0'
+        self.profiler = BatchProfiler(
+            self.ollama, self.models['profile'],
+            fields={
+                'estimated_role': str, 'company_size': str, 'decision_level': str,
+                'communication_style': str, 'pain_points': list, 'best_contact_time': str,
+                'email_strategy': str, 'personalization_tips': list, 'confidence_score': float
+            },
+            instructions=(
+                "为以下每个邮箱用户生成商业用户画像：推测职位角色 (CEO, Sales, Marketing, Support等)、"
+                "公司规模 (Startup, SME, Enterprise)、决策能力 (High, Medium, Low)、"
+                "沟通风格 (Formal, Casual, Technical)、主要痛点、最佳联系时间、邮件策略和个性化建议，"
+                "confidence_score为0到1之间的数字。"
+            ),
+            num_ctx=4096,
+            router=self.router
+        )
+        
+        # 对冲模式：模板策略/画像立即返回，LLM在截止时间内于后台替换（OLLAMA_HEDGED=0 关闭）
+        self.hedge_enabled = os.environ.get('OLLAMA_HEDGED', '1') != '0'
+        self.hedge_deadlines = {
+            'strategy': float(os.environ.get('OLLAMA_HEDGE_STRATEGY_DEADLINE', '30')),
+            'profile': float(os.environ.get('OLLAMA_HEDGE_PROFILE_DEADLINE', '120'))
+        }
+        self.on_update = on_update  # 接收LLM替换模板的流式更新
+        
+        # 爬取前按相关性排序，每个策略只爬取得分最高的URL（DISCOVERY_STRATEGY_FETCH_BUDGET）
+        self.ranker = ResultRanker(ollama=self.ollama)
+        
+        # SearxNG配置 - JSON格式已启用；多个实例（SEARXNG_URLS）按负载路由
+        self.searxng_urls = default_searxng_urls()
+        self.searxng = get_searxng_pool(self.searxng_urls)
+        # 第1页联系指示多的查询并发翻页，新增结果变少时停止
+        self.pager = AdaptivePager(self.fetch_searxng_page, log=print)
         
         # 网络搜索会话
         self.session = requests.Session()
@@ -58,13 +116,18 @@ class OllamaSearxNGEmailAgent:
         print(f"   🧠 Fast Model: {self.models['fast']} (策略生成)")
         print(f"   🔍 General Model: {self.models['general']} (搜索优化)")  
         print(f"   👤 Profile Model: {self.models['profile']} (用户画像)")
-        print(f"   🌐 SearxNG: {self.searxng_url} (JSON格式)")
+        print(f"   🌐 SearxNG: {', '.join(self.searxng_urls)} (JSON格式)")
         print("   ⚡ 特色: Ollama直接控制SearxNG进行智能邮箱搜索")
         
-    def call_ollama(self, prompt, model_type='fast', options=None):
-        """调用Ollama API"""
+    def call_ollama(self, prompt, model_type='fast', options=None, schema=None, timeout=None, wait=False):
+        """调用Ollama API（提供schema时返回按JSON Schema校验通过的对象）
+        wait=True用于有截止时间的后台调用：模型仍在预热时在timeout内等待，等待时间计入timeout"""
         try:
-            model = self.models.get(model_type, self.models['fast'])
+            started_at = time.time()
+            model = self.router.route(model_type, wait=timeout if wait else None)
+            if model is None:
+                print(f"   ⚠️  {model_type}任务的所有模型都无法满足延迟目标，使用模板结果")
+                return None
             default_options = {
                 'temperature': 0.8 if model_type == 'profile' else 0.7,
                 'num_predict': 500 if model_type == 'profile' else 200,
@@ -76,34 +139,43 @@ class OllamaSearxNGEmailAgent:
                 
             print(f"   🧠 调用 {model_type} 模型 ({model}) 进行处理...")
             
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': model,
-                'prompt': prompt,
-                'stream': False,
-                'options': default_options
-            })  # 移除超时限制，让Ollama有充分时间处理
-            
-            if response.status_code == 200:
-                return response.json()['response'].strip()
-            else:
-                print(f"   ❌ Ollama API错误: {response.status_code}")
-                return None
+            # 画像生成较慢，给足读取超时；策略生成应快速返回
+            if timeout is None:
+                timeout = 180 if model_type == 'profile' else 60
+            elif wait:
+                timeout = max(1, timeout - (time.time() - started_at))
+            # 画像属于批量任务，不能挡住策略生成
+            priority = 'bulk' if model_type == 'profile' else 'interactive'
+            if schema:
+                return self.ollama.generate_json(model, prompt, schema, options=default_options, timeout=timeout,
+                                                 priority=priority)
+            return self.ollama.generate(model, prompt, options=default_options, timeout=timeout, priority=priority)
                 
         except Exception as e:
             print(f"   ❌ Ollama调用失败: {str(e)}")
             return None
     
     def generate_intelligent_search_strategy(self, industry, target_goal="partnership"):
-        """使用Ollama生成智能搜索策略（带快速模板回退）"""
+        """使用Ollama生成智能搜索策略（带快速模板回退）
+        对冲模式下LLM在策略截止时间内返回时使用LLM策略，超时或失败时使用模板策略；
+        完整发现流程不等待，直接用start_hedged_search_strategy边执行边替换"""
         try:
             print(f"🧠 为'{industry}'行业生成智能搜索策略...")
             
-            # 首先尝试快速模板策略（避免Ollama挂起）
+            # 模板策略立即可用（避免Ollama挂起时没有策略）
             print(f"⚡ 使用超快速模板策略生成（避免Ollama挂起）...")
-            return self.generate_template_search_strategy(industry)
+            template_strategies = self.generate_template_search_strategy(industry)
+            if not self.hedge_enabled:
+                return template_strategies
+            return self.start_hedged_search_strategy(industry, template_strategies).wait()
             
-            # 原始Ollama策略（当前被禁用因为API挂起）
-            prompt = f"""Generate 5 targeted search queries to find REAL email addresses for {industry} industry companies.
+        except Exception as e:
+            print(f"   ❌ 策略生成失败: {str(e)}")
+            return [f"{industry} company email contact"]
+    
+    def generate_llm_search_strategy(self, industry, timeout=None):
+        """使用Ollama生成5个搜索查询，失败返回None（由对冲模式在后台调用）"""
+        prompt = f"""Generate 5 targeted search queries to find REAL email addresses for {industry} industry companies.
 
 Industry: {industry}
 Goal: Find actual business email addresses
@@ -121,45 +193,33 @@ Each query must:
 - Use site-specific searches when helpful
 - Be optimized for finding actual email addresses
 
-Return exactly 5 search queries, one per line:
-1. [query 1]
-2. [query 2]
-3. [query 3]
-4. [query 4]
-5. [query 5]
+Return JSON with exactly 5 search queries:
+{{"queries": ["query 1", "query 2", "query 3", "query 4", "query 5"]}}
 
-Return only the queries, no explanations:"""
+Return only the JSON, no explanations:"""
 
-            result = self.call_ollama(prompt, 'fast')
-            
-            if result:
-                # 解析生成的查询
-                queries = []
-                for line in result.split('\n'):
-                    line = line.strip()
-                    if line and (line.startswith(('1.', '2.', '3.', '4.', '5.')) or len(line) > 10):
-                        # 清理行号
-                        cleaned = re.sub(r'^\d+\.\s*', '', line).strip()
-                        if cleaned and len(cleaned) > 5:
-                            queries.append(cleaned)
-                
-                if queries:
-                    print(f"   ✅ 生成了{len(queries)}个智能搜索策略")
-                    return queries[:5]
-            
-            # 备用查询 - 更直接的邮箱搜索
-            print(f"   ⚠️ 使用备用搜索策略")
-            return [
-                f'"{industry}" CEO founder email "@"',
-                f'"{industry}" company contact email address',
-                f'"@" email {industry} startup executive',
-                f'site:linkedin.com "{industry}" email contact',
-                f'"{industry}" business email directory contact'
-            ]
-            
-        except Exception as e:
-            print(f"   ❌ 策略生成失败: {str(e)}")
-            return [f"{industry} company email contact"]
+        # 由对冲在后台调用，冷启动时在截止时间内等待模型预热，而不是直接放弃
+        result = self.call_ollama(prompt, 'fast', schema=query_list_schema(5), timeout=timeout,
+                                  wait=timeout is not None)
+        
+        if result:
+            queries = [query.strip() for query in result['queries']]
+            print(f"   ✅ Ollama生成了{len(queries)}个智能搜索策略")
+            return queries
+        return None
+    
+    def start_hedged_search_strategy(self, industry, template_strategies):
+        """对冲式策略生成：模板策略立即可用，LLM策略到达后替换尚未执行的策略"""
+        hedge = HedgedRecords(template_strategies, self.hedge_deadlines['strategy'],
+                              kind='strategy', on_update=self.on_update)
+        
+        def produce(replace, timeout):
+            queries = self.generate_llm_search_strategy(industry, timeout=timeout)
+            for index, query in zip(hedge.pending_indices(), queries or []):
+                if replace(index, query):
+                    print(f"   🔄 LLM策略替换模板策略{index + 1}: {query}")
+        
+        return hedge.start(produce)
     
     def generate_template_search_strategy(self, industry):
         """使用超快速模板生成搜索策略"""
@@ -207,21 +267,26 @@ Return only the queries, no explanations:"""
         print(f"   ✅ 生成了{len(specific_strategies)}个搜索策略")
         return specific_strategies[:5]  # 返回前5个策略
     
-    def search_with_searxng(self, query, max_results=20):
-        """使用SearxNG进行网络搜索"""
+    def search_with_searxng(self, query):
+        """使用SearxNG进行网络搜索（自适应翻页，返回去重后的结果）"""
+        results, _ = self.pager.search(query)
+        return results
+    
+    def fetch_searxng_page(self, query, pageno=1, max_results=20):
+        """请求SearxNG的一页结果"""
         try:
-            print(f"   🔍 SearxNG搜索: {query}")
+            page_info = f" (第{pageno}页)" if pageno > 1 else ""
+            print(f"   🔍 SearxNG搜索{page_info}: {query}")
             
             # 使用JSON格式搜索
             params = {
                 'q': query,
                 'format': 'json',
                 'categories': 'general',
-                'pageno': 1
+                'pageno': pageno
             }
             
-            search_url = f"{self.searxng_url}/search"
-            response = self.session.get(search_url, params=params, timeout=30)
+            response = self.searxng.get(params, timeout=30)
             
             if response.status_code == 200:
                 try:
@@ -317,8 +382,8 @@ Return only the queries, no explanations:"""
         except Exception as e:
             return []
     
-    def search_emails_with_strategy(self, search_query):
-        """使用搜索策略查找邮箱"""
+    def search_emails_with_strategy(self, search_query, industry=None):
+        """使用搜索策略查找邮箱（industry用于爬取前的相关性排序）"""
         try:
             all_emails = []
             
@@ -346,13 +411,14 @@ Return only the queries, no explanations:"""
                         })
                         print(f"      ✅ 搜索预览中发现: {email}")
             
-            # 3. 并行爬取前10个网站
-            print(f"   🌐 并行爬取前10个网站...")
+            # 3. 并行爬取相关性最高的网站
+            promising_results = self.ranker.select(search_results, industry)
+            print(f"   🌐 并行爬取相关性最高的{len(promising_results)}/{len(search_results)}个网站...")
             
             with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
                 future_to_result = {
                     executor.submit(self.scrape_website_for_emails, result['url']): result 
-                    for result in search_results[:10]
+                    for result in promising_results
                 }
                 
                 for future in concurrent.futures.as_completed(future_to_result):
@@ -382,79 +448,69 @@ Return only the queries, no explanations:"""
             return []
     
     def generate_user_profile_with_ollama(self, email_data, industry_context):
-        """使用模板为邮箱生成详细用户画像（避免Ollama挂起）"""
+        """为单个邮箱生成用户画像：走与批量画像相同的schema约束路径（路由、校验、补问），失败时使用模板画像"""
         try:
-            email = email_data['email']
-            source_info = email_data.get('source_title', '')
-            source_url = email_data.get('source_url', '')
-            
-            print(f"   👤 为 {email} 生成用户画像...")
-            
-            # 使用快速模板策略（避免Ollama挂起）
-            print(f"   ⚡ 使用超快速模板生成用户画像...")
-            return self.generate_template_user_profile(email_data, industry_context)
-            
-            # 原始Ollama策略（当前被禁用因为API挂起）
-            # print(f"   👤 为 {email} 生成用户画像...")
-            
-            prompt = f"""基于以下信息为邮箱用户生成详细的商业用户画像:
-
-邮箱地址: {email}
-来源信息: {source_info}
-来源网站: {source_url}
-行业背景: {industry_context}
-
-请分析并生成包含以下信息的用户画像:
-
-1. 推测的职位角色 (CEO, Sales, Marketing, Support, etc.)
-2. 可能的公司规模 (Startup, SME, Enterprise)
-3. 决策能力级别 (High, Medium, Low)
-4. 沟通偏好 (Formal, Casual, Technical)
-5. 主要关注点/痛点
-6. 最佳联系时机
-7. 推荐的邮件策略
-8. 个性化建议
-
-请返回JSON格式的用户画像:
-{{
-  "email": "{email}",
-  "estimated_role": "角色",
-  "company_size": "公司规模", 
-  "decision_level": "决策能力",
-  "communication_style": "沟通风格",
-  "pain_points": ["痛点1", "痛点2"],
-  "best_contact_time": "最佳联系时间",
-  "email_strategy": "邮件策略建议",
-  "personalization_tips": ["个性化建议1", "个性化建议2"],
-  "confidence_score": 0.8,
-  "profile_generated_by": "ollama_ai"
-}}
-
-只返回JSON，不要其他解释:"""
-
-            result = self.call_ollama(prompt, 'profile')
-            
-            if result:
-                try:
-                    # 尝试解析JSON
-                    profile_data = json.loads(result)
-                    profile_data['email'] = email  # 确保邮箱正确
-                    profile_data['generated_at'] = datetime.now().isoformat()
-                    profile_data['source_data'] = email_data
-                    
-                    print(f"      ✅ 用户画像生成成功")
-                    return profile_data
-                    
-                except json.JSONDecodeError:
-                    # 如果JSON解析失败，创建基础画像
-                    print(f"      ⚠️ JSON解析失败，创建基础画像")
-                    return self.create_basic_profile(email, email_data, industry_context)
-            else:
-                return self.create_basic_profile(email, email_data, industry_context)
-                
+            print(f"   👤 为 {email_data['email']} 生成用户画像...")
+            return self.generate_user_profiles_batch([email_data], industry_context)[0]
         except Exception as e:
             print(f"   ❌ 用户画像生成失败: {str(e)}")
-            return self.create_basic_profile(email, email_data, industry_context)
+            return self.create_basic_profile(email_data.get('email', ''), email_data, industry_context)
+    
+    def profile_records(self, email_list, industry_context):
+        """批量画像的输入记录"""
+        return [{
+            'email': email_data['email'],
+            'source_title': email_data.get('source_title', '')[:150],
+            'source_url': email_data.get('source_url', ''),
+            'industry': industry_context
+        } for email_data in email_list]
+    
+    def complete_llm_profile(self, email_data, llm_profile):
+        """为批量画像结果补充元数据"""
+        email = email_data['email']
+        return {
+            **llm_profile,
+            'profile_generated_by': 'ollama_ai',
+            'generated_at': datetime.now().isoformat(),
+            'source_data': email_data,
+            'domain': email.split('@')[1] if '@' in email else 'unknown.com'
+        }
+    
+    def generate_user_profiles_batch(self, email_list, industry_context):
+        """批量生成用户画像：多个邮箱打包进一次Ollama调用，校验失败的回退到模板画像"""
+        if not self.llm_profiles_enabled:
+            return [self.generate_template_user_profile(email_data, industry_context) for email_data in email_list]
+        
+        generated = self.profiler.profile(self.profile_records(email_list, industry_context))
+        
+        profiles = []
+        for email_data, llm_profile in zip(email_list, generated):
+            if llm_profile:
+                profiles.append(self.complete_llm_profile(email_data, llm_profile))
+                print(f"   ✅ {email_data['email']} 画像生成完成 ({llm_profile['estimated_role']})")
+            else:
+                profiles.append(self.generate_template_user_profile(email_data, industry_context))
+        
+        print(f"   🧠 {len(email_list)}个画像共调用LLM {self.profiler.stats['llm_calls']}次")
+        return profiles
+    
+    def start_hedged_user_profiles(self, email_list, industry_context):
+        """对冲式画像生成：立即返回模板画像，批量LLM画像逐条到达后替换"""
+        templates = [self.generate_template_user_profile(email_data, industry_context) for email_data in email_list]
+        hedge = HedgedRecords(templates, self.hedge_deadlines['profile'], kind='profile', on_update=self.on_update)
+        if not self.llm_profiles_enabled or not email_list:
+            hedge.done.set()
+            return hedge
+        
+        def produce(replace, timeout):
+            def on_profile(index, llm_profile):
+                if replace(index, self.complete_llm_profile(email_list[index], llm_profile)):
+                    print(f"   🔄 {email_list[index]['email']} LLM画像替换模板 ({llm_profile['estimated_role']})")
+            
+            self.profiler.profile(self.profile_records(email_list, industry_context),
+                                  on_profile=on_profile, deadline_at=hedge.deadline_at)
+        
+        return hedge.start(produce)
     
     def create_basic_profile(self, email, email_data, industry_context):
         """创建基础用户画像"""
@@ -678,17 +734,21 @@ Return only the queries, no explanations:"""
         
         start_time = time.time()
         
-        # 阶段1: 生成搜索策略
-        search_strategies = self.generate_intelligent_search_strategy(industry)
+        # 阶段1: 生成搜索策略（对冲模式下先用模板策略，LLM策略到达后替换尚未执行的策略，不等待LLM）
+        search_strategies = self.generate_template_search_strategy(industry)
+        strategy_hedge = self.start_hedged_search_strategy(industry, search_strategies) if self.hedge_enabled else None
         
         all_found_emails = []
+        executed_strategies = []
         
         # 阶段2: 执行搜索策略
-        for i, strategy in enumerate(search_strategies, 1):
+        for i in range(1, len(search_strategies) + 1):
+            strategy = strategy_hedge.take(i - 1) if strategy_hedge else search_strategies[i - 1]
+            executed_strategies.append(strategy)
             print(f"\\n📍 执行搜索策略 {i}/{len(search_strategies)}")
             print(f"   🎯 策略: {strategy}")
             
-            emails = self.search_emails_with_strategy(strategy)
+            emails = self.search_emails_with_strategy(strategy, industry)
             
             if emails:
                 all_found_emails.extend(emails)
@@ -737,34 +797,42 @@ Return only the queries, no explanations:"""
         
         print(f"\\n👤 开始为{len(unique_emails)}个邮箱生成用户画像...")
         
-        # 阶段3: 并行生成用户画像
-        profiles = []
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            future_to_email = {
-                executor.submit(self.generate_user_profile_with_ollama, email_data, industry): email_data
-                for email_data in unique_emails
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_email):
-                try:
-                    email_data = future_to_email[future]
-                    profile = future.result()
-                    
-                    if profile:
-                        profiles.append(profile)
-                        print(f"   ✅ {email_data['email']} 画像生成完成")
-                    
-                except Exception as e:
-                    print(f"   ❌ 画像生成失败: {str(e)}")
+        # 阶段3: 批量生成用户画像
+        profile_hedge = None
+        if self.hedge_enabled:
+            # 模板画像立即以完整结果推送（调用方以模板延迟拿到结果），LLM画像在截止时间内逐条替换
+            profile_hedge = self.start_hedged_user_profiles(unique_emails, industry)
+            if self.on_update:
+                self.on_update({'type': 'result', 'final': False, 'profiles_pending': not profile_hedge.done.is_set(),
+                                'result': self.build_discovery_result(
+                                    industry, unique_emails, profile_hedge.snapshot(), executed_strategies,
+                                    start_time, verification_result, strategy_hedge, profile_hedge)})
+            profiles = profile_hedge.wait()
+            hedge_stats = profile_hedge.summary()
+            print(f"   ⏱️ 对冲画像: {hedge_stats['llm_records']}/{hedge_stats['total']}个使用LLM结果")
+            if self.on_update:
+                self.on_update({'type': 'profiles_upgraded', 'records': profiles, 'hedged': hedge_stats})
+        else:
+            try:
+                profiles = self.generate_user_profiles_batch(unique_emails, industry)
+            except Exception as e:
+                print(f"   ❌ 批量画像生成失败，使用模板画像: {str(e)}")
+                profiles = [self.generate_template_user_profile(email_data, industry) for email_data in unique_emails]
         
-        # 计算总耗时
-        total_time = time.time() - start_time
+        result = self.build_discovery_result(industry, unique_emails, profiles, executed_strategies, start_time,
+                                             verification_result, strategy_hedge, profile_hedge)
         
         print(f"\\n🎉 完整邮箱发现流程完成!")
         print(f"   📧 发现邮箱: {len(unique_emails)}个")
         print(f"   👤 生成画像: {len(profiles)}个")
-        print(f"   ⏱️ 总耗时: {total_time:.1f}秒")
+        print(f"   ⏱️ 总耗时: {result['execution_time']:.1f}秒")
+        
+        return result
+    
+    def build_discovery_result(self, industry, unique_emails, profiles, executed_strategies, start_time,
+                               verification_result, strategy_hedge=None, profile_hedge=None):
+        """组装完整发现结果（对冲模式下模板画像结果和最终结果共用）"""
+        total_time = time.time() - start_time
         
         # 返回完整结果
         return {
@@ -774,13 +842,25 @@ Return only the queries, no explanations:"""
             'user_profiles': profiles,
             'total_emails': len(unique_emails),
             'total_profiles': len(profiles),
-            'search_strategies': search_strategies,
+            'search_strategies': executed_strategies,
             'execution_time': total_time,
             'industry': industry,
             'discovery_method': 'ollama_searxng_integration_with_verification',
             'ollama_enabled': True,
             'searxng_enabled': True,
             'profile_generation': True,
+            'llm_metrics': self.ollama.metrics(),  # 含各模型结构化输出的json_parse_failure_rate
+            'llm_scheduler': self.ollama.scheduler.summary(),  # 各优先级排队等待时间
+            'llm_router': self.router.summary(),  # 各任务的模型路由决策与模型延迟/失败率
+            'llm_readiness': self.warmup.summary(),  # 模型预热与就绪状态
+            'relevance_ranking': self.ranker.summary(),  # 爬取前排序：候选/爬取/跳过的URL数
+            'search_paging': self.pager.summary(),  # 自适应翻页：平均页数、停止原因
+            'searxng_pool': self.searxng.summary(),  # 各SearxNG实例的延迟、请求数与剔除情况
+            'hedged': {
+                'enabled': self.hedge_enabled,
+                'strategy': strategy_hedge.summary() if strategy_hedge else None,
+                'profiles': profile_hedge.summary() if profile_hedge else None
+            },
             'email_verification': {
                 'enabled': True,
                 'verification_result': verification_result,
@@ -801,50 +881,72 @@ def main():
     # 检查是否为API调用 (第三个参数为 'api')
     is_api_call = len(sys.argv) > 3 and sys.argv[3] == 'api'
     
+    if is_api_call:
+        # API调用：stdout只输出NDJSON事件（每行一个带type字段的JSON），进度日志转到stderr
+        # - {"type": "result", "final": false, ...} 模板画像的完整结果，调用方无需等待LLM
+        # - {"type": "strategy_update" / "profile_update", ...} LLM结果逐条替换模板
+        # - {"type": "profiles_upgraded", "records": [...]} LLM画像全部结束（或到达截止时间）
+        # - {"type": "result", "final": true, ...} 最终结果
+        # 启动时保存真正的stdout，整个进程生命周期内把文件描述符1指向stderr：
+        # 后台线程（对冲、保温、健康检查）的print和子进程输出都不会混进事件行
+        sys.stdout.flush()
+        events = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        sys.stdout = sys.stderr
+        events_lock = threading.Lock()
+        
+        def emit(event):
+            # 每个事件一次写入完整的一行
+            line = json.dumps(event, ensure_ascii=False) + '\n'
+            with events_lock:
+                events.write(line)
+                events.flush()
+        
+        agent = OllamaSearxNGEmailAgent(on_update=emit)
+        results = agent.execute_comprehensive_email_discovery(industry, max_emails)
+        emit({'type': 'result', 'final': True, 'result': results})
+        return
+    
     # 初始化系统
     agent = OllamaSearxNGEmailAgent()
     
     # 执行完整发现流程
     results = agent.execute_comprehensive_email_discovery(industry, max_emails)
     
-    if is_api_call:
-        # API调用：只输出JSON，不输出任何其他文本
-        print(json.dumps(results, ensure_ascii=False))
+    # 命令行调用：输出详细结果
+    print("\\n" + "=" * 70)
+    print("🤖 Ollama SearxNG Email Agent 结果报告")
+    print("=" * 70)
+    
+    if results['success']:
+        print("📧 发现的邮箱:")
+        for i, email in enumerate(results['emails'], 1):
+            print(f"   {i}. {email}")
+        
+        print(f"\\n👤 生成的用户画像:")
+        for i, profile in enumerate(results['user_profiles'], 1):
+            print(f"   {i}. {profile['email']}")
+            print(f"      💼 预估角色: {profile['estimated_role']}")
+            print(f"      🏢 公司规模: {profile['company_size']}")
+            print(f"      🎯 决策能力: {profile['decision_level']}")
+            print(f"      💬 沟通风格: {profile['communication_style']}")
+            print(f"      📧 邮件策略: {profile['email_strategy']}")
+            print(f"      🎭 画像置信度: {profile['confidence_score']}")
+            print()
+        
+        print(f"📊 发现统计:")
+        print(f"   📧 邮箱总数: {results['total_emails']}")
+        print(f"   👤 画像总数: {results['total_profiles']}")  
+        print(f"   🔍 使用策略: {len(results['search_strategies'])}个")
+        print(f"   ⏱️ 执行时间: {results['execution_time']:.1f}秒")
+        print(f"   🧠 AI引擎: Ollama (多模型)")
+        print(f"   🌐 搜索引擎: SearxNG (JSON格式)")
+        print(f"   ⚡ 特色: 完全本地化AI驱动的邮箱发现 + 用户画像")
     else:
-        # 命令行调用：输出详细结果
-        print("\\n" + "=" * 70)
-        print("🤖 Ollama SearxNG Email Agent 结果报告")
-        print("=" * 70)
-        
-        if results['success']:
-            print("📧 发现的邮箱:")
-            for i, email in enumerate(results['emails'], 1):
-                print(f"   {i}. {email}")
-            
-            print(f"\\n👤 生成的用户画像:")
-            for i, profile in enumerate(results['user_profiles'], 1):
-                print(f"   {i}. {profile['email']}")
-                print(f"      💼 预估角色: {profile['estimated_role']}")
-                print(f"      🏢 公司规模: {profile['company_size']}")
-                print(f"      🎯 决策能力: {profile['decision_level']}")
-                print(f"      💬 沟通风格: {profile['communication_style']}")
-                print(f"      📧 邮件策略: {profile['email_strategy']}")
-                print(f"      🎭 画像置信度: {profile['confidence_score']}")
-                print()
-            
-            print(f"📊 发现统计:")
-            print(f"   📧 邮箱总数: {results['total_emails']}")
-            print(f"   👤 画像总数: {results['total_profiles']}")  
-            print(f"   🔍 使用策略: {len(results['search_strategies'])}个")
-            print(f"   ⏱️ 执行时间: {results['execution_time']:.1f}秒")
-            print(f"   🧠 AI引擎: Ollama (多模型)")
-            print(f"   🌐 搜索引擎: SearxNG (JSON格式)")
-            print(f"   ⚡ 特色: 完全本地化AI驱动的邮箱发现 + 用户画像")
-        else:
-            print(f"❌ 发现失败")
-        
-        # 输出JSON结果
-        print(json.dumps(results, indent=2, ensure_ascii=False))
+        print(f"❌ 发现失败")
+    
+    # 输出JSON结果
+    print(json.dumps(results, indent=2, ensure_ascii=False))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -21,6 +21,14 @@ from bs4 import BeautifulSoup
 import concurrent.futures
 import threading
 import logging
+from OllamaClient import get_ollama_client
+from JsonSchema import query_list_schema
+from StreamingQueryDispatcher import StreamingQueryDispatcher
+from ModelRouter import ModelRouter
+from ModelWarmup import get_model_warmup
+from ResultRanker import ResultRanker
+from AdaptivePager import AdaptivePager
+from SearxNGPool import get_searxng_pool, default_searxng_urls
 
 class OptimizedOllamaEmailFinder:
     def __init__(self):
@@ -28,15 +36,38 @@ class OptimizedOllamaEmailFinder:
         self.setup_detailed_logging()
         
         # Ollama配置
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
         self.models = {
             'fast': 'qwen2.5:0.5b',
             'general': 'qwen2.5:0.5b',
             'profile': 'llama3.2'
         }
         
-        # SearxNG配置
-        self.searxng_url = 'http://localhost:8080'
+        # 按延迟目标路由：选当前能满足延迟目标的最大模型，负载高时降级到小模型或默认策略
+        # 启动时后台预热候选模型，路由跳过预热中和不可用的模型；流式策略生成在后台等待最小的模型加载完成
+        model_tiers = {
+            'fast': ['llama3.2', 'qwen2.5:0.5b'],
+            'general': ['llama3.2', 'qwen2.5:0.5b'],
+            'profile': ['llama3.2', 'qwen2.5:0.5b']
+        }
+        self.warmup = get_model_warmup(
+            self.ollama, [model for models in model_tiers.values() for model in models]
+        ).start()
+        self.router = ModelRouter(self.ollama, model_tiers, priorities={'profile': 'bulk'},
+                                  readiness=self.warmup.ready, usable=self.warmup.usable)
+        
+        # 流式模式：边生成策略边搜索（OLLAMA_STREAM_QUERIES=0 回到先生成完再搜索）
+        self.stream_queries = os.environ.get('OLLAMA_STREAM_QUERIES', '1') != '0'
+        
+        # 爬取前按相关性排序，每个策略只爬取得分最高的URL（DISCOVERY_STRATEGY_FETCH_BUDGET）
+        self.ranker = ResultRanker(ollama=self.ollama)
+        
+        # SearxNG配置：多个实例（SEARXNG_URLS）按负载路由
+        self.searxng_urls = default_searxng_urls()
+        self.searxng = get_searxng_pool(self.searxng_urls)
+        # 第1页联系指示多的查询并发翻页，新增结果变少时停止
+        self.pager = AdaptivePager(self.fetch_searxng_page, log=lambda message: self.logger.info(message))
         
         # 网络搜索会话
         self.session = requests.Session()
@@ -64,7 +95,7 @@ class OptimizedOllamaEmailFinder:
         
         self.logger.info("🚀 优化的Ollama邮箱搜索器初始化")
         self.logger.info(f"   🧠 Fast Model: {self.models['fast']}")
-        self.logger.info(f"   🌐 SearxNG: {self.searxng_url}")
+        self.logger.info(f"   🌐 SearxNG: {', '.join(self.searxng_urls)}")
         self.logger.info(f"   🎯 目标邮箱数: {self.target_email_count}")
         self.logger.info(f"   🔄 最多搜索轮数: {self.max_search_rounds}")
         
@@ -95,10 +126,16 @@ class OptimizedOllamaEmailFinder:
         self.logger.addHandler(console_handler)
         self.logger.addHandler(file_handler)
     
-    def call_ollama(self, prompt, model_type='fast', options=None):
-        """调用Ollama API - 增加详细日志"""
+    def call_ollama(self, prompt, model_type='fast', options=None, fresh=False, schema=None):
+        """调用Ollama API - 增加详细日志（fresh=True跳过响应缓存，获取新采样）
+
+        提供schema时按JSON Schema约束输出，返回校验通过的对象
+        """
         try:
-            model = self.models.get(model_type, self.models['fast'])
+            model = self.router.route(model_type)
+            if model is None:
+                self.logger.warning(f"⚠️ {model_type}任务的所有模型都无法满足延迟目标，使用默认结果")
+                return None
             default_options = {
                 'temperature': 0.8,
                 'num_predict': 300,
@@ -112,22 +149,17 @@ class OptimizedOllamaEmailFinder:
             self.logger.debug(f"Prompt长度: {len(prompt)}字符")
             
             start_time = time.time()
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': model,
-                'prompt': prompt,
-                'stream': False,
-                'options': default_options
-            }, timeout=60)
-            
+            priority = 'bulk' if model_type == 'profile' else 'interactive'
+            if schema:
+                result = self.ollama.generate_json(model, prompt, schema, options=default_options,
+                                                   timeout=60, fresh=fresh, priority=priority)
+            else:
+                result = self.ollama.generate(model, prompt, options=default_options, timeout=60, fresh=fresh,
+                                              priority=priority)
             duration = time.time() - start_time
             
-            if response.status_code == 200:
-                result = response.json()['response'].strip()
-                self.logger.info(f"✅ Ollama响应成功 ({duration:.1f}s) - 结果长度: {len(result)}")
-                return result
-            else:
-                self.logger.error(f"❌ Ollama API错误: {response.status_code}")
-                return None
+            self.logger.info(f"✅ Ollama响应成功 ({duration:.1f}s) - 结果长度: {len(str(result))}")
+            return result
                 
         except Exception as e:
             self.logger.error(f"❌ Ollama调用失败: {str(e)}")
@@ -137,6 +169,38 @@ class OptimizedOllamaEmailFinder:
         """生成增强的搜索策略 - 基于轮数调整策略"""
         self.logger.info(f"🧠 生成第{round_number}轮搜索策略 - 行业: {industry}")
         
+        strategies = self.default_search_strategies(industry, round_number)
+        
+        # 使用Ollama优化搜索策略
+        try:
+            prompt = f"""生成5个简短的{industry}行业邮箱搜索查询：
+
+要求：
+1. 每个查询最多3-4个词
+2. 不使用复杂操作符(site:, intext:等)
+3. 直接有效的关键词组合
+4. 包含"email"或"contact"
+
+返回JSON格式（只返回JSON，不要解释）：
+{{"queries": ["查询1", "查询2", "查询3", "查询4", "查询5"]}}"""
+
+            # 各轮提示词相同，第2轮起需要新采样才能得到不同的查询
+            result = self.call_ollama(prompt, 'fast', fresh=round_number > 1,
+                                      schema=query_list_schema(5, min_length=10))
+            
+            if result:
+                optimized_strategies = [query.strip() for query in result['queries']]
+                self.logger.info(f"✅ Ollama优化了{len(optimized_strategies)}个搜索策略")
+                return optimized_strategies
+        
+        except Exception as e:
+            self.logger.warning(f"⚠️ Ollama策略优化失败，使用默认策略: {str(e)}")
+        
+        self.logger.info(f"✅ 使用默认策略: {len(strategies)}个")
+        return strategies
+    
+    def default_search_strategies(self, industry, round_number):
+        """各轮的默认搜索策略（Ollama不可用时使用）"""
         # 根据搜索轮数调整策略
         if round_number == 1:
             # 第一轮：简短高效搜索
@@ -175,9 +239,12 @@ class OptimizedOllamaEmailFinder:
                 f'{industry} partnership email'
             ]
         
-        # 使用Ollama优化搜索策略
-        try:
-            prompt = f"""生成5个简短的{industry}行业邮箱搜索查询：
+        return strategies
+    
+    def stream_enhanced_search_strategies(self, industry, round_number=1, budget=60):
+        """流式生成本轮搜索策略：每行一个查询，生成中逐行产出
+        由分发器在后台线程中迭代：模型仍在预热时在budget秒内等待最小的模型加载完成，等待时间计入budget"""
+        prompt = f"""生成5个简短的{industry}行业邮箱搜索查询：
 
 要求：
 1. 每个查询最多3-4个词
@@ -185,51 +252,65 @@ class OptimizedOllamaEmailFinder:
 3. 直接有效的关键词组合
 4. 包含"email"或"contact"
 
-返回格式（只返回查询，不要解释）：
-1. [查询1]
-2. [查询2]
-3. [查询3]
-4. [查询4]
-5. [查询5]"""
+每行输出一个查询，共5行，不要编号、不要引号、不要解释："""
 
-            result = self.call_ollama(prompt, 'fast')
-            
-            if result:
-                optimized_strategies = []
-                for line in result.split('\n'):
-                    line = line.strip()
-                    if line and re.match(r'^\d+\.', line):
-                        cleaned = re.sub(r'^\d+\.\s*', '', line).strip()
-                        if len(cleaned) > 10:
-                            optimized_strategies.append(cleaned)
-                
-                if len(optimized_strategies) >= 3:
-                    self.logger.info(f"✅ Ollama优化了{len(optimized_strategies)}个搜索策略")
-                    return optimized_strategies[:5]
-        
-        except Exception as e:
-            self.logger.warning(f"⚠️ Ollama策略优化失败，使用默认策略: {str(e)}")
+        started_at = time.time()
+        model = self.router.route('fast', wait=budget)
+        remaining = budget - (time.time() - started_at)
+        if model is None or remaining <= 0:
+            return  # 负载过高或预热超时，全部使用默认策略
+        options = {'temperature': 0.8, 'num_predict': 300, 'num_ctx': 2048}
+        # 各轮提示词相同，第2轮起需要新采样才能得到不同的查询
+        yield from self.ollama.generate_lines(model, prompt, options=options, timeout=remaining,
+                                              fresh=round_number > 1, priority='interactive')
+    
+    def iter_round_searches(self, industry, round_number):
+        """产出本轮的 (策略, SearxNG结果)
+
+        流式模式下Ollama每生成一条策略就立即提交搜索，按完成顺序产出，
+        搜索与剩余的生成重叠；生成失败或不足5条时用默认策略补齐。
+        """
+        if not self.stream_queries:
+            for strategy in self.generate_enhanced_search_strategies(industry, round_number):
+                yield strategy, self.search_with_enhanced_logging(strategy)
+            return
         
-        self.logger.info(f"✅ 使用默认策略: {len(strategies)}个")
-        return strategies
+        self.logger.info(f"🧠 流式生成第{round_number}轮搜索策略 - 行业: {industry}")
+        dispatcher = StreamingQueryDispatcher(self.search_with_enhanced_logging, max_queries=5, min_length=10)
+        dispatcher.start(self.stream_enhanced_search_strategies(industry, round_number),
+                         fallback_queries=self.default_search_strategies(industry, round_number))
+        try:
+            for _, strategy, search_results in dispatcher.results():
+                yield strategy, search_results or []
+        finally:
+            dispatcher.cancel()
+            summary = dispatcher.summary()
+            if summary['error']:
+                self.logger.warning(f"⚠️ 流式策略生成中断，已用默认策略补齐: {summary['error']}")
+            self.logger.info(f"⏱️ 首条策略 {summary['first_query_seconds']}s，首批结果 "
+                             f"{summary['first_result_seconds']}s，Ollama策略 {summary['llm_queries']}条")
+    
+    def search_with_enhanced_logging(self, query):
+        """增强的SearxNG搜索 - 自适应翻页，返回去重后的结果"""
+        results, _ = self.pager.search(query)
+        return results
     
-    def search_with_enhanced_logging(self, query, max_results=25):
-        """增强的SearxNG搜索 - 详细日志"""
+    def fetch_searxng_page(self, query, pageno=1, max_results=25):
+        """请求SearxNG的一页结果 - 详细日志"""
         try:
-            self.logger.info(f"🔍 SearxNG搜索: {query}")
+            page_info = f" (第{pageno}页)" if pageno > 1 else ""
+            self.logger.info(f"🔍 SearxNG搜索{page_info}: {query}")
             self.search_stats['total_queries'] += 1
             
             params = {
                 'q': query,
                 'format': 'json',
                 'categories': 'general',
-                'pageno': 1
+                'pageno': pageno
             }
             
-            search_url = f"{self.searxng_url}/search"
             start_time = time.time()
-            
-            response = self.session.get(search_url, params=params, timeout=30)
+            response = self.searxng.get(params, timeout=30)
             duration = time.time() - start_time
             
             if response.status_code == 200:
@@ -360,17 +441,14 @@ class OptimizedOllamaEmailFinder:
         while len(all_found_emails) < target_count and round_number <= self.max_search_rounds:
             self.logger.info(f"\n📍 第{round_number}轮搜索 - 已找到{len(all_found_emails)}个邮箱")
             
-            # 生成本轮搜索策略
-            strategies = self.generate_enhanced_search_strategies(industry, round_number)
+            # 生成本轮搜索策略并执行SearxNG搜索
+            round_searches = self.iter_round_searches(industry, round_number)
             
             round_emails = []
             
             # 执行本轮所有策略
-            for i, strategy in enumerate(strategies, 1):
-                self.logger.info(f"   🎯 策略{i}/{len(strategies)}: {strategy}")
-                
-                # SearxNG搜索
-                search_results = self.search_with_enhanced_logging(strategy)
+            for i, (strategy, search_results) in enumerate(round_searches, 1):
+                self.logger.info(f"   🎯 策略{i}: {strategy}")
                 
                 if not search_results:
                     self.logger.warning(f"   ⚠️ 策略{i}无搜索结果")
@@ -397,13 +475,14 @@ class OptimizedOllamaEmailFinder:
                 self.logger.info(f"   📧 搜索预览发现: {len(preview_emails)}个邮箱")
                 round_emails.extend(preview_emails)
                 
-                # 并行爬取网站
-                self.logger.info(f"   🌐 并行爬取前8个网站...")
+                # 并行爬取相关性最高的网站
+                promising_results = self.ranker.select(search_results, industry)
+                self.logger.info(f"   🌐 并行爬取相关性最高的{len(promising_results)}/{len(search_results)}个网站...")
                 
                 with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
                     future_to_result = {
                         executor.submit(self.scrape_website_with_logging, result['url']): result 
-                        for result in search_results[:8]
+                        for result in promising_results
                     }
                     
                     for future in concurrent.futures.as_completed(future_to_result, timeout=30):
@@ -434,8 +513,11 @@ class OptimizedOllamaEmailFinder:
                     self.logger.info(f"🎯 已达到目标邮箱数量！")
                     break
                 
-                # 策略间隔
-                time.sleep(1)
+                # 策略间隔（流式模式下搜索已提前发出，无需等待）
+                if not self.stream_queries:
+                    time.sleep(1)
+            
+            round_searches.close()  # 提前达标时停止生成和剩余搜索
             
             # 合并本轮结果
             all_found_emails.extend(round_emails)
@@ -495,6 +577,11 @@ class OptimizedOllamaEmailFinder:
             'search_rounds': round_number - 1,
             'execution_time': total_time,
             'search_stats': stats_dict,
+            'llm_router': self.router.summary(),
+            'llm_readiness': self.warmup.summary(),
+            'relevance_ranking': self.ranker.summary(),
+            'search_paging': self.pager.summary(),
+            'searxng_pool': self.searxng.summary(),
             'industry': industry,
             'target_achieved': len(final_emails) >= target_count,
             'method': 'persistent_ollama_searxng',
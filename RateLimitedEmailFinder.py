@@ -17,6 +17,7 @@ from bs4 import BeautifulSoup
 import urllib.request
 from threading import Lock
 from datetime import datetime, timedelta
+from SearxNGPool import SearxNGPool, SearxNGUnavailable
 
 class RateLimitedEmailFinder:
     def __init__(self):
@@ -44,6 +45,18 @@ class RateLimitedEmailFinder:
         
         self.email_pattern = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
         
+        # Public SearX instances as one pool: least-loaded routing, bad instances ejected
+        # (override with RATE_LIMITED_SEARX_URLS, comma separated)
+        searx_urls = [url.strip() for url in os.getenv('RATE_LIMITED_SEARX_URLS', '').split(',') if url.strip()] or [
+            "https://searx.nixnet.services",
+            "https://search.sapti.me",
+            "https://searx.be"
+        ]
+        self.searx_pool = SearxNGPool(
+            searx_urls, session=self.session, max_attempts=len(searx_urls),
+            throttle=lambda url: self.wait_for_rate_limit(self.get_domain_from_url(url))
+        )
+        
         print("🔧 Rate Limited Email Finder initialized")
         print(f"   ⏱️  Base delay: {self.base_delay}s")
         print(f"   🔄 Max retries: {self.max_retries}")
@@ -306,44 +319,33 @@ class RateLimitedEmailFinder:
             return []
     
     def search_with_searx_rate_limited(self, query):
-        """Use SearX with rate limiting"""
-        searx_instances = [
-            "https://searx.nixnet.services",
-            "https://search.sapti.me",
-            "https://searx.be"
-        ]
-        
-        for searx_url in searx_instances:
-            try:
-                print(f"  🔍 Rate-limited SearX: {searx_url}")
-                
-                domain = self.get_domain_from_url(searx_url)
-                self.wait_for_rate_limit(domain)
-                
-                response = self.make_rate_limited_request(f"{searx_url}/search", params={
-                    'q': query,
-                    'format': 'json',
-                    'categories': 'general'
-                })
-                
-                if response:
-                    data = response.json()
-                    results = data.get('results', [])
-                    
-                    urls = []
-                    for result in results[:15]:
-                        url = result.get('url', '')
-                        if url and 'http' in url:
-                            urls.append(url)
-                    
-                    print(f"    ✅ SearX found {len(urls)} URLs")
-                    return urls
-                    
-            except Exception as e:
-                print(f"    ⚠️  SearX instance failed: {str(e)}")
-                continue
-        
-        return []
+        """Use the SearX instance pool with rate limiting"""
+        try:
+            response = self.searx_pool.get({
+                'q': query,
+                'format': 'json',
+                'categories': 'general'
+            }, timeout=15)
+            
+            if response.status_code != 200:
+                print(f"    ⚠️  SearX instances failed: HTTP {response.status_code}")
+                return []
+            
+            data = response.json()
+            results = data.get('results', [])
+            
+            urls = []
+            for result in results[:15]:
+                url = result.get('url', '')
+                if url and 'http' in url:
+                    urls.append(url)
+            
+            print(f"    ✅ SearX found {len(urls)} URLs")
+            return urls
+            
+        except (SearxNGUnavailable, ValueError) as e:
+            print(f"    ⚠️  SearX instances failed: {str(e)}")
+            return []
     
     def analyze_websites_rate_limited(self, urls):
         """Analyze websites with intelligent rate limiting"""
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+搜索结果相关性排序（爬取前）
+- 一批搜索结果的标题+摘要一次性转成哈希特征的TF-IDF矩阵（NumPy），按行业、职位、联系方式词表的命中权重打分
+- 目录站、新闻、招聘等噪声页面按噪声词表扣分，摘要中含@的结果加分
+- 可选本地嵌入模型（DISCOVERY_EMBED_MODEL，例如 nomic-embed-text，经Ollama /api/embed）与词表分数融合
+- 每个策略只爬取得分最高的若干URL（DISCOVERY_STRATEGY_FETCH_BUDGET），减少每找到一个邮箱所需的抓取次数
+"""
+
+import os
+import re
+import zlib
+
+import numpy as np
+
+from OllamaClient import OllamaError, get_ollama_client
+
+
+class ResultRanker:
+    ROLE_WORDS = [
+        'ceo', 'cto', 'cfo', 'coo', 'cmo', 'founder', 'co-founder', 'owner', 'president', 'partner',
+        'director', 'head', 'vp', 'vice president', 'manager', 'lead', 'chief', 'executive', 'principal'
+    ]
+    CONTACT_WORDS = [
+        'contact', 'contact us', 'email', 'e-mail', 'reach', 'team', 'our team', 'about', 'about us',
+        'people', 'staff', 'leadership', 'management', 'get in touch', 'phone', 'office'
+    ]
+    NOISE_WORDS = [
+        'directory', 'list of', 'top 10', 'top 50', 'best', 'ranking', 'news', 'article', 'wikipedia',
+        'jobs', 'careers', 'hiring', 'salary', 'login', 'sign up', 'download', 'pdf', 'forum', 'reddit'
+    ]
+    # 各词表相似度的权重（噪声为负）
+    WEIGHTS = {'industry': 2.0, 'role': 1.5, 'contact': 2.0, 'noise': -1.5}
+    TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+\-']*|[一-鿿]")
+
+    def __init__(self, industry=None, fetch_budget=None, n_features=2 ** 12, embed_model=None, ollama=None,
+                 embed_weight=2.0, email_bonus=1.0, rank_bonus=0.3, embed_timeout=30):
+        self.industry = industry  # 默认行业，scores/select未指定行业时使用
+        if fetch_budget is None:
+            fetch_budget = int(os.environ.get('DISCOVERY_STRATEGY_FETCH_BUDGET', '5'))
+        self.fetch_budget = fetch_budget
+        self.n_features = n_features
+        self.embed_model = embed_model if embed_model is not None else os.environ.get('DISCOVERY_EMBED_MODEL') or None
+        self.ollama = (ollama or get_ollama_client()) if self.embed_model else None
+        self.embed_weight = embed_weight
+        self.email_bonus = email_bonus
+        self.rank_bonus = rank_bonus
+        self.embed_timeout = embed_timeout
+
+        self.vocab_cache = {}
+        self.embed_cache = {}
+        self.stats = {'batches': 0, 'candidates': 0, 'selected': 0, 'skipped': 0, 'embed_batches': 0, 'embed_failures': 0}
+
+    def tokenize(self, text):
+        """小写单词 + 相邻词二元组（二元组让"contact us""vice president"这类短语有独立特征）"""
+        words = self.TOKEN_PATTERN.findall(text.lower())
+        return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+    def hash_counts(self, texts):
+        """文本 -> 词频矩阵（哈希技巧，不需要预先建立词表）"""
+        matrix = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in self.tokenize(text):
+                matrix[row, zlib.crc32(token.encode('utf-8')) % self.n_features] += 1.0
+        return matrix
+
+    @staticmethod
+    def normalize_rows(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-9)
+
+    def vocabularies(self, industry):
+        """行业、职位、联系方式、噪声四个词表的哈希向量（按行业缓存）"""
+        key = (industry or '').lower()
+        if key not in self.vocab_cache:
+            texts = [
+                key,
+                ' '.join(self.ROLE_WORDS),
+                ' '.join(self.CONTACT_WORDS),
+                ' '.join(self.NOISE_WORDS)
+            ]
+            counts = self.hash_counts(texts)
+            self.vocab_cache[key] = (counts > 0).astype(np.float32)
+        return self.vocab_cache[key]
+
+    def relevance(self, results, industry=None):
+        """整批结果的内容相关性（词表相似度 + 可选嵌入相似度），返回与results顺序一致的数组"""
+        if not results:
+            return np.zeros(0, dtype=np.float32)
+        industry = industry or self.industry
+        texts = self.result_texts(results)
+
+        # TF-IDF：次线性词频 × 批内平滑IDF（批内到处出现的词，如查询本身，权重降低）
+        counts = self.hash_counts(texts)
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = np.log((1 + len(texts)) / (1 + document_frequency)) + 1.0
+        tfidf = self.normalize_rows(np.log1p(counts) * idf)
+
+        # 每个词表命中的TF-IDF权重之和：不按词表长度归一化，长词表（联系、噪声）不会被稀释
+        vocab = self.vocabularies(industry)
+        similarity = tfidf @ vocab.T  # (结果数, 4)
+        weights = np.array([self.WEIGHTS['industry'] if industry else 0.0, self.WEIGHTS['role'],
+                            self.WEIGHTS['contact'], self.WEIGHTS['noise']], dtype=np.float32)
+        scores = similarity @ weights
+
+        embedded = self.embedding_scores(texts, industry)
+        if embedded is not None:
+            scores += self.embed_weight * embedded
+
+        self.stats['batches'] += 1
+        self.stats['candidates'] += len(results)
+        return scores
+
+    def scores(self, results, industry=None):
+        """爬取优先级：相关性 + 摘要中的@（直接的邮箱信号）+ 搜索引擎排名（弱先验）"""
+        scores = self.relevance(results, industry)
+        if not len(scores):
+            return scores
+        has_email = np.array(['@' in text for text in self.result_texts(results)], dtype=np.float32)
+        scores += self.email_bonus * has_email
+        scores += self.rank_bonus * (1.0 - np.arange(len(results), dtype=np.float32) / len(results))
+        return scores
+
+    @staticmethod
+    def result_texts(results):
+        return [f"{r.get('title', '')} {r.get('content', '')} {r.get('url', '')}" for r in results]
+
+    def embedding_scores(self, texts, industry):
+        """可选：本地嵌入模型的语义相似度（与"行业+决策人联系方式"描述比较），失败时返回None"""
+        if not self.embed_model or not self.ollama:
+            return None
+        query = f"{industry or 'company'} company team leadership contact email of founders and decision makers"
+        try:
+            if query not in self.embed_cache:
+                self.embed_cache[query] = self.embed([query])[0]
+            documents = self.normalize_rows(self.embed(texts))
+            self.stats['embed_batches'] += 1
+            return documents @ self.normalize_rows(self.embed_cache[query][None, :])[0]
+        except (OllamaError, KeyError, ValueError) as e:
+            self.stats['embed_failures'] += 1
+            self.ollama = None  # 本次运行不再尝试嵌入模型
+            print(f"      ⚠️  嵌入模型打分失败，之后仅使用词表分数: {e}")
+            return None
+
+    def embed(self, texts):
+        data = self.ollama.timed_post('/api/embed', {'model': self.embed_model, 'input': texts,
+                                                     'keep_alive': self.ollama.keep_alive},
+                                      self.embed_timeout, priority='validation')
+        return np.array(data['embeddings'], dtype=np.float32)
+
+    def rank(self, results, industry=None):
+        """按相关性从高到低返回 [(分数, 结果)]"""
+        scores = self.scores(results, industry)
+        order = np.argsort(-scores, kind='stable')
+        return [(float(scores[i]), results[i]) for i in order]
+
+    def select(self, results, industry=None, budget=None):
+        """只保留得分最高的budget个结果用于爬取（预算<=0表示不限制，仅排序）"""
+        budget = self.fetch_budget if budget is None else budget
+        ranked = [result for _, result in self.rank(results, industry)]
+        selected = ranked[:budget] if budget and budget > 0 else ranked
+        self.stats['selected'] += len(selected)
+        self.stats['skipped'] += len(results) - len(selected)
+        return selected
+
+    def summary(self):
+        """返回排序统计"""
+        return {**self.stats, 'fetch_budget': self.fetch_budget, 'embed_model': self.embed_model}
@@ -18,14 +18,19 @@ from datetime import datetime
 import subprocess
 import docker
 import threading
+from OllamaClient import get_ollama_client
+from ToolAgentLoop import ToolAgentLoop
+from SearxNGPool import get_searxng_pool, default_searxng_urls
 
 class SearxNGLocalLLM:
     def __init__(self):
         # 本地Ollama配置
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
         
-        # SearxNG配置
-        self.searxng_url = 'http://localhost:8080'  # 默认SearxNG端口
+        # SearxNG配置：SEARXNG_URLS可配置多个实例（例如多个本地容器），搜索按负载路由
+        self.searxng_url = 'http://localhost:8080'  # 默认SearxNG端口（本地Docker容器）
+        self.searxng = get_searxng_pool(default_searxng_urls())
         
         # 邮箱匹配模式
         self.email_pattern = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
@@ -40,18 +45,18 @@ class SearxNGLocalLLM:
         self.ensure_searxng_running()
         
     def ensure_searxng_running(self):
-        """确保SearxNG在运行"""
-        try:
-            # 检查SearxNG是否已运行
-            response = requests.get(f"{self.searxng_url}/search?q=test&format=json", timeout=5)
-            if response.status_code == 200:
-                print("   ✅ SearxNG已在运行")
-                return True
-        except:
-            pass
+        """确保SearxNG在运行（/healthz健康检查，之后由实例池在后台持续检查）"""
+        healthy = self.searxng.check_all()
+        if healthy:
+            print(f"   ✅ SearxNG已在运行 ({healthy}/{len(self.searxng.instances)}个实例健康)")
+            self.searxng.start()
+            return True
         
         print("   🚀 启动本地SearxNG...")
-        return self.start_searxng_docker()
+        if self.start_searxng_docker():
+            self.searxng.start()
+            return True
+        return False
     
     def start_searxng_docker(self):
         """使用Docker启动SearxNG"""
@@ -88,13 +93,10 @@ class SearxNGLocalLLM:
             # 等待容器启动
             print("   ⏱️  等待SearxNG启动...")
             for i in range(30):
-                try:
-                    response = requests.get(f"{self.searxng_url}/search?q=test&format=json", timeout=2)
-                    if response.status_code == 200:
-                        print("   ✅ SearxNG成功启动!")
-                        return True
-                except:
-                    time.sleep(2)
+                if self.searxng.check_all():
+                    print("   ✅ SearxNG成功启动!")
+                    return True
+                time.sleep(2)
             
             print("   ❌ SearxNG启动超时")
             return False
@@ -117,7 +119,7 @@ class SearxNGLocalLLM:
                 'language': 'en'
             }
             
-            response = requests.get(f"{self.searxng_url}/search", params=params, timeout=15)
+            response = self.searxng.get(params, timeout=15)
             
             if response.status_code == 200:
                 data = response.json()
@@ -235,105 +237,12 @@ class SearxNGLocalLLM:
                 }
             ]
             
-            # 调用Ollama
-            response = requests.post(f"{self.ollama_url}/api/chat", json={
-                'model': model,
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                'tools': tools,
-                'stream': False,
-                'options': {
-                    'temperature': 0.7,
-                    'num_ctx': 4096
-                }
-            }, timeout=60)
-            
-            if response.status_code == 200:
-                data = response.json()
-                message = data.get('message', {})
-                
-                # 检查是否有工具调用
-                tool_calls = message.get('tool_calls', [])
-                
-                if tool_calls:
-                    print(f"   🛠️  LLM请求调用{len(tool_calls)}个工具")
-                    
-                    # 执行工具调用
-                    tool_results = []
-                    for tool_call in tool_calls:
-                        function_name = tool_call['function']['name']
-                        arguments = tool_call['function']['arguments']
-                        
-                        print(f"      🔧 调用工具: {function_name}")
-                        
-                        if function_name == 'web_search':
-                            result = self.web_search_function(**arguments)
-                            tool_results.append({
-                                'tool_call_id': tool_call.get('id', ''),
-                                'function_name': function_name,
-                                'result': result
-                            })
-                        elif function_name == 'extract_emails':
-                            result = self.extract_emails_function(**arguments)
-                            tool_results.append({
-                                'tool_call_id': tool_call.get('id', ''),
-                                'function_name': function_name,
-                                'result': result
-                            })
-                    
-                    # 将工具结果发送回LLM
-                    if tool_results:
-                        print(f"   🧠 将工具结果发送回LLM进行分析...")
-                        
-                        # 构建工具结果消息
-                        messages = [
-                            {'role': 'user', 'content': prompt},
-                            message,  # LLM的工具调用消息
-                        ]
-                        
-                        # 添加工具结果
-                        for tool_result in tool_results:
-                            messages.append({
-                                'role': 'tool',
-                                'content': json.dumps(tool_result['result']),
-                                'tool_call_id': tool_result['tool_call_id']
-                            })
-                        
-                        # 再次调用LLM处理工具结果
-                        final_response = requests.post(f"{self.ollama_url}/api/chat", json={
-                            'model': model,
-                            'messages': messages,
-                            'stream': False,
-                            'options': {
-                                'temperature': 0.7,
-                                'num_ctx': 4096
-                            }
-                        }, timeout=60)
-                        
-                        if final_response.status_code == 200:
-                            final_data = final_response.json()
-                            final_message = final_data.get('message', {})
-                            
-                            return {
-                                'success': True,
-                                'response': final_message.get('content', ''),
-                                'tool_calls': tool_calls,
-                                'tool_results': tool_results
-                            }
-                
-                # 没有工具调用的普通响应
-                return {
-                    'success': True,
-                    'response': message.get('content', ''),
-                    'tool_calls': [],
-                    'tool_results': []
-                }
-            else:
-                return {'success': False, 'error': f'Ollama API error: {response.status_code}'}
+            # 多轮Agent循环：同一轮的工具调用并发执行，工具输出按token预算压缩后回传
+            agent = ToolAgentLoop(self.ollama, model, tools, {
+                'web_search': self.web_search_function,
+                'extract_emails': self.extract_emails_function
+            }, options={'temperature': 0.7}, timeout=60)
+            return agent.run(prompt)
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
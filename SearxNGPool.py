@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+SearxNG实例池
+- 多个SearxNG后端（SEARXNG_URLS逗号分隔，例如多个本地容器）共同承担搜索，吞吐可横向扩展
+- 后台健康检查使用 /healthz，不再每次启动都发起一次真实搜索
+- 每个实例跟踪EWMA延迟和在途请求数，按 (在途+1)×EWMA延迟 选择负载最低的实例
+- 连续失败（超时、429、5xx）的实例被剔除一段时间（重复剔除时间加倍），健康检查通过后自动恢复
+- 请求失败时换下一个实例重试；所有实例都被剔除时仍尝试最快恢复的那个
+"""
+
+import os
+import time
+import random
+import threading
+import concurrent.futures
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class SearxNGUnavailable(Exception):
+    """所有SearxNG实例都不可用"""
+
+
+class SearxNGPool:
+    def __init__(self, urls, session=None, throttle=None, alpha=0.3, max_failures=3, eject_seconds=30,
+                 max_eject_seconds=600, health_interval=30, health_timeout=5, max_attempts=2, pool_size=16):
+        self.throttle = throttle  # 可选：每次请求前以实例URL调用（例如公共实例的限速等待）
+        self.alpha = alpha
+        self.max_failures = max_failures
+        self.eject_seconds = eject_seconds
+        self.max_eject_seconds = max_eject_seconds
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_attempts = max_attempts
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+                'Accept': 'application/json'
+            })
+        self.session = session
+
+        self.lock = threading.Lock()
+        self.instances = [{
+            'url': url.rstrip('/'), 'healthy': True, 'ewma_latency': None, 'inflight': 0,
+            'consecutive_failures': 0, 'ejections': 0, 'ejected_until': 0.0,
+            'requests': 0, 'failures': 0, 'last_error': None
+        } for url in dict.fromkeys(urls)]
+        self.health_thread = None
+        self.stop_event = threading.Event()
+
+    def available(self, now=None):
+        now = now or time.time()
+        return [i for i in self.instances if i['healthy'] and i['ejected_until'] <= now]
+
+    def choose(self, exclude=()):
+        """选择负载最低的可用实例（调用方需持有lock）"""
+        now = time.time()
+        candidates = [i for i in self.available(now) if i['url'] not in exclude]
+        if not candidates:
+            # 全部被剔除：尝试最早恢复的实例，而不是直接失败
+            candidates = sorted((i for i in self.instances if i['url'] not in exclude),
+                                key=lambda i: i['ejected_until'])[:1]
+        if not candidates:
+            return None
+        known = [i['ewma_latency'] for i in candidates if i['ewma_latency'] is not None]
+        default_latency = sum(known) / len(known) if known else 1.0  # 无样本的实例按平均延迟估计，会被尽快试用
+        return min(candidates, key=lambda i: ((i['inflight'] + 1) * (i['ewma_latency'] or default_latency),
+                                              random.random()))
+
+    def get(self, params, timeout=15, path='/search'):
+        """把请求路由到负载最低的实例，失败时换实例重试，返回成功的响应（都失败时返回最后一个响应）"""
+        self.start()
+        tried = []
+        last_response, last_error = None, None
+
+        for _ in range(min(self.max_attempts, len(self.instances))):
+            with self.lock:
+                instance = self.choose(exclude=tried)
+                if instance is None:
+                    break
+                instance['inflight'] += 1
+                instance['requests'] += 1
+            tried.append(instance['url'])
+
+            if self.throttle:
+                self.throttle(instance['url'])
+            started_at = time.time()
+            try:
+                response = self.session.get(f"{instance['url']}{path}", params=params, timeout=timeout)
+                if response.status_code == 200:
+                    self.record(instance, time.time() - started_at)
+                    return response
+                last_response = response
+                self.record(instance, time.time() - started_at, error=f'HTTP {response.status_code}')
+            except requests.RequestException as e:
+                last_error = f'{type(e).__name__}: {e}'
+                self.record(instance, time.time() - started_at, error=last_error)
+
+        if last_response is not None:
+            return last_response
+        raise SearxNGUnavailable(last_error or '没有可用的SearxNG实例')
+
+    def record(self, instance, latency, error=None):
+        """更新实例的在途数、EWMA延迟与失败计数，连续失败达到阈值时剔除"""
+        with self.lock:
+            instance['inflight'] -= 1
+            previous = instance['ewma_latency']
+            instance['ewma_latency'] = latency if previous is None else self.alpha * latency + (1 - self.alpha) * previous
+            if error is None:
+                instance['consecutive_failures'] = 0
+                instance['ejections'] = 0
+                return
+            instance['failures'] += 1
+            instance['consecutive_failures'] += 1
+            instance['last_error'] = error
+            if instance['consecutive_failures'] >= self.max_failures:
+                self.eject(instance, error)
+
+    def eject(self, instance, reason):
+        """剔除实例（调用方需持有lock），重复剔除时间加倍"""
+        seconds = min(self.eject_seconds * (2 ** instance['ejections']), self.max_eject_seconds)
+        instance['ejections'] += 1
+        instance['consecutive_failures'] = 0
+        instance['ejected_until'] = time.time() + seconds
+        print(f"   🚫 SearxNG实例 {instance['url']} 被剔除{seconds:.0f}秒: {reason}")
+
+    def check(self, instance):
+        """健康检查单个实例（/healthz），返回是否健康"""
+        started_at = time.time()
+        try:
+            response = self.session.get(f"{instance['url']}/healthz", timeout=self.health_timeout)
+            healthy = response.status_code == 200
+        except requests.RequestException:
+            healthy = False
+
+        with self.lock:
+            was_healthy = instance['healthy'] and instance['ejected_until'] <= time.time()
+            instance['healthy'] = healthy
+            if healthy:
+                if instance['ejected_until'] > time.time():
+                    instance['ejected_until'] = 0.0  # 健康检查通过，提前恢复
+                if instance['ewma_latency'] is None:
+                    instance['ewma_latency'] = time.time() - started_at
+                if not was_healthy:
+                    print(f"   ✅ SearxNG实例 {instance['url']} 恢复")
+        return healthy
+
+    def check_all(self):
+        """并发检查所有实例，返回健康实例数"""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.instances)) as executor:
+            return sum(executor.map(self.check, self.instances))
+
+    def start(self):
+        """启动后台健康检查（重复调用无效）"""
+        with self.lock:
+            if self.health_thread:
+                return self
+            self.health_thread = threading.Thread(target=self.health_loop, daemon=True)
+        self.health_thread.start()
+        return self
+
+    def health_loop(self):
+        while not self.stop_event.wait(self.health_interval):
+            self.check_all()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def summary(self):
+        """返回各实例状态"""
+        now = time.time()
+        with self.lock:
+            return {
+                'instances': [{
+                    'url': i['url'],
+                    'available': i['healthy'] and i['ejected_until'] <= now,
+                    'ewma_latency': round(i['ewma_latency'], 3) if i['ewma_latency'] is not None else None,
+                    'inflight': i['inflight'],
+                    'requests': i['requests'],
+                    'failures': i['failures'],
+                    'ejections': i['ejections'],
+                    'last_error': i['last_error']
+                } for i in self.instances]
+            }
+
+
+def default_searxng_urls():
+    """SEARXNG_URLS（逗号分隔）优先，否则使用SEARXNG_URL或本地默认端口"""
+    urls = [url.strip() for url in os.environ.get('SEARXNG_URLS', '').split(',') if url.strip()]
+    return urls or [os.environ.get('SEARXNG_URL', 'http://localhost:8080')]
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_searxng_pool(urls=None):
+    """返回进程内共享的实例池（按实例列表复用健康状态和连接池）"""
+    urls = tuple(url.rstrip('/') for url in (urls or default_searxng_urls()))
+    with _pools_lock:
+        if urls not in _pools:
+            _pools[urls] = SearxNGPool(urls)
+        return _pools[urls]
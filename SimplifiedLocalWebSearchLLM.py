@@ -18,11 +18,14 @@ from datetime import datetime
 from urllib.parse import quote, urljoin
 from bs4 import BeautifulSoup
 import random
+from OllamaClient import get_ollama_client
+from ToolAgentLoop import ToolAgentLoop
 
 class SimplifiedLocalWebSearchLLM:
     def __init__(self):
         # 本地Ollama配置
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
         
         # 搜索配置
         self.session = requests.Session()
@@ -246,110 +249,16 @@ class SimplifiedLocalWebSearchLLM:
             
             print(f"🧠 调用Ollama ({model}) with {len(tools)} tools...")
             
-            # 调用Ollama
-            response = requests.post(f"{self.ollama_url}/api/chat", json={
-                'model': model,
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': prompt
-                    }
-                ],
-                'tools': tools,
-                'stream': False,
-                'options': {
-                    'temperature': 0.7,
-                    'num_ctx': 4096
-                }
-            }, timeout=120)
-            
-            if response.status_code == 200:
-                data = response.json()
-                message = data.get('message', {})
-                
-                print(f"   ✅ Ollama响应成功")
-                
-                # 检查是否有工具调用
-                tool_calls = message.get('tool_calls', [])
-                
-                if tool_calls:
-                    print(f"   🛠️  LLM请求调用{len(tool_calls)}个工具")
-                    
-                    # 执行工具调用
-                    tool_results = []
-                    for i, tool_call in enumerate(tool_calls):
-                        function_name = tool_call['function']['name']
-                        arguments = tool_call['function']['arguments']
-                        
-                        print(f"      🔧 工具 {i+1}: {function_name}")
-                        
-                        if function_name == 'web_search':
-                            result = self.web_search_function(**arguments)
-                        elif function_name == 'scrape_website':
-                            result = self.scrape_website_function(**arguments)
-                        elif function_name == 'extract_emails':
-                            result = self.extract_emails_function(**arguments)
-                        else:
-                            result = {'success': False, 'error': f'Unknown function: {function_name}'}
-                        
-                        tool_results.append({
-                            'tool_call_id': tool_call.get('id', f'call_{i}'),
-                            'function_name': function_name,
-                            'result': result
-                        })
-                        
-                        # 工具调用间隔
-                        time.sleep(2)
-                    
-                    # 将工具结果发送回LLM进行最终分析
-                    if tool_results:
-                        print(f"   🧠 发送工具结果给LLM进行最终分析...")
-                        
-                        # 构建消息历史
-                        messages = [
-                            {'role': 'user', 'content': prompt},
-                            message,  # LLM的工具调用消息
-                        ]
-                        
-                        # 添加工具结果
-                        for tool_result in tool_results:
-                            messages.append({
-                                'role': 'tool',
-                                'content': json.dumps(tool_result['result'], ensure_ascii=False),
-                                'tool_call_id': tool_result['tool_call_id']
-                            })
-                        
-                        # 再次调用LLM
-                        final_response = requests.post(f"{self.ollama_url}/api/chat", json={
-                            'model': model,
-                            'messages': messages,
-                            'stream': False,
-                            'options': {
-                                'temperature': 0.3,
-                                'num_ctx': 4096
-                            }
-                        }, timeout=120)
-                        
-                        if final_response.status_code == 200:
-                            final_data = final_response.json()
-                            final_message = final_data.get('message', {})
-                            
-                            return {
-                                'success': True,
-                                'response': final_message.get('content', ''),
-                                'tool_calls': tool_calls,
-                                'tool_results': tool_results
-                            }
-                
-                # 没有工具调用的普通响应
-                return {
-                    'success': True,
-                    'response': message.get('content', ''),
-                    'tool_calls': [],
-                    'tool_results': []
-                }
-            else:
-                return {'success': False, 'error': f'Ollama API error: {response.status_code}'}
+            # 多轮Agent循环：同一轮的工具调用并发执行（DuckDuckGo限制并发为3），工具输出按token预算压缩后回传
+            agent = ToolAgentLoop(self.ollama, model, tools, {
+                'web_search': self.web_search_function,
+                'scrape_website': self.scrape_website_function,
+                'extract_emails': self.extract_emails_function
+            }, options={'temperature': 0.7}, final_options={'temperature': 0.3}, timeout=120, max_workers=3)
+            result = agent.run(prompt)
+            if result['success']:
+                print(f"   ✅ Ollama Agent完成: {result['agent_stats']}")
+            return result
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+流式查询分发器
+- 模型按行输出搜索查询，每解析出一条完整查询立即提交搜索，不等整段生成结束
+- 搜索I/O与剩余的生成重叠，第一批结果在生成完成之前就能到达
+- 查询不足时用备用查询补齐；调用方达到目标后可随时取消，停止生成并丢弃未开始的搜索
+"""
+
+import re
+import time
+import queue
+import threading
+import concurrent.futures
+
+
+class StreamingQueryDispatcher:
+    # 去掉行首编号/列表符号（"1." "2)" "-" "*" "•"）和包裹的引号、逗号
+    PREFIX_PATTERN = re.compile(r'^\s*(?:\d+\s*[.)、:：]|[-*•])\s*')
+
+    def __init__(self, search_fn, max_queries=5, max_workers=3, min_length=5):
+        self.search_fn = search_fn
+        self.max_queries = max_queries
+        self.min_length = min_length
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+        self.results_queue = queue.Queue()
+        self.cancelled = threading.Event()
+        self.queries = []
+        self.sources = []
+        self.error = None
+
+        self.started_at = None
+        self.stats = {'first_query_seconds': None, 'first_result_seconds': None, 'generation_seconds': None}
+
+    def parse_line(self, line):
+        """把模型输出的一行解析为搜索查询，不是查询的行返回None"""
+        query = self.PREFIX_PATTERN.sub('', line).strip().strip(',').strip().strip('"\'“”').strip()
+        if len(query) < self.min_length or query.startswith(('{', '[', '```')) or query.endswith(':'):
+            return None
+        return query
+
+    def start(self, lines, fallback_queries=()):
+        """后台消费模型的行流并逐条分发搜索；lines为可迭代对象（例如OllamaClient.generate_lines）"""
+        self.started_at = time.time()
+        thread = threading.Thread(target=self._produce, args=(lines, list(fallback_queries)), daemon=True)
+        thread.start()
+        return self
+
+    def _produce(self, lines, fallback_queries):
+        try:
+            for line in lines:
+                if self.cancelled.is_set() or len(self.queries) >= self.max_queries:
+                    break
+                query = self.parse_line(line)
+                if query:
+                    self.dispatch(query, 'llm')
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            close = getattr(lines, 'close', None)
+            if close:
+                close()  # 提前结束时关闭流式连接，释放调度槽位
+            self.stats['generation_seconds'] = round(time.time() - self.started_at, 2)
+
+        for query in fallback_queries:
+            if self.cancelled.is_set() or len(self.queries) >= self.max_queries:
+                break
+            self.dispatch(query, 'fallback')
+        self.results_queue.put(('done', len(self.queries)))
+
+    def dispatch(self, query, source):
+        """提交一条搜索（忽略重复查询）"""
+        if query.lower() in (q.lower() for q in self.queries):
+            return
+        index = len(self.queries)
+        self.queries.append(query)
+        self.sources.append(source)
+        if self.stats['first_query_seconds'] is None:
+            self.stats['first_query_seconds'] = round(time.time() - self.started_at, 2)
+        print(f"   📤 查询{index + 1}已分发({source}): {query}")
+
+        try:
+            future = self.executor.submit(self.search_fn, query)
+        except RuntimeError:  # 已取消，执行器关闭
+            self.results_queue.put(('result', index, query, None))
+            return
+        future.add_done_callback(lambda f: self.results_queue.put(('result', index, query, f)))
+
+    def results(self):
+        """按完成顺序产出 (序号, 查询, 搜索结果)，搜索失败或被取消的结果为None"""
+        expected, received = None, 0
+        while expected is None or received < expected:
+            item = self.results_queue.get()
+            if item[0] == 'done':
+                expected = item[1]
+                continue
+            received += 1
+            _, index, query, future = item
+            result = None
+            if future is not None and not future.cancelled():
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"   ⚠️  查询'{query}'搜索失败: {e}")
+            if self.stats['first_result_seconds'] is None:
+                self.stats['first_result_seconds'] = round(time.time() - self.started_at, 2)
+            yield index, query, result
+        self.executor.shutdown(wait=False)
+
+    def cancel(self):
+        """停止生成与尚未开始的搜索（已在执行的搜索会自然结束）"""
+        self.cancelled.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def summary(self):
+        """返回分发统计"""
+        return {
+            **self.stats,
+            'queries': list(self.queries),
+            'llm_queries': self.sources.count('llm'),
+            'fallback_queries': self.sources.count('fallback'),
+            'error': self.error
+        }
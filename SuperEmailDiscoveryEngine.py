@@ -20,13 +20,22 @@ from urllib.parse import quote, urlencode
 from bs4 import BeautifulSoup
 import concurrent.futures
 import logging
+from YieldForecaster import YieldForecaster
+from DomainCrawlMemory import DomainCrawlMemory
+from DiscoveryCursor import DiscoveryCursor
+from DiscoveryCheckpoint import DiscoveryCheckpoint
+from CrawlFrontier import CrawlFrontier
+from ResultRanker import ResultRanker
+from AdaptivePager import AdaptivePager
+from SearxNGPool import get_searxng_pool
+from IncrementalSearchState import IncrementalSearchState
 
 class SuperEmailDiscoveryEngine:
     def __init__(self):
         self.setup_logging()
 
-        # SearxNG配置 - Railway兼容
-        self.searxng_url = os.environ.get('SEARXNG_URL', 'http://localhost:8080')
+        # SearxNG配置 - Railway兼容；SEARXNG_URLS配置多个实例时按负载路由
+        self.searxng = get_searxng_pool()
 
         # 网络会话配置 - 🔥 设置合理超时防止卡住
         self.session = requests.Session()
@@ -40,6 +49,10 @@ class SuperEmailDiscoveryEngine:
         # 🔥 CRITICAL FIX: 设置15秒超时防止单个请求卡住整个流程
         self.request_timeout = 15
 
+        # 🔥 NEW: 第1页联系指示多的查询并发翻页，新增结果变少时停止
+        self.pager = AdaptivePager(lambda query, pageno, **params: self.search_with_advanced_logging(query, pageno=pageno, **params),
+                                   log=lambda message: self.logger.info(message))
+
         # 邮箱模式
         self.email_pattern = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
 
@@ -47,14 +60,19 @@ class SuperEmailDiscoveryEngine:
         self.cache_dir = os.path.join(os.path.dirname(__file__), '.email_cache')
         os.makedirs(self.cache_dir, exist_ok=True)
 
+        # 🔥 NEW: 域名爬取记忆，跳过近期已爬取/无产出/频繁失败的域名
+        self.domain_memory = DomainCrawlMemory(self.cache_dir)
+
         # 搜索状态
         self.found_emails = []
         self.already_returned_emails = set()  # 🔥 NEW: Track already-returned emails
+        self.validation_results = {}  # 邮箱 -> (是否有效, 原因)，随任务检查点保存
         self.search_stats = {
             'total_queries': 0,
             'successful_queries': 0,
             'emails_found': 0,
             'websites_scraped': 0,
+            'domains_skipped': 0,
             'unique_domains': set(),
             'query_success_rate': {}
         }
@@ -212,23 +230,44 @@ class SuperEmailDiscoveryEngine:
         
         self.logger.info(f"   ✅ 生成{len(base_strategies)}个专业级搜索策略")
         return base_strategies
+
+    def get_strategy_family(self, round_num):
+        """返回轮次对应的策略族（与generate_professional_search_strategies的分支一致）"""
+        if round_num <= 5:
+            return f'round_{round_num}'
+        if round_num % 3 == 0:
+            return 'regional'
+        if round_num % 3 == 1:
+            return 'technical'
+        return 'mixed'
+
+    def next_strategy_round(self, strategy_round, exhausted_families):
+        """跳到下一个未耗尽策略族的轮次，全部耗尽时返回None"""
+        for candidate in range(strategy_round + 1, strategy_round + 9):
+            if self.get_strategy_family(candidate) not in exhausted_families:
+                return candidate
+        return None
     
-    def search_with_advanced_logging(self, query, max_results=50):
-        """高级SearxNG搜索 - 无超时限制，尽可能多地获取结果"""
+    def search_with_advanced_logging(self, query, max_results=50, pageno=1, time_range=None):
+        """高级SearxNG搜索 - 无超时限制，尽可能多地获取结果（time_range限定只返回近期结果）"""
         try:
-            self.logger.info(f"🔍 深度专业搜索: {query[:80]}...")
+            page_info = f" (第{pageno}页)" if pageno > 1 else ""
+            range_info = f" [time_range={time_range}]" if time_range else ""
+            self.logger.info(f"🔍 深度专业搜索{page_info}{range_info}: {query[:80]}...")
             self.search_stats['total_queries'] += 1
             
             params = {
                 'q': query,
                 'format': 'json',
                 'categories': 'general',
-                'pageno': 1
+                'pageno': pageno
             }
+            if time_range:
+                params['time_range'] = time_range
             
             start_time = time.time()
             # 🔥 CRITICAL FIX: 添加超时防止卡住，但如果失败会继续尝试下一个搜索
-            response = self.session.get(f"{self.searxng_url}/search", params=params, timeout=self.request_timeout)
+            response = self.searxng.get(params, timeout=self.request_timeout)
             duration = time.time() - start_time
             
             if response.status_code == 200:
@@ -568,7 +607,9 @@ class SuperEmailDiscoveryEngine:
         for email_data in email_list:
             email = email_data['email'] if isinstance(email_data, dict) else email_data
 
-            is_valid, reason = self.validate_email_deliverable(email)
+            if email not in self.validation_results:
+                self.validation_results[email] = self.validate_email_deliverable(email)
+            is_valid, reason = self.validation_results[email]
 
             if is_valid:
                 valid_emails.append(email_data)
@@ -592,6 +633,7 @@ class SuperEmailDiscoveryEngine:
 
             if response.status_code != 200:
                 self.logger.warning(f"   ⚠️ HTTP {response.status_code}: {url}")
+                self.domain_memory.record_failure(url, f'http_{response.status_code}')
                 return []
 
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -631,57 +673,235 @@ class SuperEmailDiscoveryEngine:
             emails = self.extract_emails_advanced(all_text, f"网站 {url}", html_content)
 
             self.logger.info(f"   ✅ 爬取完成 ({duration:.1f}s): {len(emails)}个邮箱")
+            self.domain_memory.record_crawl(url, [email_data['email'] for email_data in emails])
             return emails
 
         except Exception as e:
             self.logger.error(f"   ❌ 爬取失败 {url}: {str(e)}")
+            self.domain_memory.record_failure(url, type(e).__name__)
             return []
     
-    def execute_persistent_discovery(self, industry, target_count=5, max_rounds=None, session_id=None):
+    def crawl_sites_for_emails(self, sites, round_num, strategy):
+        """并行爬取网站，返回(新邮箱列表, 发现总数, 跳过的已返回邮箱数)"""
+        found_emails = []
+        total_found = 0
+        cached_skipped = 0
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+            future_to_result = {
+                executor.submit(self.scrape_website_advanced, site['url']): site
+                for site in sites
+            }
+
+            # 移除超时限制，让所有网站都有充足时间完成
+            for future in concurrent.futures.as_completed(future_to_result):
+                try:
+                    site = future_to_result[future]
+                    website_emails = future.result()
+
+                    for email_data in website_emails:
+                        total_found += 1
+                        email = email_data['email']
+                        if email in self.already_returned_emails:
+                            cached_skipped += 1
+                            continue
+                        if not any(e['email'] == email for e in found_emails):
+                            found_emails.append({
+                                'email': email,
+                                'name': email_data.get('name'),
+                                'title': email_data.get('title'),
+                                'department': email_data.get('department'),
+                                'is_personal': email_data.get('is_personal', False),
+                                'source': 'website_scraping',
+                                'source_url': site['url'],
+                                'source_title': site.get('title', ''),
+                                'confidence': 0.95,
+                                'round': round_num,
+                                'strategy': site.get('meta', {}).get('strategy', strategy),
+                                'discovery_method': 'deep_scraping'
+                            })
+                except Exception as e:
+                    continue
+
+        return found_emails, total_found, cached_skipped
+
+    def resume_discovery(self, job_id):
+        """按job_id从最后一个检查点恢复发现任务"""
+        state = DiscoveryCheckpoint(self.cache_dir, job_id).load()
+        if not state:
+            self.logger.error(f"❌ 未找到任务检查点: {job_id}")
+            return {'success': False, 'error': f'No checkpoint found for job {job_id}', 'job_id': job_id}
+
+        self.logger.info(f"♻️ 恢复任务 {job_id} (状态: {state.get('status')})")
+        return self.execute_persistent_discovery(job_id=job_id, **state['params'])
+
+    def execute_persistent_discovery(self, industry, target_count=5, max_rounds=None, session_id=None,
+                                     min_yield_per_request=None, job_id=None, fetch_budget=None,
+                                     sites_per_strategy=15, incremental=None):
         """执行无限制持续搜索 - 越多越准确"""
-        # 🔥 FIX: Scale max_rounds based on target_count
-        # Each round finds ~5-15 new emails on average (after filtering cached)
-        # Use at least 100 rounds, scale up for larger requests, cap at 500 for safety
+        # 🔥 FIX: 由产出预测器决定何时切换策略族或结束，max_rounds只作为安全上限
         if max_rounds is None:
-            max_rounds = min(500, max(100, target_count // 5))  # ~5 emails per round, max 500 rounds
+            max_rounds = 500
+        forecaster = YieldForecaster(min_yield_per_request)
+        # 🔥 NEW: 增量模式 - 重复运行的活动只搜索上次运行之后的新结果，见过的URL不再解析和爬取
+        if incremental is None:
+            incremental = os.environ.get('DISCOVERY_INCREMENTAL', '0') == '1'
+        incremental_state = IncrementalSearchState(self.cache_dir, industry, session_id) if incremental else None
+
+        # 🔥 NEW: 任务检查点 - 已有检查点时从中断处继续
+        checkpoint = DiscoveryCheckpoint(self.cache_dir, job_id)
+        state = checkpoint.load()
+        if state and state.get('status') == 'completed':
+            self.logger.info(f"✅ 任务 {checkpoint.job_id} 已完成，直接返回检查点结果")
+            return state['result']
 
         self.logger.info(f"🚀 启动无限制超级邮箱搜索 - {industry}")
         self.logger.info(f"   🎯 目标: {target_count}个NEW邮箱 (跳过已返回)")
-        self.logger.info(f"   🔄 最大轮数: {max_rounds} (动态调整，确保找到足够新邮箱)")
+        self.logger.info(f"   🔄 最大轮数: {max_rounds} (安全上限，边际产出<{forecaster.min_yield_per_request}/请求时提前结束)")
         self.logger.info(f"   📊 使用2024年最佳搜索实践")
         self.logger.info(f"   ⏰ 无时间限制 - 持续搜索直到找到足够新邮箱")
         if session_id:
             self.logger.info(f"   🔑 Session ID: {session_id} (campaign-specific cache)")
+        self.logger.info(f"   💾 Job ID: {checkpoint.job_id}")
+        if incremental_state:
+            self.logger.info(f"   🕒 增量模式: 已记录{len(incremental_state.families)}个策略族, "
+                             f"{len(incremental_state.seen_urls)}个已处理URL")
 
         # 🔥 FIX: Load cache of already-returned emails with session_id
         cached_count = self.load_returned_emails_cache(industry, session_id)
         if cached_count > 0:
             self.logger.info(f"   🔄 跳过已返回的 {cached_count} 个邮箱，寻找新邮箱...")
 
+        # 🔥 NEW: 所有策略和轮次共享的最优优先爬取前沿（每批结果先做向量化相关性打分）
+        # 域名记忆按本活动已返回的邮箱判断已产出的域名是否跳过
+        ranker = ResultRanker(industry)
+        frontier = CrawlFrontier(self.domain_memory, fetch_budget, ranker=ranker,
+                                 known_emails=self.already_returned_emails)
+        # 每个策略只爬取得分最高的若干URL（DISCOVERY_STRATEGY_FETCH_BUDGET，<=0表示只用sites_per_strategy）
+        strategy_fetch_budget = sites_per_strategy
+        if ranker.fetch_budget and ranker.fetch_budget > 0:
+            strategy_fetch_budget = min(sites_per_strategy, ranker.fetch_budget)
+        self.logger.info(f"   🎯 每个策略最多爬取{strategy_fetch_budget}个最相关网站")
+
         start_time = time.time()
         all_emails = []
         round_num = 1
+        strategy_round = 1  # 策略族轮次，产出下降时可跳过耗尽的策略族
+        resume_index = 0
+
+        # 🔥 NEW: 活动游标 - "再要N个"时从上次停下的位置继续
+        cursor = DiscoveryCursor(self.cache_dir, industry, session_id) if session_id else None
+        if cursor and cursor.resumed:
+            strategy_round = cursor.strategy_round
+            resume_index = cursor.strategy_index
+            all_emails = cursor.take_reserve(self.already_returned_emails)
+            frontier.push_results(cursor.frontier, strategy='cursor_frontier')
+            self.logger.info(f"   ⏩ 从游标继续: 策略轮次{strategy_round} 策略{resume_index + 1}, "
+                             f"储备邮箱{len(all_emails)}个, 待访问URL{len(cursor.frontier)}个")
+        stop_reason = None
         consecutive_empty_rounds = 0
         total_emails_found = 0  # 🔥 FIX: Track total including duplicates
         total_cached_skipped = 0  # 🔥 FIX: Track how many cached emails skipped
+        round_state = None
+
+        if state:
+            round_num = state['round_num']
+            strategy_round = state['strategy_round']
+            resume_index = state['resume_index']
+            all_emails = state['all_emails']
+            round_state = state.get('round_state')
+            consecutive_empty_rounds = state['consecutive_empty_rounds']
+            total_emails_found = state['total_emails_found']
+            total_cached_skipped = state['total_cached_skipped']
+            start_time -= state.get('elapsed', 0)
+            forecaster.load_state(state['forecaster'])
+            frontier.load_state(state['frontier'])
+            self.search_stats.update(state['search_stats'])
+            self.search_stats['unique_domains'] = set(state['search_stats'].get('unique_domains', []))
+            self.validation_results.update({email: tuple(result) for email, result in state.get('validation_results', {}).items()})
+            self.logger.info(f"   ♻️ 从检查点继续: 第{round_num}轮 策略{resume_index + 1}, 已有候选邮箱{len(all_emails)}个")
+
+        def save_checkpoint(status='running', force=False, **extra):
+            """保存任务检查点（策略间按min_interval节流，force或非running状态时强制写入），失败不影响搜索"""
+            try:
+                checkpoint.save({
+                    'status': status,
+                    'params': {
+                        'industry': industry,
+                        'target_count': target_count,
+                        'max_rounds': max_rounds,
+                        'session_id': session_id,
+                        'min_yield_per_request': min_yield_per_request,
+                        'fetch_budget': fetch_budget,
+                        'sites_per_strategy': sites_per_strategy,
+                        'incremental': incremental
+                    },
+                    'round_num': round_num,
+                    'strategy_round': strategy_round,
+                    'resume_index': resume_index,
+                    'all_emails': all_emails,
+                    'round_state': round_state,
+                    'consecutive_empty_rounds': consecutive_empty_rounds,
+                    'total_emails_found': total_emails_found,
+                    'total_cached_skipped': total_cached_skipped,
+                    'elapsed': time.time() - start_time,
+                    'forecaster': forecaster.to_state(),
+                    'frontier': frontier.to_state(),
+                    'search_stats': self.prepare_stats_for_json(),
+                    'validation_results': self.validation_results,
+                    **extra
+                }, force=force or status != 'running')
+            except Exception as e:
+                self.logger.warning(f"⚠️ 保存任务检查点失败: {e}")
         
         while len(all_emails) < target_count and round_num <= max_rounds:
             self.logger.info(f"\n📍 第{round_num}轮搜索 (已找到 {len(all_emails)}/{target_count})")
             
             # 生成本轮策略
-            strategies = self.generate_professional_search_strategies(industry, round_num)
-            round_emails = []
+            strategies = self.generate_professional_search_strategies(industry, strategy_round)
+            strategy_family = self.get_strategy_family(strategy_round)
+            if round_state is None:
+                round_state = {
+                    'round_emails': [],
+                    'emails_before_round': len(all_emails),
+                    'found_before_round': total_emails_found,
+                    'skipped_before_round': total_cached_skipped,
+                    'requests_before_round': self.search_stats['total_queries'] + self.search_stats['websites_scraped']
+                }
+            round_emails = round_state['round_emails']
+            # 增量模式：该策略族上次运行过时，只搜索上次运行之后的时间范围
+            time_range = incremental_state.time_range(strategy_family) if incremental_state else None
+            if incremental_state:
+                incremental_state.mark_family(strategy_family)
             
             for i, strategy in enumerate(strategies, 1):
+                if i <= resume_index:
+                    continue
+                resume_index = i - 1
+                save_checkpoint()
                 self.logger.info(f"   🎯 策略{i}/{len(strategies)}: {strategy[:70]}...")
                 
                 
-                # 搜索
-                results = self.search_with_advanced_logging(strategy)
+                # 搜索（自适应翻页；游标记录每个查询已处理到第几页）
+                # 限定时间范围的搜索总是从第1页开始，游标页码只对应不限时间的结果
+                pageno = cursor.next_page(strategy) if cursor and not time_range else 1
+                results, paging = self.pager.search(strategy, start_page=pageno, time_range=time_range)
+                if cursor:
+                    cursor.set_position(strategy_round, i)
                 
                 if not results:
                     self.logger.warning(f"   ⚠️ 策略{i} 无结果")
                     continue
+                if cursor and not time_range:
+                    cursor.advance_page(strategy, pages=paging['last_page'] - pageno + 1)
+
+                # 增量模式：解析预览和入队爬取之前跳过以前处理过的URL
+                if incremental_state:
+                    total_results = len(results)
+                    results = incremental_state.filter_new(results, time_range)
+                    self.logger.info(f"   🕒 增量过滤: {len(results)}/{total_results}个新结果")
+                    if not results:
+                        continue
                 
                 # 从搜索预览提取邮箱
                 preview_emails = []
@@ -715,47 +935,41 @@ class SuperEmailDiscoveryEngine:
                 round_emails.extend(preview_emails)
                 self.logger.info(f"   📧 策略{i}预览: {len(preview_emails)}个邮箱")
                 
-                # 并行爬取更多网站 - 无限制模式
-                promising_sites = [r for r in results[:20] 
-                                 if any(word in r.get('url', '').lower() 
-                                       for word in ['contact', 'about', 'team', 'press'])]
-                
+                # 🔥 NEW: 结果加入全局前沿（域名记忆跳过的不入队），再取出当前价值最高的URL
+                skipped_before = frontier.skipped
+                queued = frontier.push_results(results, strategy=strategy, round=round_num)
+                self.search_stats['domains_skipped'] += frontier.skipped - skipped_before
+                promising_sites = frontier.pop(strategy_fetch_budget)
+                if incremental_state:
+                    # 预览已解析、且没有留在前沿等待爬取的结果记为已处理；本次取出的URL爬取后再记，
+                    # 仍在前沿中的URL不记入水位，下次运行仍会处理
+                    crawling = {site['url'] for site in promising_sites}
+                    incremental_state.mark_processed(
+                        result.get('url') for result in results
+                        if result.get('url') not in frontier.pending and result.get('url') not in crawling
+                    )
+
+                budget_info = f", 剩余预算{frontier.remaining_budget()}" if frontier.fetch_budget else ""
+                self.logger.info(f"   🧭 前沿: 新入队{queued}个, 待爬取{len(frontier)}个{budget_info}")
                 if not promising_sites:
-                    promising_sites = results[:15]  # 增加备选方案数量
-                
-                self.logger.info(f"   🌐 深度并行爬取{len(promising_sites)}个网站 (无时间限制)...")
+                    if frontier.remaining_budget() == 0:
+                        self.logger.info(f"   ⚠️ 全局抓取预算已用完，仅使用搜索预览")
+                    else:
+                        self.logger.info(f"   ⚠️ 没有新的可爬取网站，仅使用搜索预览")
+                    time.sleep(0.3)
+                    continue
                 
-                with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
-                    future_to_result = {
-                        executor.submit(self.scrape_website_advanced, site['url']): site 
-                        for site in promising_sites
-                    }
-                    
-                    # 移除超时限制，让所有网站都有充足时间完成
-                    for future in concurrent.futures.as_completed(future_to_result):
-                        try:
-                            site = future_to_result[future]
-                            website_emails = future.result()
-
-                            for email in website_emails:
-                                total_emails_found += 1  # 🔥 FIX: Count all emails found
-                                # 🔥 NEW: Skip already-returned emails
-                                if email in self.already_returned_emails:
-                                    total_cached_skipped += 1  # 🔥 FIX: Track skipped
-                                    continue
-                                if not any(e['email'] == email for e in round_emails):
-                                    round_emails.append({
-                                        'email': email,
-                                        'source': 'website_scraping',
-                                        'source_url': site['url'],
-                                        'source_title': site.get('title', ''),
-                                        'confidence': 0.95,
-                                        'round': round_num,
-                                        'strategy': strategy,
-                                        'discovery_method': 'deep_scraping'
-                                    })
-                        except Exception as e:
-                            continue
+                self.logger.info(f"   🌐 深度并行爬取{len(promising_sites)}个最高价值网站 (无时间限制)...")
+
+                # 🔥 FIX: scrape_website_advanced返回邮箱字典，之前按字符串处理导致爬取结果全部丢失
+                website_emails, found, skipped = self.crawl_sites_for_emails(promising_sites, round_num, strategy)
+                if incremental_state:
+                    incremental_state.mark_processed(site['url'] for site in promising_sites)
+                total_emails_found += found
+                total_cached_skipped += skipped
+                for email_data in website_emails:
+                    if not any(e['email'] == email_data['email'] for e in round_emails):
+                        round_emails.append(email_data)
                 
                 # 检查进度，但不立即停止 - 让它继续搜索更多
                 all_unique = {e['email']: e for e in all_emails + round_emails}
@@ -765,23 +979,32 @@ class SuperEmailDiscoveryEngine:
                 
                 time.sleep(0.3)  # 减少策略间隔
             
+            resume_index = 0
+            round_state_done, round_state = round_state, None
+            if cursor:
+                cursor.set_position(strategy_round + 1, 0)
+                cursor.set_frontier(frontier.pending_sites())
+
             # 更新总邮箱列表
             all_emails.extend(round_emails)
             all_unique = {e['email']: e for e in all_emails}
             all_emails = list(all_unique.values())
 
+            try:
+                self.domain_memory.save()
+            except Exception as e:
+                self.logger.warning(f"⚠️ 保存域名爬取记忆失败: {e}")
+            if incremental_state:
+                self.save_incremental_state(incremental_state)
+
             # 🔥 FIX: Show detailed statistics including cached skips
             self.logger.info(f"📊 第{round_num}轮结果: 新增{len(round_emails)}个，总计{len(all_emails)}个NEW邮箱")
             if total_cached_skipped > 0:
                 self.logger.info(f"   🔄 已跳过 {total_cached_skipped} 个重复/缓存邮箱 (总发现{total_emails_found}个)")
             
-            # 检查是否需要调整策略，但不轻易放弃
             if len(round_emails) == 0:
                 consecutive_empty_rounds += 1
-                self.logger.warning(f"⚠️ 连续{consecutive_empty_rounds}轮无结果 - 继续尝试")
-                
-                if consecutive_empty_rounds >= 5:  # 增加容忍度
-                    self.logger.info("🔄 切换到更广泛的搜索策略...")
+                self.logger.warning(f"⚠️ 连续{consecutive_empty_rounds}轮无结果")
             else:
                 consecutive_empty_rounds = 0
             
@@ -789,8 +1012,39 @@ class SuperEmailDiscoveryEngine:
             if len(all_emails) >= target_count and round_num >= 5:
                 self.logger.info(f"🎯 已收集足够邮箱并进行了充分搜索，准备结束")
                 break
+
+            # 🔥 NEW: 根据边际产出决定继续、切换策略族或结束
+            forecaster.record_round(
+                strategy_family,
+                new_emails=len(all_emails) - round_state_done['emails_before_round'],
+                requests_made=self.search_stats['total_queries'] + self.search_stats['websites_scraped'] - round_state_done['requests_before_round'],
+                raw_found=total_emails_found - round_state_done['found_before_round'],
+                cached_skipped=total_cached_skipped - round_state_done['skipped_before_round']
+            )
+            decision, reason = forecaster.decide(strategy_family)
+            forecast = forecaster.summary()
+            self.logger.info(f"   📈 产出预测: {forecast['marginal_yield_per_request']}/请求, "
+                             f"预计剩余{forecast['estimated_remaining_new_emails']}个新邮箱")
+
+            if decision == 'stop':
+                stop_reason = reason
+                self.logger.info(f"🛑 停止搜索: {reason}")
+                break
+
+            next_round = self.next_strategy_round(strategy_round, forecaster.exhausted_families)
+            if next_round is None:
+                stop_reason = '所有策略族的边际产出均低于阈值'
+                self.logger.info(f"🛑 停止搜索: {stop_reason}")
+                break
+            if decision == 'switch':
+                self.logger.info(f"🔄 {reason}，切换到策略族 {self.get_strategy_family(next_round)}")
+            strategy_round = next_round
+            if cursor:
+                cursor.set_position(strategy_round, 0)
+                self.save_cursor(cursor)
             
             round_num += 1
+            save_checkpoint(force=True)  # 轮次边界强制写入
             if round_num <= max_rounds:
                 time.sleep(1)  # 减少轮次间隔
         
@@ -808,6 +1062,16 @@ class SuperEmailDiscoveryEngine:
         # Take only the target count after validation
         final_emails = validated_emails[:target_count]
 
+        # 🔥 NEW: 未返回的候选邮箱放入游标储备，下次请求直接使用
+        if cursor:
+            cursor.set_frontier(frontier.pending_sites())
+            cursor.set_reserve(validated_emails[target_count:] + all_emails[target_count + 10:],
+                               self.already_returned_emails | {e['email'] for e in final_emails})
+            self.save_cursor(cursor)
+        if incremental_state:
+            incremental_state.finish()
+            self.save_incremental_state(incremental_state)
+
         # 更新统计
         self.search_stats['emails_found'] = len(final_emails)
         self.search_stats['invalid_emails_filtered'] = invalid_count
@@ -823,7 +1087,7 @@ class SuperEmailDiscoveryEngine:
         self.logger.info(f"   🔄 搜索轮数: {round_num-1}")
         self.logger.info(f"   ⏱️ 总耗时: {total_time:.1f}秒")
         self.logger.info(f"   📊 成功率: {self.search_stats['successful_queries']}/{self.search_stats['total_queries']}")
-        self.logger.info(f"   🌐 爬取网站: {self.search_stats['websites_scraped']}个")
+        self.logger.info(f"   🌐 爬取网站: {self.search_stats['websites_scraped']}个 (域名记忆跳过{self.search_stats['domains_skipped']}个)")
         self.logger.info(f"   🏢 发现域名: {len(self.search_stats['unique_domains'])}个")
         self.logger.info(f"   🔄 总发现: {total_emails_found}个 (跳过{total_cached_skipped}个重复)")
         self.logger.info(f"   🗑️ 无效过滤: {invalid_count}个 (无MX记录或无效域名)")
@@ -835,8 +1099,9 @@ class SuperEmailDiscoveryEngine:
             for i, email_data in enumerate(final_emails, 1):
                 self.logger.info(f"   {i}. {email_data['email']} (置信度: {email_data['confidence']})")
 
-        return {
+        result = {
             'success': len(final_emails) > 0,
+            'job_id': checkpoint.job_id,
             'emails': [e['email'] for e in final_emails],
             'email_details': final_emails,
             'total_emails': len(final_emails),
@@ -845,11 +1110,37 @@ class SuperEmailDiscoveryEngine:
             'search_stats': self.prepare_stats_for_json(),
             'industry': industry,
             'target_achieved': len(final_emails) >= target_count,
+            'stop_reason': stop_reason,
+            'yield_forecast': forecaster.summary(),
+            'relevance_ranking': ranker.summary(),
+            'search_paging': self.pager.summary(),
+            'searxng_pool': self.searxng.summary(),
+            'incremental_search': incremental_state.summary() if incremental_state else None,
             'method': 'super_email_discovery_2024',
             'confidence_score': sum(e['confidence'] for e in final_emails) / len(final_emails) if final_emails else 0,
             'timestamp': datetime.now().isoformat()
         }
+        if checkpoint.auto_generated:
+            # 调用方没有job_id，无法再用检查点取回结果：完成后直接删除，避免检查点目录无限增长
+            checkpoint.delete()
+        else:
+            save_checkpoint('completed', result=result)
+        return result
     
+    def save_cursor(self, cursor):
+        """保存活动游标，失败不影响搜索"""
+        try:
+            cursor.save()
+        except Exception as e:
+            self.logger.warning(f"⚠️ 保存发现游标失败: {e}")
+
+    def save_incremental_state(self, incremental_state):
+        """保存增量搜索状态，失败不影响搜索"""
+        try:
+            incremental_state.save()
+        except Exception as e:
+            self.logger.warning(f"⚠️ 保存增量搜索状态失败: {e}")
+
     def prepare_stats_for_json(self):
         """准备统计数据用于JSON序列化"""
         stats = dict(self.search_stats)
@@ -858,17 +1149,30 @@ class SuperEmailDiscoveryEngine:
 
 def main():
     if len(sys.argv) < 2:
-        print('使用方法: python3 SuperEmailDiscoveryEngine.py "行业名称" [邮箱数量] [session_id]')
+        print('使用方法: python3 SuperEmailDiscoveryEngine.py "行业名称" [邮箱数量] [session_id] [job_id]')
+        print('      或: python3 SuperEmailDiscoveryEngine.py --resume job_id')
         print('示例: python3 SuperEmailDiscoveryEngine.py "AI startup" 5 campaign_123')
         return
 
-    industry = sys.argv[1]
-    target_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
-    session_id = sys.argv[3] if len(sys.argv) > 3 else None  # 🔥 FIX: Accept session_id
-
     engine = SuperEmailDiscoveryEngine()
-    # 🔥 FIX: Let max_rounds be calculated dynamically based on target_count
-    results = engine.execute_persistent_discovery(industry, target_count, session_id=session_id)
+
+    # 🔥 NEW: 从检查点恢复中断的任务
+    if sys.argv[1] == '--resume':
+        if len(sys.argv) < 3:
+            print('❌ 请提供要恢复的job_id')
+            return
+        results = engine.resume_discovery(sys.argv[2])
+        if 'error' in results:
+            print(json.dumps(results, indent=2, ensure_ascii=False))
+            return
+    else:
+        industry = sys.argv[1]
+        target_count = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        session_id = sys.argv[3] if len(sys.argv) > 3 else None  # 🔥 FIX: Accept session_id
+        job_id = sys.argv[4] if len(sys.argv) > 4 else None
+
+        # 🔥 FIX: Let max_rounds be calculated dynamically based on target_count
+        results = engine.execute_persistent_discovery(industry, target_count, session_id=session_id, job_id=job_id)
     
     print("\n" + "="*90)
     print("🎯 超级邮箱搜索引擎 - 最终报告")
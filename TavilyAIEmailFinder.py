@@ -18,15 +18,38 @@ from datetime import datetime
 from urllib.parse import urlparse
 import asyncio
 import concurrent.futures
+from OllamaClient import get_ollama_client, OllamaSchemaError
+from JsonSchema import contact_profile_schema, query_list_schema
 
 class TavilyAIEmailFinder:
+    # 固定的画像生成要求，所有邮箱共用（共享KV前缀）
+    PROFILE_SYSTEM_PROMPT = """基于用户给出的邮箱信息生成一个专业的用户profile。
+
+生成一个真实的profile，包括:
+- 全名 (根据邮箱前缀推测)
+- 职位/角色
+- 公司描述
+- 行业
+- 专业背景
+
+返回JSON格式，email和company照抄给出的邮箱和公司:
+{
+  "name": "全名",
+  "email": "给出的邮箱",
+  "title": "职位",
+  "company": "给出的公司",
+  "industry": "行业名称",
+  "background": "简要专业背景"
+}"""
+
     def __init__(self):
         # Tavily API 配置
         self.tavily_api_key = os.getenv('TAVILY_API_KEY', 'tvly-YOUR_API_KEY')
         self.tavily_api_url = 'https://api.tavily.com/search'
         
         # Ollama配置
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
         
         # 邮箱匹配模式
         self.email_pattern = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
@@ -51,48 +74,20 @@ class TavilyAIEmailFinder:
 行业: {industry}
 目标: {company_type}
 
-请返回3个搜索查询，每行一个，格式如下:
-1. [查询1]
-2. [查询2] 
-3. [查询3]
+请返回JSON格式，queries中恰好3个搜索查询:
+{{"queries": ["查询1", "查询2", "查询3"]}}
 
-只返回查询本身，不要解释:"""
+只返回JSON，不要解释:"""
 
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': 'qwen2.5:0.5b',
-                'prompt': prompt,
-                'stream': False,
-                'options': {'temperature': 0.7, 'num_ctx': 1024}
-            }, timeout=10)
+            result = self.ollama.generate_json('qwen2.5:0.5b', prompt, query_list_schema(3),
+                                               options={'temperature': 0.7, 'num_ctx': 1024}, timeout=10,
+                                               priority='interactive')
+            queries = [query.strip() for query in result['queries']]
             
-            if response.status_code == 200:
-                result = response.json()['response'].strip()
-                
-                # 提取查询
-                queries = []
-                for line in result.split('\n'):
-                    line = line.strip()
-                    if line and (line.startswith('1.') or line.startswith('2.') or line.startswith('3.')):
-                        query = line.split('.', 1)[1].strip()
-                        if query:
-                            queries.append(query)
-                
-                if queries:
-                    print(f"🧠 Ollama生成了{len(queries)}个智能搜索查询:")
-                    for i, query in enumerate(queries, 1):
-                        print(f"   {i}. {query}")
-                    return queries
-                else:
-                    # 备用查询
-                    fallback_queries = [
-                        f"{industry} company email contact information",
-                        f"{industry} business CEO founder email address", 
-                        f"{industry} company contact us email directory"
-                    ]
-                    print(f"⚠️  使用备用查询")
-                    return fallback_queries
-            else:
-                raise Exception(f"Ollama API error: {response.status_code}")
+            print(f"🧠 Ollama生成了{len(queries)}个智能搜索查询:")
+            for i, query in enumerate(queries, 1):
+                print(f"   {i}. {query}")
+            return queries
                 
         except Exception as e:
             print(f"❌ Ollama查询生成失败: {str(e)}")
@@ -268,69 +263,38 @@ class TavilyAIEmailFinder:
         try:
             print(f"   🧠 为{email_data['email']}生成用户profile...")
             
-            prompt = f"""基于以下邮箱信息生成一个专业的用户profile:
-
-邮箱: {email_data['email']}
+            # 提示词只包含该邮箱的信息；固定的生成要求放在system提示词中，
+            # Ollama可在各邮箱之间复用已计算的KV前缀
+            prompt = f"""邮箱: {email_data['email']}
 公司: {email_data['company_name']}
 网站: {email_data['url']}
 内容摘要: {email_data['content_snippet']}
 搜索查询: {email_data['search_query']}
 
-生成一个真实的profile，包括:
-- 全名 (根据邮箱前缀推测)
-- 职位/角色
-- 公司描述
-- 行业
-- 专业背景
-
-返回JSON格式:
-{{
-  "name": "全名",
-  "email": "{email_data['email']}",
-  "title": "职位", 
-  "company": "{email_data['company_name']}",
-  "industry": "行业名称",
-  "background": "简要专业背景"
-}}
-
 只返回JSON，不要其他解释:"""
 
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': 'llama3.2',
-                'prompt': prompt,
-                'stream': False,
-                'options': {'temperature': 0.3, 'num_ctx': 1024}
-            }, timeout=15)
-            
-            if response.status_code == 200:
-                profile_text = response.json()['response'].strip()
-                
-                try:
-                    # 提取JSON
-                    json_start = profile_text.find('{')
-                    json_end = profile_text.rfind('}') + 1
-                    if json_start != -1 and json_end > json_start:
-                        profile_json = json.loads(profile_text[json_start:json_end])
-                        print(f"      ✅ 生成profile: {profile_json.get('name', 'Unknown')}")
-                        return profile_json
-                    else:
-                        raise ValueError("No JSON found")
-                        
-                except (json.JSONDecodeError, ValueError):
-                    # 备用profile
-                    email_prefix = email_data['email'].split('@')[0]
-                    fallback_profile = {
-                        "name": email_prefix.replace('.', ' ').replace('_', ' ').title(),
-                        "email": email_data['email'],
-                        "title": "Professional",
-                        "company": email_data['company_name'],
-                        "industry": "Business",
-                        "background": f"Professional at {email_data['company_name']}"
-                    }
-                    print(f"      ⚠️  使用备用profile")
-                    return fallback_profile
-            else:
-                return None
+            # 按schema约束输出，无效JSON先修复一次再回退
+            try:
+                profile_json = self.ollama.generate_json(
+                    'llama3.2', prompt, contact_profile_schema(email_data['email']),
+                    system=self.PROFILE_SYSTEM_PROMPT,
+                    options={'temperature': 0.3, 'num_ctx': 1024}, timeout=15, priority='bulk'
+                )
+                print(f"      ✅ 生成profile: {profile_json['name']}")
+                return profile_json
+            except OllamaSchemaError:
+                # 备用profile
+                email_prefix = email_data['email'].split('@')[0]
+                fallback_profile = {
+                    "name": email_prefix.replace('.', ' ').replace('_', ' ').title(),
+                    "email": email_data['email'],
+                    "title": "Professional",
+                    "company": email_data['company_name'],
+                    "industry": "Business",
+                    "background": f"Professional at {email_data['company_name']}"
+                }
+                print(f"      ⚠️  使用备用profile")
+                return fallback_profile
                 
         except Exception as e:
             print(f"      ❌ Profile生成错误: {str(e)}")
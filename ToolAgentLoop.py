@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+多轮工具调用Agent循环
+- 模型一轮请求的多个工具调用并发执行，而不是逐个执行加固定间隔
+- 支持多轮工具调用，受步数与时间预算约束；预算用尽后要求模型基于已有结果作答
+- 工具输出回传模型前按token预算压缩（截断长文本、裁剪列表），避免撑爆num_ctx
+- 完整的工具结果仍原样返回给调用方，只有回传给模型的内容被压缩
+"""
+
+import os
+import json
+import time
+import concurrent.futures
+
+from OllamaClient import OllamaError
+
+
+class ToolAgentLoop:
+    # 与BatchProfiler一致的粗略估算：平均每个token约3个字符
+    CHARS_PER_TOKEN = 3
+
+    # 逐级收紧的压缩档位：(字符串最大长度, 对象列表最多保留项数)
+    SHRINK_LEVELS = [(300, 10), (160, 6), (80, 4), (40, 2)]
+
+    def __init__(self, ollama, model, tools, handlers, num_ctx=4096, max_steps=None, time_budget=None,
+                 max_workers=4, options=None, final_options=None, timeout=60,
+                 response_tokens=512, max_tool_tokens=800):
+        if max_steps is None:
+            max_steps = int(os.environ.get('OLLAMA_TOOL_MAX_STEPS', '4'))
+        if time_budget is None:
+            time_budget = float(os.environ.get('OLLAMA_TOOL_TIME_BUDGET', '180'))
+
+        self.ollama = ollama
+        self.model = model
+        self.tools = tools
+        self.handlers = handlers  # 工具名 -> 可调用对象
+        self.num_ctx = num_ctx
+        self.max_steps = max(1, max_steps)
+        self.time_budget = time_budget
+        self.max_workers = max_workers
+        self.options = {'temperature': 0.7, 'num_ctx': num_ctx, **(options or {})}
+        self.final_options = {'num_ctx': num_ctx, **(final_options or self.options)}
+        self.timeout = timeout
+        self.response_tokens = response_tokens
+        self.max_tool_tokens = max_tool_tokens
+
+    def estimate_tokens(self, value):
+        text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+        return len(text) // self.CHARS_PER_TOKEN + 1
+
+    def run(self, prompt):
+        """运行Agent循环，返回 {'success', 'response', 'tool_calls', 'tool_results', 'agent_stats'}"""
+        started_at = time.time()
+        deadline_at = started_at + self.time_budget
+        messages = [{'role': 'user', 'content': prompt}]
+        all_calls, all_results = [], []
+        stats = {'steps': 0, 'tool_rounds': 0, 'tool_seconds': 0.0,
+                 'truncated_results': 0, 'tool_chars_raw': 0, 'tool_chars_sent': 0, 'stop_reason': None}
+
+        def finish(response, stop_reason):
+            stats['stop_reason'] = stop_reason
+            stats['tool_seconds'] = round(stats['tool_seconds'], 2)
+            stats['total_seconds'] = round(time.time() - started_at, 2)
+            return {'success': True, 'response': response, 'tool_calls': all_calls,
+                    'tool_results': all_results, 'agent_stats': stats}
+
+        for step in range(self.max_steps):
+            remaining = deadline_at - time.time()
+            if remaining <= 0:
+                break
+
+            stats['steps'] += 1
+            message = self.ollama.chat(self.model, messages, tools=self.tools, options=self.options,
+                                       timeout=min(self.timeout, remaining))
+            if not message:
+                if step == 0:
+                    return {'success': False, 'error': 'Ollama returned an empty message'}
+                break
+
+            tool_calls = message.get('tool_calls') or []
+            if not tool_calls:
+                return finish(message.get('content', ''), 'answer')
+
+            messages.append(message)
+            print(f"   🛠️  第{step + 1}轮: LLM请求调用{len(tool_calls)}个工具（并发执行）")
+            round_results = self.execute_tool_calls(tool_calls, len(all_calls), deadline_at, stats)
+            all_calls.extend(tool_calls)
+            all_results.extend(round_results)
+            stats['tool_rounds'] += 1
+
+            budget = self.tool_budget(messages, len(round_results))
+            for tool_result in round_results:
+                content = self.compact_result(tool_result['result'], budget, stats)
+                messages.append({'role': 'tool', 'content': content, 'tool_call_id': tool_result['tool_call_id']})
+
+        # 步数或时间预算用尽：不再提供工具，要求模型基于已有结果作答
+        stop_reason = 'time_budget' if time.time() >= deadline_at else 'max_steps'
+        if not all_results:
+            return finish('', stop_reason)
+
+        print(f"   🧠 工具预算用尽({stop_reason})，发送工具结果给LLM进行最终分析...")
+        stats['steps'] += 1
+        try:
+            final_message = self.ollama.chat(self.model, messages, options=self.final_options, timeout=self.timeout)
+        except OllamaError as e:
+            print(f"   ⚠️  最终分析失败，仅返回工具结果: {e}")
+            final_message = {}
+        return finish(final_message.get('content', ''), stop_reason)
+
+    def execute_tool_calls(self, tool_calls, offset, deadline_at, stats):
+        """并发执行一轮工具调用，返回与tool_calls顺序一致的结果"""
+        started_at = time.time()
+        results = [None] * len(tool_calls)
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(tool_calls)))
+        futures = {}
+        for i, tool_call in enumerate(tool_calls):
+            function = tool_call.get('function', {})
+            print(f"      🔧 工具 {offset + i + 1}: {function.get('name')}")
+            futures[executor.submit(self.call_tool, function)] = i
+
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=max(0.0, deadline_at - time.time())):
+                results[futures[future]] = future.result()
+        except concurrent.futures.TimeoutError:
+            print(f"      ⏱️  部分工具超出时间预算，不再等待")
+        finally:
+            # 超时的工具不阻塞本轮（仍在执行的线程自然结束）
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        for i, tool_call in enumerate(tool_calls):
+            results[i] = {
+                'tool_call_id': tool_call.get('id', f'call_{offset + i}'),
+                'function_name': tool_call.get('function', {}).get('name'),
+                'result': results[i] or {'success': False, 'error': 'Tool call exceeded the time budget'}
+            }
+
+        stats['tool_seconds'] += time.time() - started_at
+        return results
+
+    def call_tool(self, function):
+        """执行单个工具调用，异常转换为错误结果"""
+        name = function.get('name')
+        arguments = function.get('arguments') or {}
+        handler = self.handlers.get(name)
+        if not handler:
+            return {'success': False, 'error': f'Unknown function: {name}'}
+        try:
+            if isinstance(arguments, str):  # 部分模型以JSON字符串返回参数
+                arguments = json.loads(arguments)
+            return handler(**arguments)
+        except Exception as e:
+            return {'success': False, 'error': f'{type(e).__name__}: {e}'}
+
+    def tool_budget(self, messages, count):
+        """本轮每个工具结果可用的token数：上下文剩余空间扣除回答预留，平均分配"""
+        used = self.estimate_tokens(messages) + self.estimate_tokens(self.tools)
+        available = self.num_ctx - used - self.response_tokens
+        return max(64, min(self.max_tool_tokens, available // max(1, count)))
+
+    def compact_result(self, result, max_tokens, stats):
+        """把工具结果压缩为不超过max_tokens的紧凑JSON"""
+        max_chars = max_tokens * self.CHARS_PER_TOKEN
+        text = json.dumps(result, ensure_ascii=False, separators=(',', ':'))
+        stats['tool_chars_raw'] += len(text)
+
+        if len(text) > max_chars:
+            stats['truncated_results'] += 1
+            for string_limit, list_limit in self.SHRINK_LEVELS:
+                text = json.dumps(self.shrink(result, string_limit, list_limit),
+                                  ensure_ascii=False, separators=(',', ':'))
+                if len(text) <= max_chars:
+                    break
+            else:
+                text = text[:max_chars] + '…(truncated)'
+
+        stats['tool_chars_sent'] += len(text)
+        return text
+
+    def shrink(self, value, string_limit, list_limit):
+        """截断长字符串、裁剪对象列表；邮箱等短字符串列表保留更多项"""
+        if isinstance(value, str):
+            return value if len(value) <= string_limit else value[:string_limit] + '…'
+        if isinstance(value, dict):
+            return {key: self.shrink(item, string_limit, list_limit) for key, item in value.items()}
+        if isinstance(value, list):
+            has_containers = any(isinstance(item, (dict, list)) for item in value)
+            limit = list_limit if has_containers else list_limit * 5
+            shrunk = [self.shrink(item, string_limit, list_limit) for item in value[:limit]]
+            if len(value) > limit:
+                shrunk.append(f'…{len(value) - limit} more')
+            return shrunk
+        return value
@@ -0,0 +1,22 @@
+#!/usr/bin/env python3
+"""
+URL工具
+- canonical_url: 规范化URL用于去重（忽略协议、www、末尾斜杠、片段和跟踪参数，查询参数排序）
+  搜索结果合并（HedgedSearch）和增量搜索的URL水位（IncrementalSearchState）共用同一规则
+"""
+
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+TRACKING_PARAMS = ('utm_', 'gclid', 'fbclid', 'msclkid', 'ref', 'ref_src', 'mc_cid', 'mc_eid')
+
+
+def canonical_url(url):
+    """规范化URL用于去重"""
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = sorted((key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+                   if not key.lower().startswith(TRACKING_PARAMS))
+    path = parsed.path.rstrip('/') or '/'
+    return f"{host}{path}" + (f"?{urlencode(query)}" if query else '')
@@ -25,11 +25,34 @@ from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import hashlib
 import base64
+from OllamaClient import get_ollama_client, OllamaSchemaError
+from JsonSchema import contact_profile_schema
 
 class UnblockableGoogleMimicEngine:
+    # Fixed profile instructions, identical for every contact (shared KV prefix)
+    PROFILE_SYSTEM_PROMPT = """Generate a professional user profile for the email contact given by the user.
+
+Create a realistic profile with:
+- Full name (infer from email if possible)
+- Job title/role
+- Company description
+- Industry
+- Professional background
+
+Format as JSON, copying the given email and company:
+{
+  "name": "Full Name",
+  "email": "the given email",
+  "title": "Job Title",
+  "company": "the given company",
+  "industry": "Industry Name",
+  "background": "Brief professional background"
+}"""
+
     def __init__(self):
         self.scrapingdog_api_key = os.getenv('SCRAPINGDOG_API_KEY', '689e1eadbec7a9c318cc34e9')
-        self.ollama_url = 'http://localhost:11434'
+        self.ollama_url = os.environ.get('OLLAMA_URL', 'http://localhost:11434')
+        self.ollama = get_ollama_client(self.ollama_url)
         
         # Advanced anti-detection configuration (2024 techniques)
         self.sessions_pool = []
@@ -288,15 +311,11 @@ Target: {target_type}
 
 Return ONLY the search query, nothing else:"""
 
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': 'qwen2.5:0.5b',
-                'prompt': prompt,
-                'stream': False,
-                'options': {'temperature': 0.7, 'num_ctx': 512}
-            }, timeout=10)
+            response_text = self.ollama.generate('qwen2.5:0.5b', prompt, options={'temperature': 0.7, 'num_ctx': 512}, timeout=10,
+                                                 priority='interactive')
             
-            if response.status_code == 200:
-                query = response.json()['response'].strip().strip('"').strip("'")
+            if response_text:
+                query = response_text.strip('"').strip("'")
                 print(f"🧠 Ollama generated human-like query: '{query}'")
                 return query
             else:
@@ -679,68 +698,37 @@ Return ONLY the search query, nothing else:"""
         try:
             print(f"   🧠 Generating profile for {email_data['email']}...")
             
-            prompt = f"""Generate a professional user profile for this email contact:
-
-Email: {email_data['email']}
+            # Only the per-contact data is sent as the prompt; the fixed instructions live in the
+            # system prompt so Ollama can reuse their evaluated KV prefix across contacts
+            prompt = f"""Email: {email_data['email']}
 Company: {email_data['company_name']}
 Company URL: {email_data['company_url']}
 Context: {email_data['snippet'][:200]}...
 
-Create a realistic profile with:
-- Full name (infer from email if possible)
-- Job title/role
-- Company description
-- Industry
-- Professional background
-
-Format as JSON:
-{{
-  "name": "Full Name",
-  "email": "{email_data['email']}",
-  "title": "Job Title", 
-  "company": "{email_data['company_name']}",
-  "industry": "Industry Name",
-  "background": "Brief professional background"
-}}
-
 Return ONLY the JSON:"""
 
-            response = requests.post(f"{self.ollama_url}/api/generate", json={
-                'model': 'llama3.2',
-                'prompt': prompt,
-                'stream': False,
-                'options': {'temperature': 0.3, 'num_ctx': 1024}
-            }, timeout=15)
-            
-            if response.status_code == 200:
-                profile_text = response.json()['response'].strip()
-                
-                try:
-                    # Extract JSON
-                    json_start = profile_text.find('{')
-                    json_end = profile_text.rfind('}') + 1
-                    if json_start != -1 and json_end > json_start:
-                        profile_json = json.loads(profile_text[json_start:json_end])
-                        print(f"      ✅ Profile generated for {profile_json.get('name', 'Unknown')}")
-                        return profile_json
-                    else:
-                        raise ValueError("No JSON found")
-                        
-                except (json.JSONDecodeError, ValueError):
-                    # Fallback profile
-                    email_prefix = email_data['email'].split('@')[0]
-                    fallback_profile = {
-                        "name": email_prefix.replace('.', ' ').replace('_', ' ').title(),
-                        "email": email_data['email'],
-                        "title": "Professional",
-                        "company": email_data['company_name'],
-                        "industry": "Business",
-                        "background": f"Professional at {email_data['company_name']}"
-                    }
-                    print(f"      ⚠️  Using fallback profile")
-                    return fallback_profile
-            else:
-                return None
+            # Schema-constrained output; invalid JSON is repaired once before falling back
+            try:
+                profile_json = self.ollama.generate_json(
+                    'llama3.2', prompt, contact_profile_schema(email_data['email']),
+                    system=self.PROFILE_SYSTEM_PROMPT,
+                    options={'temperature': 0.3, 'num_ctx': 1024}, timeout=15, priority='bulk'
+                )
+                print(f"      ✅ Profile generated for {profile_json['name']}")
+                return profile_json
+            except OllamaSchemaError:
+                # Fallback profile
+                email_prefix = email_data['email'].split('@')[0]
+                fallback_profile = {
+                    "name": email_prefix.replace('.', ' ').replace('_', ' ').title(),
+                    "email": email_data['email'],
+                    "title": "Professional",
+                    "company": email_data['company_name'],
+                    "industry": "Business",
+                    "background": f"Professional at {email_data['company_name']}"
+                }
+                print(f"      ⚠️  Using fallback profile")
+                return fallback_profile
                 
         except Exception as e:
             print(f"      ❌ Profile generation error: {str(e)}")
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+邮箱发现产出预测器
+- 根据最近几轮的新邮箱产出、重复率和缓存跳过率估算剩余可发现的新邮箱数
+- 按策略族跟踪边际产出（每次请求带来的新邮箱数）
+- 边际产出低于阈值时建议切换策略族或结束搜索，替代固定的最大轮数
+"""
+
+import os
+from collections import deque
+
+
+class YieldForecaster:
+    def __init__(self, min_yield_per_request=None, window=5, min_rounds=3, max_idle_rounds=3):
+        # 边际产出阈值：每次请求（搜索+爬取）平均带来的新邮箱数
+        if min_yield_per_request is None:
+            min_yield_per_request = float(os.environ.get('DISCOVERY_MIN_YIELD_PER_REQUEST', '0.02'))
+        self.min_yield_per_request = min_yield_per_request
+        self.window = window
+        self.min_rounds = min_rounds
+        self.max_idle_rounds = max_idle_rounds  # 连续多少轮没有发出任何请求视为搜索后端不可用
+
+        self.history = deque(maxlen=window)
+        self.family_history = {}
+        self.exhausted_families = set()
+        self.rounds_recorded = 0
+        self.idle_rounds = 0
+        self.totals = {
+            'new_emails': 0,
+            'requests': 0,
+            'raw_found': 0,
+            'cached_skipped': 0,
+            'duplicates': 0
+        }
+
+    def record_round(self, family, new_emails, requests_made, raw_found, cached_skipped):
+        """记录一轮搜索的产出"""
+        duplicates = max(0, raw_found - new_emails - cached_skipped)
+        entry = {
+            'family': family,
+            'new_emails': new_emails,
+            'requests': requests_made,
+            'raw_found': raw_found,
+            'cached_skipped': cached_skipped,
+            'duplicates': duplicates
+        }
+
+        self.rounds_recorded += 1
+        self.idle_rounds = self.idle_rounds + 1 if requests_made == 0 else 0
+
+        # 没有发出请求的轮次不包含产出信息，不计入预测窗口
+        if requests_made > 0:
+            self.history.append(entry)
+            self.family_history.setdefault(family, deque(maxlen=self.window)).append(entry)
+
+        for key in self.totals:
+            self.totals[key] += entry[key]
+
+    def marginal_yield(self, entries=None):
+        """计算边际产出：窗口内每次请求带来的新邮箱数"""
+        entries = self.history if entries is None else entries
+        requests_made = sum(e['requests'] for e in entries)
+        if requests_made == 0:
+            return None
+        return sum(e['new_emails'] for e in entries) / requests_made
+
+    def novelty_rate(self, entries=None):
+        """窗口内新邮箱占全部发现邮箱的比例（1 - 重复率 - 缓存跳过率）"""
+        entries = self.history if entries is None else entries
+        raw_found = sum(e['raw_found'] for e in entries)
+        if raw_found == 0:
+            return 0.0
+        return sum(e['new_emails'] for e in entries) / raw_found
+
+    def estimate_remaining(self):
+        """估算剩余可发现的新邮箱数
+
+        假设每轮新邮箱数按几何级数衰减：衰减率由窗口前后两半的新颖率之比得到，
+        剩余量 = 下一轮预计新邮箱数 / (1 - 衰减率)。
+        """
+        if len(self.history) < 2:
+            return None
+
+        entries = list(self.history)
+        half = len(entries) // 2
+        older, recent = entries[:half], entries[half:]
+
+        older_novelty = self.novelty_rate(older)
+        recent_novelty = self.novelty_rate(recent)
+        if older_novelty > 0:
+            decay = min(recent_novelty / older_novelty, 0.95)
+        else:
+            decay = 0.95 if recent_novelty > 0 else 0.0
+
+        raw_per_round = sum(e['raw_found'] for e in recent) / len(recent)
+        next_round = raw_per_round * recent_novelty * decay
+        return next_round / (1 - decay)
+
+    def decide(self, family):
+        """根据边际产出决定下一步：continue / switch / stop"""
+        if self.idle_rounds >= self.max_idle_rounds:
+            return 'stop', f'连续{self.idle_rounds}轮没有成功请求，搜索后端可能不可用'
+
+        family_entries = self.family_history.get(family)
+        if family_entries:
+            family_yield = self.marginal_yield(family_entries)
+            if family_yield is not None and family_yield < self.min_yield_per_request:
+                self.exhausted_families.add(family)
+
+        if self.rounds_recorded < self.min_rounds:
+            return 'continue', '预热轮次，收集产出数据'
+
+        global_yield = self.marginal_yield()
+        remaining = self.estimate_remaining()
+        if (len(self.history) >= self.window and global_yield is not None
+                and global_yield < self.min_yield_per_request
+                and remaining is not None and remaining < 1):
+            return 'stop', f'边际产出{global_yield:.3f}/请求低于阈值，预计剩余新邮箱{remaining:.1f}个'
+
+        if family in self.exhausted_families:
+            return 'switch', f'策略族{family}边际产出低于阈值{self.min_yield_per_request}'
+
+        return 'continue', '产出正常'
+
+    def to_state(self):
+        """导出内部状态，用于任务检查点"""
+        return {
+            'history': list(self.history),
+            'family_history': {family: list(entries) for family, entries in self.family_history.items()},
+            'exhausted_families': sorted(self.exhausted_families),
+            'rounds_recorded': self.rounds_recorded,
+            'idle_rounds': self.idle_rounds,
+            'totals': dict(self.totals)
+        }
+
+    def load_state(self, state):
+        """从检查点恢复内部状态"""
+        self.history = deque(state.get('history', []), maxlen=self.window)
+        self.family_history = {
+            family: deque(entries, maxlen=self.window)
+            for family, entries in state.get('family_history', {}).items()
+        }
+        self.exhausted_families = set(state.get('exhausted_families', []))
+        self.rounds_recorded = state.get('rounds_recorded', 0)
+        self.idle_rounds = state.get('idle_rounds', 0)
+        self.totals.update(state.get('totals', {}))
+
+    def summary(self):
+        """返回可JSON序列化的预测统计"""
+        remaining = self.estimate_remaining()
+        marginal = self.marginal_yield()
+        raw_found = self.totals['raw_found']
+        return {
+            'rounds_recorded': self.rounds_recorded,
+            'min_yield_per_request': self.min_yield_per_request,
+            'marginal_yield_per_request': round(marginal, 4) if marginal is not None else None,
+            'estimated_remaining_new_emails': round(remaining, 1) if remaining is not None else None,
+            'duplicate_rate': round(self.totals['duplicates'] / raw_found, 3) if raw_found else 0.0,
+            'cached_skip_rate': round(self.totals['cached_skipped'] / raw_found, 3) if raw_found else 0.0,
+            'exhausted_families': sorted(self.exhausted_families),
+            'totals': dict(self.totals)
+        }
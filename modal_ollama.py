@@ -1,196 +1,312 @@
 """
 Ollama deployment on Modal.com
 This deploys Ollama as a serverless endpoint compatible with Ollama's API format
+
+Requests are proxied in-process to the local Ollama server through a shared async
+HTTP client; with "stream": true the NDJSON chunks are relayed as Ollama produces them.
+Each model is pulled at most once per container, and startup waits on a readiness
+probe instead of a fixed sleep. /api/batch_generate runs many small prompts in one
+HTTP request, concurrently up to the server's parallel slots. create_app() builds the
+FastAPI app for any Ollama URL, so the proxy can be run against a local fake Ollama in tests.
 """
 
-import modal
 from typing import Dict, Optional
 from fastapi import Request
-from fastapi.responses import JSONResponse
-
-# Create Modal app
-app = modal.App("ollama-endpoint")
-
-# Create a custom image with Ollama installed
-ollama_image = (
-    modal.Image.debian_slim(python_version="3.11")
-    .pip_install("fastapi", "pydantic")
-    .apt_install("curl", "ca-certificates")
-    .run_commands(
-        # Install Ollama
-        "curl -fsSL https://ollama.com/install.sh | sh"
-    )
-)
-
-# Main generate endpoint - matches Ollama's /api/generate format
-@app.function(
-    image=ollama_image,
-    gpu="T4",  # Use T4 GPU (cheapest option on Modal)
-    timeout=600,  # 10 minute timeout
-    # ❌ REMOVED min_containers=1 - was costing $432/month!
-    # Only pay when actually processing requests
-    min_containers=0,  # Scale to zero when idle = MASSIVE savings!
-    scaledown_window=60,  # Scale down after 60 seconds (vs 1800)
-)
-@modal.asgi_app()
-def serve():
+from fastapi.responses import JSONResponse, StreamingResponse
+
+try:
+    import modal
+except ImportError:  # Modal is only needed to deploy; create_app works without it
+    modal = None
+
+OLLAMA_URL = "http://localhost:11434"
+DEFAULT_MODEL = "qwen2.5:0.5b"
+NUM_PARALLEL = 4  # Ollama parallel slots (OLLAMA_NUM_PARALLEL) - T4 fits 4 small-model requests
+
+
+def normalize_model(model: str) -> str:
+    """Ollama reports untagged models as '<name>:latest'"""
+    return model if ":" in model else f"{model}:latest"
+
+
+class OllamaBackend:
+    """
+    Async passthrough to a local Ollama server
+    - one pooled httpx.AsyncClient for all requests (no curl / subprocess per call)
+    - model availability cache: /api/tags once, /api/pull only for missing models
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, request_timeout: float = 600, pull_timeout: float = 1800,
+                 transport=None):
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(request_timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            transport=transport,  # e.g. httpx.MockTransport for a fake Ollama in tests
+        )
+        self.pull_timeout = pull_timeout
+        self.available_models = set()
+        self.pull_locks: Dict[str, "asyncio.Lock"] = {}
+        self.ready = False
+
+    async def wait_until_ready(self, timeout: float = 60, interval: float = 0.25) -> bool:
+        """Readiness probe: poll /api/version until the server answers (replaces time.sleep)"""
+        import asyncio
+        import time
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                response = await self.client.get("/api/version", timeout=2.0)
+                if response.status_code == 200:
+                    self.ready = True
+                    await self.refresh_models()
+                    return True
+            except Exception:
+                pass
+            await asyncio.sleep(interval)
+        return False
+
+    async def refresh_models(self):
+        """Load the set of locally available models from /api/tags"""
+        response = await self.client.get("/api/tags")
+        response.raise_for_status()
+        for entry in response.json().get("models", []):
+            self.available_models.add(normalize_model(entry.get("name") or entry.get("model", "")))
+
+    async def ensure_model(self, model: str):
+        """Pull a model once per container; concurrent requests for the same model share one pull"""
+        import asyncio
+
+        name = normalize_model(model)
+        if name in self.available_models:
+            return
+
+        lock = self.pull_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            if name in self.available_models:
+                return
+            await self.refresh_models()
+            if name in self.available_models:
+                return
+
+            print(f"Pulling model {model}...")
+            response = await self.client.post(
+                "/api/pull", json={"model": model, "stream": False}, timeout=self.pull_timeout
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Model pull failed ({response.status_code}): {response.text[:200]}")
+            self.available_models.add(name)
+            print(f"✅ Model {model} available")
+
+    async def forward(self, path: str, body: dict) -> JSONResponse:
+        """Forward a non-streaming request to Ollama and relay its JSON response"""
+        response = await self.client.post(path, json=body)
+        return JSONResponse(status_code=response.status_code, content=response.json())
+
+    async def stream(self, path: str, body: dict):
+        """Forward a streaming request and relay Ollama's NDJSON chunks as they arrive"""
+        request = self.client.build_request("POST", path, json=body)
+        response = await self.client.send(request, stream=True)
+        if response.status_code != 200:
+            content = await response.aread()
+            await response.aclose()
+            return JSONResponse(status_code=response.status_code,
+                                content={"error": content.decode("utf-8", "replace")[:500]})
+
+        async def relay():
+            try:
+                async for chunk in response.aiter_bytes():
+                    yield chunk
+            finally:
+                await response.aclose()
+
+        return StreamingResponse(relay(), media_type="application/x-ndjson")
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_app(ollama_url: str = OLLAMA_URL, preload_models=(DEFAULT_MODEL,), ready_timeout: float = 60,
+               num_parallel: int = NUM_PARALLEL, transport=None):
     """
-    ASGI app that provides Ollama-compatible /api/generate endpoint
+    Build the Ollama-compatible FastAPI app in front of the Ollama server at ollama_url
+    (transport is passed to the httpx client, so tests can stand in a fake Ollama)
     """
-    from fastapi import FastAPI, Request
-    from fastapi.responses import JSONResponse
-    import subprocess
+    import asyncio
     import json
-    import time
-    import os
+    from fastapi import FastAPI
 
     web_app = FastAPI()
+    backend = OllamaBackend(ollama_url, transport=transport)
+    web_app.state.backend = backend
 
-    # Start Ollama server when container starts
-    print("Starting Ollama server...")
-    ollama_proc = subprocess.Popen(
-        ["ollama", "serve"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        env={**os.environ, "OLLAMA_HOST": "0.0.0.0:11434"}
-    )
-    time.sleep(5)  # Give Ollama time to start
-    print("Ollama server started")
-
-    # Pre-load the model to prevent cold starts
-    print("Pre-loading qwen2.5:0.5b model...")
-    try:
-        preload = subprocess.run(
-            ["ollama", "pull", "qwen2.5:0.5b"],
-            capture_output=True,
-            text=True
-        )
-        if preload.returncode == 0:
-            print("✅ Model pre-loaded successfully")
-        else:
-            print(f"⚠️ Model pre-load warning: {preload.stderr}")
-    except Exception as e:
-        print(f"⚠️ Model pre-load failed: {e}")
+    @web_app.on_event("startup")
+    async def startup():
+        print("Waiting for Ollama server...")
+        if not await backend.wait_until_ready(ready_timeout):
+            print(f"⚠️ Ollama server not ready after {ready_timeout}s")
+            return
+        print("Ollama server started")
 
-    @web_app.post("/api/generate")
-    async def generate(request: Request):
-        """
-        Ollama-compatible /api/generate endpoint
-        Request format: {"model": "qwen2.5:0.5b", "prompt": "...", "stream": false}
-        Response format: {"model": "...", "response": "...", "done": true}
-        """
+        # Pre-load the models to prevent cold starts
+        for model in preload_models:
+            try:
+                await backend.ensure_model(model)
+                print(f"✅ Model {model} pre-loaded successfully")
+            except Exception as e:
+                print(f"⚠️ Model pre-load failed: {e}")
+
+    @web_app.on_event("shutdown")
+    async def shutdown():
+        await backend.close()
+
+    async def passthrough(request: Request, path: str):
         try:
             body = await request.json()
-            model = body.get("model", "qwen2.5:0.5b")
-            prompt = body.get("prompt", "")
-            stream = body.get("stream", False)
-
-            print(f"Received request - model: {model}, prompt length: {len(prompt)}")
-
-            # Pull model if needed (only first time)
-            print(f"Ensuring model {model} is available...")
-            pull_result = subprocess.run(
-                ["ollama", "pull", model],
-                capture_output=True,
-                text=True
-            )
+            model = body.setdefault("model", DEFAULT_MODEL)
+            # Unlike Ollama itself this endpoint has always defaulted to non-streaming
+            body["stream"] = bool(body.get("stream", False))
 
-            if pull_result.returncode != 0:
-                print(f"Model pull warning: {pull_result.stderr}")
-
-            # Generate response using Ollama API
-            print("Calling Ollama to generate response...")
-            result = subprocess.run(
-                ["curl", "-X", "POST", "http://localhost:11434/api/generate",
-                 "-H", "Content-Type: application/json",
-                 "-d", json.dumps({
-                     "model": model,
-                     "prompt": prompt,
-                     "stream": False,
-                     "options": body.get("options", {})
-                 })],
-                capture_output=True,
-                text=True
-            )
-
-            if result.returncode == 0:
-                response_data = json.loads(result.stdout)
-                print(f"Generated response length: {len(response_data.get('response', ''))}")
-                return JSONResponse(content=response_data)
-            else:
-                error_msg = f"Ollama generation failed: {result.stderr}"
-                print(error_msg)
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": error_msg}
-                )
+            await backend.ensure_model(model)
+            if body["stream"]:
+                return await backend.stream(path, body)
+            return await backend.forward(path, body)
 
         except Exception as e:
-            error_msg = f"Error in generate endpoint: {str(e)}"
+            error_msg = f"Error in {path} endpoint: {str(e)}"
             print(error_msg)
             return JSONResponse(
                 status_code=500,
                 content={"error": error_msg}
             )
 
+    @web_app.post("/api/generate")
+    async def generate(request: Request):
+        """
+        Ollama-compatible /api/generate endpoint
+        Request format: {"model": "qwen2.5:0.5b", "prompt": "...", "stream": false}
+        Response format: {"model": "...", "response": "...", "done": true}
+        With "stream": true the response is NDJSON, one chunk per line
+        """
+        return await passthrough(request, "/api/generate")
+
     @web_app.post("/api/chat")
     async def chat(request: Request):
         """
         Ollama-compatible /api/chat endpoint
         """
+        return await passthrough(request, "/api/chat")
+
+    @web_app.post("/api/batch_generate")
+    async def batch_generate(request: Request):
+        """
+        Run several independent /api/generate requests in one HTTP call
+        Request format: {"requests": [{"model": "...", "prompt": "...", "options": {...}}, ...]}
+        Response: NDJSON, one line per item in completion order: {"index": 0, "response": "...", ...}
+        Failed items carry {"index": i, "error": "..."}; items run concurrently up to num_parallel
+        """
         try:
             body = await request.json()
-            model = body.get("model", "qwen2.5:0.5b")
-            messages = body.get("messages", [])
-
-            print(f"Chat request - model: {model}, messages: {len(messages)}")
+            items = body.get("requests", [])
+            for item in items:
+                item.setdefault("model", DEFAULT_MODEL)
+                item["stream"] = False
+            for model in {item["model"] for item in items}:
+                await backend.ensure_model(model)
+        except Exception as e:
+            error_msg = f"Error in /api/batch_generate endpoint: {str(e)}"
+            print(error_msg)
+            return JSONResponse(status_code=500, content={"error": error_msg})
 
-            # Pull model if needed
-            subprocess.run(
-                ["ollama", "pull", model],
-                capture_output=True
-            )
+        print(f"Batch request - {len(items)} items, {num_parallel} parallel slots")
+        slots = asyncio.Semaphore(num_parallel)
 
-            # Call Ollama chat API
-            result = subprocess.run(
-                ["curl", "-X", "POST", "http://localhost:11434/api/chat",
-                 "-H", "Content-Type: application/json",
-                 "-d", json.dumps({
-                     "model": model,
-                     "messages": messages,
-                     "stream": False,
-                     "options": body.get("options", {})
-                 })],
-                capture_output=True,
-                text=True
-            )
+        async def run(index, item):
+            async with slots:
+                try:
+                    response = await backend.client.post("/api/generate", json=item)
+                    if response.status_code == 200:
+                        return {"index": index, **response.json()}
+                    return {"index": index, "error": f"HTTP {response.status_code}: {response.text[:200]}"}
+                except Exception as e:
+                    return {"index": index, "error": str(e)}
 
-            if result.returncode == 0:
-                return JSONResponse(content=json.loads(result.stdout))
-            else:
-                return JSONResponse(
-                    status_code=500,
-                    content={"error": f"Chat failed: {result.stderr}"}
-                )
+        async def results():
+            tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(items)]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield (json.dumps(await finished) + "\n").encode("utf-8")
+            finally:
+                for task in tasks:
+                    task.cancel()
 
-        except Exception as e:
-            return JSONResponse(
-                status_code=500,
-                content={"error": str(e)}
-            )
+        return StreamingResponse(results(), media_type="application/x-ndjson")
 
     @web_app.get("/health")
     async def health():
         """Health check endpoint"""
-        return {"status": "ok", "service": "ollama-modal"}
+        return {
+            "status": "ok" if backend.ready else "starting",
+            "service": "ollama-modal",
+            "models": sorted(backend.available_models),
+        }
 
     @web_app.get("/")
     async def root():
         """Root endpoint with API info"""
         return {
             "service": "Ollama on Modal",
-            "endpoints": ["/api/generate", "/api/chat", "/health"],
-            "status": "running"
+            "endpoints": ["/api/generate", "/api/chat", "/api/batch_generate", "/health"],
+            "status": "running" if backend.ready else "starting"
         }
 
     return web_app
+
+
+if modal is not None:
+    # Create Modal app
+    app = modal.App("ollama-endpoint")
+
+    # Create a custom image with Ollama installed
+    ollama_image = (
+        modal.Image.debian_slim(python_version="3.11")
+        .pip_install("fastapi", "pydantic", "httpx")
+        .apt_install("curl", "ca-certificates")
+        .run_commands(
+            # Install Ollama
+            "curl -fsSL https://ollama.com/install.sh | sh"
+        )
+    )
+
+    # Main generate endpoint - matches Ollama's /api/generate format
+    @app.function(
+        image=ollama_image,
+        gpu="T4",  # Use T4 GPU (cheapest option on Modal)
+        timeout=600,  # 10 minute timeout
+        # ❌ REMOVED min_containers=1 - was costing $432/month!
+        # Only pay when actually processing requests
+        min_containers=0,  # Scale to zero when idle = MASSIVE savings!
+        scaledown_window=60,  # Scale down after 60 seconds (vs 1800)
+    )
+    @modal.asgi_app()
+    def serve():
+        """
+        ASGI app that provides Ollama-compatible /api/generate endpoint
+        """
+        import subprocess
+        import os
+
+        # Start Ollama server when container starts; the app's startup hook waits for readiness
+        print("Starting Ollama server...")
+        ollama_proc = subprocess.Popen(
+            ["ollama", "serve"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env={**os.environ, "OLLAMA_HOST": "0.0.0.0:11434", "OLLAMA_NUM_PARALLEL": str(NUM_PARALLEL)}
+        )
+
+        return create_app(OLLAMA_URL, num_parallel=NUM_PARALLEL)
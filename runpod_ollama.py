@@ -5,16 +5,27 @@ Much cheaper than Modal - only pays per-second of actual usage!
 Cost comparison:
 - Modal T4: $0.60/hr with min_containers=1 = $432/month
 - RunPod A6000 (48GB): $0.31/hr, per-second billing = ~$50-100/month
+
+The handler is async: jobs share one persistent httpx client and a model-presence
+cache, and the concurrency modifier lets one GPU worker run several jobs at once,
+up to Ollama's parallel slots (OLLAMA_NUM_PARALLEL).
 """
 
 import runpod
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+import asyncio
 import subprocess
 import json
 import time
 import os
 
+import httpx
+
+OLLAMA_URL = "http://localhost:11434"
+DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:0.5b")
+NUM_PARALLEL = int(os.getenv("OLLAMA_NUM_PARALLEL", "4"))
+# Jobs one worker accepts at a time; defaults to Ollama's parallel slots
+MAX_CONCURRENCY = int(os.getenv("RUNPOD_MAX_CONCURRENCY", str(NUM_PARALLEL)))
+
 # Initialize Ollama when handler starts
 def initialize_ollama():
     """Start Ollama server and pre-load model"""
@@ -25,7 +36,7 @@ def initialize_ollama():
         ["ollama", "serve"],
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        env={**os.environ, "OLLAMA_HOST": "0.0.0.0:11434"}
+        env={**os.environ, "OLLAMA_HOST": "0.0.0.0:11434", "OLLAMA_NUM_PARALLEL": str(NUM_PARALLEL)}
     )
     time.sleep(5)
 
@@ -38,52 +49,129 @@ def initialize_ollama():
     return ollama_proc
 
 
-def handler(event):
+def normalize_model(model: str) -> str:
+    """Ollama reports untagged models as '<name>:latest'"""
+    return model if ":" in model else f"{model}:latest"
+
+
+class OllamaBackend:
+    """
+    Shared state for all jobs on this worker
+    - one pooled httpx.AsyncClient (no subprocess per job)
+    - model availability cache: /api/tags once, /api/pull only for missing models
+    """
+
+    def __init__(self, base_url: str = OLLAMA_URL, request_timeout: float = 300, pull_timeout: float = 1800):
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=httpx.Timeout(request_timeout, connect=5.0),
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+        )
+        self.pull_timeout = pull_timeout
+        self.available_models = None
+        self.pull_locks = {}
+        self.active_jobs = 0
+
+    async def refresh_models(self):
+        """Load the set of locally available models from /api/tags"""
+        response = await self.client.get("/api/tags")
+        response.raise_for_status()
+        self.available_models = {
+            normalize_model(entry.get("name") or entry.get("model", ""))
+            for entry in response.json().get("models", [])
+        }
+
+    async def ensure_model(self, model: str):
+        """Pull a model once per worker; concurrent jobs for the same model share one pull"""
+        name = normalize_model(model)
+        if self.available_models is not None and name in self.available_models:
+            return
+
+        lock = self.pull_locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            await self.refresh_models()
+            if name in self.available_models:
+                return
+
+            print(f"📦 Pulling model: {model}")
+            response = await self.client.post(
+                "/api/pull", json={"model": model, "stream": False}, timeout=self.pull_timeout
+            )
+            if response.status_code != 200:
+                raise RuntimeError(f"Model pull failed: HTTP {response.status_code} {response.text[:200]}")
+            self.available_models.add(name)
+
+
+backend = None
+
+
+def get_backend() -> OllamaBackend:
+    """Create the shared backend lazily, inside RunPod's event loop"""
+    global backend
+    if backend is None:
+        backend = OllamaBackend(OLLAMA_URL)
+    return backend
+
+
+def concurrency_modifier(current_concurrency: int) -> int:
+    """
+    How many jobs this worker may run at once
+    Ollama queues anything beyond its parallel slots, so accepting more only adds latency
+    """
+    return MAX_CONCURRENCY
+
+
+async def handler(event):
     """
-    RunPod serverless handler
+    RunPod serverless handler (async generator, so jobs can stream and run concurrently)
     Receives: {"input": {"model": "qwen2.5:0.5b", "prompt": "...", "stream": false}}
-    Returns: {"model": "...", "response": "...", "done": true}
+    Yields: {"model": "...", "response": "...", "done": true}
+    With "stream": true each Ollama NDJSON chunk is yielded as soon as it arrives
+    (read them from /stream/<job_id>; /run and /runsync return the aggregated list)
     """
+    ollama = get_backend()
+    ollama.active_jobs += 1
     try:
         # Extract request data
         input_data = event.get("input", {})
-        model = input_data.get("model", "qwen2.5:0.5b")
+        model = input_data.get("model", DEFAULT_MODEL)
         prompt = input_data.get("prompt", "")
         options = input_data.get("options", {})
-
-        print(f"📥 Request - model: {model}, prompt length: {len(prompt)}")
-
-        # Ensure model is available
-        subprocess.run(["ollama", "pull", model], capture_output=True)
-
-        # Call Ollama API
-        result = subprocess.run(
-            ["curl", "-s", "-X", "POST", "http://localhost:11434/api/generate",
-             "-H", "Content-Type: application/json",
-             "-d", json.dumps({
-                 "model": model,
-                 "prompt": prompt,
-                 "stream": False,
-                 "options": options
-             })],
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
-
-        if result.returncode == 0:
-            response_data = json.loads(result.stdout)
-            print(f"✅ Generated {len(response_data.get('response', ''))} chars")
-            return response_data
-        else:
-            error_msg = f"Generation failed: {result.stderr}"
-            print(f"❌ {error_msg}")
-            return {"error": error_msg}
+        stream = bool(input_data.get("stream", False))
+
+        print(f"📥 Request - model: {model}, prompt length: {len(prompt)}, stream: {stream}, "
+              f"active jobs: {ollama.active_jobs}/{MAX_CONCURRENCY}")
+
+        # Ensure model is available (cached after the first check)
+        await ollama.ensure_model(model)
+
+        # Call Ollama API, reading the response incrementally
+        payload = {"model": model, "prompt": prompt, "stream": stream, "options": options}
+        async with ollama.client.stream("POST", "/api/generate", json=payload) as response:
+            if response.status_code != 200:
+                content = await response.aread()
+                error_msg = f"Generation failed: HTTP {response.status_code} {content[:200].decode('utf-8', 'replace')}"
+                print(f"❌ {error_msg}")
+                yield {"error": error_msg}
+                return
+
+            if not stream:
+                response_data = json.loads(await response.aread())
+                print(f"✅ Generated {len(response_data.get('response', ''))} chars")
+                yield response_data
+                return
+
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+            print("✅ Stream finished")
 
     except Exception as e:
         error_msg = f"Handler error: {str(e)}"
         print(f"❌ {error_msg}")
-        return {"error": error_msg}
+        yield {"error": error_msg}
+    finally:
+        ollama.active_jobs -= 1
 
 
 if __name__ == "__main__":
@@ -92,4 +180,8 @@ if __name__ == "__main__":
 
     # Start RunPod serverless handler
     print("🎯 Starting RunPod handler...")
-    runpod.serverless.start({"handler": handler})
+    runpod.serverless.start({
+        "handler": handler,
+        "concurrency_modifier": concurrency_modifier,
+        "return_aggregate_stream": True
+    })
@@ -19,66 +19,46 @@ class OllamaSearxNGEmailDiscovery {
 
   /**
    * 使用Ollama + SearxNG发现邮箱并生成用户画像
+   * 模板画像的结果一到就返回；options.onUpdate 接收之后LLM替换模板的更新：
+   *   { type: 'profiles_upgraded', prospects, records, hedged } - LLM画像全部结束（或到达截止时间）
+   *   { type: 'profile_update' | 'strategy_update', index, record } - 单条替换
+   *   { type: 'result', final: true, result, prospects } - 最终结果
    */
-  async discoverEmailsWithProfiles(industry, maxEmails = 5) {
+  async discoverEmailsWithProfiles(industry, maxEmails = 5, options = {}) {
     try {
       console.log(`🔍 开始Ollama + SearxNG邮箱发现: ${industry}`);
 
       // Execute Python Agent for REAL search
       console.log('🚀 Calling Python Agent for REAL prospect search...');
-      const result = await this.executePythonAgent(industry, maxEmails);
+      let firstResult = null;
+      const onEvent = (event) => {
+        if (!options.onUpdate) return;
+        try {
+          if (event.type === 'profiles_upgraded' && firstResult) {
+            options.onUpdate({ ...event, prospects: this.buildProspects({ ...firstResult, user_profiles: event.records }, industry) });
+          } else if (event.type === 'result' && event.result && event.result.success) {
+            options.onUpdate({ ...event, prospects: this.buildProspects(event.result, industry) });
+          } else {
+            options.onUpdate(event);
+          }
+        } catch (e) {
+          console.error('   ⚠️ 处理画像更新失败:', e.message);
+        }
+      };
+      const result = await this.executePythonAgent(industry, maxEmails, onEvent);
+      firstResult = result;
       
       if (result.success) {
         console.log(`✅ 发现完成: ${result.total_emails}个邮箱, ${result.total_profiles}个画像`);
         
-        // 转换为标准格式
-        const prospects = result.email_details.map((emailData, index) => {
-          const profile = result.user_profiles[index] || this.createBasicProfile(emailData.email, industry);
-          
-          return {
-            email: emailData.email,
-            name: this.extractNameFromProfile(profile),
-            company: this.extractCompanyFromProfile(profile, emailData),
-            role: profile.estimated_role || 'Business Professional',
-            source: emailData.source || 'ollama_searxng',
-            sourceUrl: emailData.source_url || '',
-            sourceTitle: emailData.source_title || '',
-            confidence: emailData.confidence || profile.confidence_score || 0.8,
-            method: emailData.method || 'ollama_searxng_integration',
-            
-            // 用户画像数据
-            profile: {
-              estimatedRole: profile.estimated_role,
-              companySize: profile.company_size,
-              decisionLevel: profile.decision_level,
-              communicationStyle: profile.communication_style,
-              painPoints: profile.pain_points || [],
-              bestContactTime: profile.best_contact_time,
-              emailStrategy: profile.email_strategy,
-              personalizationTips: profile.personalization_tips || [],
-              confidenceScore: profile.confidence_score,
-              generatedBy: profile.profile_generated_by || 'ollama_ai',
-              generatedAt: profile.generated_at || new Date().toISOString()
-            },
-            
-            // 搜索元数据
-            searchMetadata: {
-              industry: industry,
-              searchStrategies: result.search_strategies,
-              discoveryMethod: result.discovery_method,
-              executionTime: result.execution_time,
-              timestamp: result.timestamp
-            }
-          };
-        });
-        
         return {
           success: true,
-          prospects: prospects,
+          prospects: this.buildProspects(result, industry),
           totalFound: result.total_emails,
           totalProfiles: result.total_profiles,
           searchStrategies: result.search_strategies,
           executionTime: result.execution_time,
+          profilesPending: Boolean(result.profiles_pending),
           method: 'ollama_searxng_integration'
         };
       } else {
@@ -100,10 +80,57 @@ class OllamaSearxNGEmailDiscovery {
     }
   }
 
+  /**
+   * 把Python Agent结果转换为标准prospect格式
+   */
+  buildProspects(result, industry) {
+    return result.email_details.map((emailData, index) => {
+      const profile = result.user_profiles[index] || this.createBasicProfile(emailData.email, industry);
+      
+      return {
+        email: emailData.email,
+        name: this.extractNameFromProfile(profile),
+        company: this.extractCompanyFromProfile(profile, emailData),
+        role: profile.estimated_role || 'Business Professional',
+        source: emailData.source || 'ollama_searxng',
+        sourceUrl: emailData.source_url || '',
+        sourceTitle: emailData.source_title || '',
+        confidence: emailData.confidence || profile.confidence_score || 0.8,
+        method: emailData.method || 'ollama_searxng_integration',
+        
+        // 用户画像数据
+        profile: {
+          estimatedRole: profile.estimated_role,
+          companySize: profile.company_size,
+          decisionLevel: profile.decision_level,
+          communicationStyle: profile.communication_style,
+          painPoints: profile.pain_points || [],
+          bestContactTime: profile.best_contact_time,
+          emailStrategy: profile.email_strategy,
+          personalizationTips: profile.personalization_tips || [],
+          confidenceScore: profile.confidence_score,
+          generatedBy: profile.profile_generated_by || 'ollama_ai',
+          generatedAt: profile.generated_at || new Date().toISOString()
+        },
+        
+        // 搜索元数据
+        searchMetadata: {
+          industry: industry,
+          searchStrategies: result.search_strategies,
+          discoveryMethod: result.discovery_method,
+          executionTime: result.execution_time,
+          timestamp: result.timestamp
+        }
+      };
+    });
+  }
+
   /**
    * 执行Python Agent脚本
+   * API模式下stdout每行是一个带type字段的JSON事件（进度日志在stderr）：
+   * 第一个 type=result 事件（模板画像）到达时即返回结果，之后的事件交给onEvent
    */
-  async executePythonAgent(industry, maxEmails) {
+  async executePythonAgent(industry, maxEmails, onEvent = null) {
     return new Promise((resolve, reject) => {
       console.log(`   🐍 执行Python Agent: ${industry}, ${maxEmails}个邮箱`);
       
@@ -111,14 +138,51 @@ class OllamaSearxNGEmailDiscovery {
         this.pythonScriptPath,
         industry,
         maxEmails.toString(),
-        'api'  // API模式：只输出JSON，无其他文本
+        'api'  // API模式：stdout只输出NDJSON事件
       ]);
 
       let output = '';
+      let buffer = '';
       let error = '';
+      let resolved = false;
+
+      const finish = (result) => {
+        if (!resolved) {
+          resolved = true;
+          resolve(result);
+        }
+      };
+
+      const handleLine = (line) => {
+        const trimmed = line.trim();
+        if (!trimmed) return;
+        let event;
+        try {
+          event = JSON.parse(trimmed);
+        } catch (e) {
+          console.log('   📋 非JSON输出行:', trimmed.substring(0, 200));
+          return;
+        }
+        if (!event.type) {
+          // 旧格式：整行就是结果
+          finish(event);
+          return;
+        }
+        if (event.type === 'result' && !resolved) {
+          console.log(`   ✅ Python Agent返回结果${event.final ? '' : ' (模板画像，LLM画像将以更新推送)'}`);
+          finish({ ...event.result, profiles_pending: Boolean(event.profiles_pending) });
+          return;
+        }
+        if (onEvent) onEvent(event);
+      };
 
       python.stdout.on('data', (data) => {
-        output += data.toString();
+        const text = data.toString();
+        output += text;
+        buffer += text;
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.forEach(handleLine);
       });
 
       python.stderr.on('data', (data) => {
@@ -126,86 +190,33 @@ class OllamaSearxNGEmailDiscovery {
       });
 
       python.on('close', (code) => {
+        if (buffer) {
+          handleLine(buffer);
+          buffer = '';
+        }
+        if (resolved) {
+          if (code !== 0) {
+            console.error('   ⚠️ Python Agent在返回结果后异常退出:', code);
+          }
+          return;
+        }
+
         if (code !== 0) {
-          console.error('   ❌ Python脚本执行失败:', error);
-          resolve({
+          console.error('   ❌ Python脚本执行失败:', error.slice(-2000));
+          finish({
             success: false,
-            error: `Python agent failed: ${error}`,
+            error: `Python agent failed: ${error.slice(-2000)}`,
             code: code
           });
           return;
         }
 
-        try {
-          // API模式下应该只有纯JSON输出
-          console.log('   📋 Python Agent API模式输出长度:', output.length, '字符');
-          console.log('   📋 Python Agent 错误输出:', error || 'None');
-          
-          // 直接解析JSON（API模式下应该是纯JSON）
-          const cleanOutput = output.trim();
-          console.log('   🔍 解析纯JSON输出...');
-          
-          let jsonResult;
-          try {
-            jsonResult = JSON.parse(cleanOutput);
-            console.log('   ✅ API模式JSON解析成功!');
-          } catch (e) {
-            console.error('   ❌ API模式JSON解析失败:', e.message);
-            console.log('   📋 原始输出用于调试:');
-            console.log('=== RAW OUTPUT START ===');
-            console.log(cleanOutput);
-            console.log('=== RAW OUTPUT END ===');
-            
-            // 尝试从输出中找到JSON部分
-            const jsonStart = cleanOutput.indexOf('{');
-            const jsonEnd = cleanOutput.lastIndexOf('}') + 1;
-            
-            if (jsonStart !== -1 && jsonEnd > jsonStart) {
-              const jsonString = cleanOutput.substring(jsonStart, jsonEnd);
-              console.log('   🔄 尝试提取JSON部分:', jsonString.substring(0, 100) + '...');
-              try {
-                jsonResult = JSON.parse(jsonString);
-                console.log('   ✅ 提取的JSON解析成功!');
-              } catch (e2) {
-                resolve({
-                  success: false,
-                  error: 'Failed to parse JSON result',
-                  rawOutput: cleanOutput.substring(0, 2000),
-                  jsonParseError: e.message
-                });
-                return;
-              }
-            } else {
-              resolve({
-                success: false,
-                error: 'No JSON found in output',
-                rawOutput: cleanOutput.substring(0, 2000),
-                jsonParseError: e.message
-              });
-              return;
-            }
-          }
-
-          if (jsonResult) {
-            console.log(`   ✅ Python Agent执行成功`);
-            resolve(jsonResult);
-          } else {
-            console.error('   ❌ 未找到有效的JSON结果');
-            resolve({
-              success: false,
-              error: 'No valid JSON result found',
-              rawOutput: output.substring(0, 1000)
-            });
-          }
-
-        } catch (parseError) {
-          console.error('   ❌ 结果解析错误:', parseError.message);
-          resolve({
-            success: false,
-            error: `Result parsing failed: ${parseError.message}`,
-            rawOutput: output.substring(0, 1000)
-          });
-        }
+        console.error('   ❌ 未找到有效的JSON结果');
+        finish({
+          success: false,
+          error: 'No valid JSON result found',
+          rawOutput: output.substring(0, 1000)
+        });
       });
 
       // 移除超时限制 - 让Ollama + SearxNG有足够时间完成搜索
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+HedgedSearch 本地桩后端测试（不访问网络）
+    python -m pytest -q test_hedged_search.py
+"""
+
+import time
+import threading
+
+from HedgedSearch import HedgedSearch
+from URLUtils import canonical_url
+
+
+class StubBackend:
+    """按给定延迟返回固定结果（或抛出异常）的桩后端，记录启动时间"""
+
+    def __init__(self, name, delay=0.0, count=10, fail=False, host=None):
+        self.name = name
+        self.delay = delay
+        self.count = count
+        self.fail = fail
+        self.host = host or f'{name}.example.com'
+        self.started_at = None
+        self.finished = threading.Event()
+
+    def __call__(self, query, max_results):
+        self.started_at = time.time()
+        try:
+            time.sleep(self.delay)
+            if self.fail:
+                raise RuntimeError(f'{self.name} down')
+            return [{'url': f'https://{self.host}/{query}/{i}', 'title': self.name, 'content': ''}
+                    for i in range(self.count)]
+        finally:
+            self.finished.set()
+
+
+def hedged(*backends, hedge_delay=0.2, min_results=5, timeout=5):
+    return HedgedSearch([(backend.name, backend) for backend in backends],
+                        hedge_delay=hedge_delay, min_results=min_results, timeout=timeout)
+
+
+def test_next_backend_launched_only_after_hedge_delay():
+    slow = StubBackend('slow', delay=0.8)
+    fast = StubBackend('fast', delay=0.05)
+    search = hedged(slow, fast, hedge_delay=0.3)
+
+    started_at = time.time()
+    results, info = search.search('q')
+
+    assert fast.started_at - slow.started_at >= 0.3
+    assert fast.started_at - started_at < 0.5
+    assert info['launched'] == 2
+    assert info['winner'] == 'fast'
+    assert len(results) == 10
+
+
+def test_fast_primary_never_launches_hedge():
+    primary = StubBackend('primary', delay=0.05)
+    backup = StubBackend('backup')
+    results, info = hedged(primary, backup, hedge_delay=0.3).search('q')
+
+    assert info['winner'] == 'primary'
+    assert info['launched'] == 1
+    assert backup.started_at is None
+    assert {r['title'] for r in results} == {'primary'}
+
+
+def test_first_sufficient_response_wins():
+    slow = StubBackend('slow', delay=1.0)
+    medium = StubBackend('medium', delay=0.1)
+    quick = StubBackend('quick', delay=0.3)
+    search = hedged(slow, medium, quick, hedge_delay=0.05)
+
+    started_at = time.time()
+    results, info = search.search('q')
+
+    assert info['winner'] == 'medium'
+    assert time.time() - started_at < 0.9  # 不等待最慢的后端
+    assert results[0]['title'] == 'medium'
+    assert search.summary()['medium']['wins'] == 1
+
+
+def test_losing_backends_are_abandoned_and_ignored():
+    slow = StubBackend('slow', delay=0.6)
+    fast = StubBackend('fast', delay=0.05)
+    never = StubBackend('never')
+    search = hedged(slow, fast, never, hedge_delay=0.1)
+
+    results, info = search.search('q')
+
+    assert info['winner'] == 'fast'
+    assert info['abandoned'] == ['slow']
+    assert never.started_at is None  # 胜出后不再启动后续后端
+    # 被放弃的请求完成后，其结果不会出现在本次结果中
+    slow.finished.wait(2)
+    assert all(r['title'] == 'fast' for r in results)
+    stats = search.summary()
+    assert stats['slow']['abandoned'] == 1
+    assert stats['never']['launched'] == 0
+
+
+def test_insufficient_or_failed_response_falls_through():
+    broken = StubBackend('broken', delay=0.02, fail=True)
+    sparse = StubBackend('sparse', delay=0.02, count=2, host='shared.example.com')
+    full = StubBackend('full', delay=0.02, count=6, host='shared.example.com')
+    search = hedged(broken, sparse, full, hedge_delay=5)
+
+    started_at = time.time()
+    results, info = search.search('q')
+
+    # 失败和结果不足都立即启动下一个后端，而不是等满hedge_delay
+    assert time.time() - started_at < 1
+    assert info['launched'] == 3
+    assert info['winner'] == 'full'
+    assert set(info['responded']) == {'sparse', 'full'}
+    # 结果不足的响应仍然参与合并（与胜出者的URL重复时去重）
+    assert len(results) == 6
+    assert search.summary()['broken']['failures'] == 1
+
+
+def test_no_sufficient_backend_returns_merged_partial_results():
+    a = StubBackend('a', delay=0.02, count=2)
+    b = StubBackend('b', delay=0.02, count=1)
+    results, info = hedged(a, b, hedge_delay=0.05).search('q')
+
+    assert info['winner'] is None
+    assert len(results) == 3
+
+
+def test_canonical_url_merges_variants():
+    variants = [
+        'https://www.example.com/team/',
+        'http://example.com/team',
+        'HTTPS://WWW.EXAMPLE.COM/team?utm_source=x&utm_medium=y',
+        'https://example.com/team#contact',
+        'https://example.com/team/?gclid=abc&fbclid=def',
+    ]
+    assert len({canonical_url(url) for url in variants}) == 1
+    assert canonical_url('https://example.com/p?b=2&a=1') == \
+        canonical_url('https://example.com/p?a=1&b=2')
+    # 有意义的参数和不同路径不合并
+    assert canonical_url('https://example.com/p?id=1') != canonical_url('https://example.com/p?id=2')
+    assert canonical_url('https://example.com/team') != canonical_url('https://example.com/about')
+
+
+def test_merge_dedups_and_fills_missing_fields():
+    merged = HedgedSearch.merge([
+        [{'url': 'https://www.example.com/team/', 'title': 'Team', 'content': ''}],
+        [{'url': 'http://example.com/team?utm_campaign=z', 'title': 'Other', 'content': 'ceo@example.com'},
+         {'url': 'https://example.com/about', 'title': 'About', 'content': ''}],
+    ])
+    assert len(merged) == 2
+    assert merged[0]['title'] == 'Team'
+    assert merged[0]['content'] == 'ceo@example.com'
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Tests for the Modal Ollama proxy (create_app) against a fake Ollama
+The fake server is an httpx.MockTransport, so neither Modal nor Ollama is needed:
+    python -m pytest -q test_modal_ollama.py
+"""
+
+import asyncio
+import json
+
+import httpx
+
+from modal_ollama import create_app
+
+
+class FakeOllama:
+    """Minimal Ollama: /api/version (not ready for the first few probes), /api/tags, /api/pull, /api/generate"""
+
+    def __init__(self, not_ready_probes=0, pull_delay=0.1, models=()):
+        self.not_ready_probes = not_ready_probes
+        self.pull_delay = pull_delay
+        self.models = set(models)
+        self.calls = {'version': 0, 'tags': 0, 'pull': 0, 'generate': 0}
+        self.events = []  # order of calls, to check readiness before pulling
+
+    async def handler(self, request):
+        path = request.url.path
+        if path == '/api/version':
+            self.calls['version'] += 1
+            self.events.append('version')
+            if self.calls['version'] <= self.not_ready_probes:
+                return httpx.Response(503, json={'error': 'starting'})
+            return httpx.Response(200, json={'version': '0.0.0-fake'})
+        if path == '/api/tags':
+            self.calls['tags'] += 1
+            return httpx.Response(200, json={'models': [{'name': name} for name in sorted(self.models)]})
+        if path == '/api/pull':
+            self.calls['pull'] += 1
+            self.events.append('pull')
+            await asyncio.sleep(self.pull_delay)
+            self.models.add(json.loads(request.content)['model'])
+            return httpx.Response(200, json={'status': 'success'})
+        if path == '/api/generate':
+            self.calls['generate'] += 1
+            body = json.loads(request.content)
+            if body.get('stream'):
+                async def chunks():
+                    for word in ['hello', ' ', 'world']:
+                        yield (json.dumps({'response': word, 'done': False}) + '\n').encode()
+                    yield (json.dumps({'response': '', 'done': True}) + '\n').encode()
+                return httpx.Response(200, content=chunks(), headers={'content-type': 'application/x-ndjson'})
+            return httpx.Response(200, json={'model': body['model'], 'response': f"echo:{body['prompt']}", 'done': True})
+        return httpx.Response(404, json={'error': 'not found'})
+
+
+async def run_app(fake, scenario, **app_options):
+    """Start the proxy (running its startup hook) in front of the fake and run scenario(client, app)"""
+    app = create_app('http://fake-ollama', transport=httpx.MockTransport(fake.handler), **app_options)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://proxy') as client:
+            return await scenario(client, app)
+
+
+def test_model_pulled_once_for_concurrent_requests():
+    fake = FakeOllama(pull_delay=0.2)
+
+    async def scenario(client, app):
+        return await asyncio.gather(*[
+            client.post('/api/generate', json={'model': 'tiny', 'prompt': f'p{i}'}) for i in range(6)
+        ])
+
+    responses = asyncio.run(run_app(fake, scenario, preload_models=()))
+    assert [r.status_code for r in responses] == [200] * 6
+    assert sorted(r.json()['response'] for r in responses) == sorted(f'echo:p{i}' for i in range(6))
+    assert fake.calls['pull'] == 1
+    assert fake.calls['generate'] == 6
+
+
+def test_startup_waits_for_readiness_probe():
+    fake = FakeOllama(not_ready_probes=3)
+
+    async def scenario(client, app):
+        return app.state.backend.ready, (await client.get('/health')).json()
+
+    ready, health = asyncio.run(run_app(fake, scenario, preload_models=('tiny',)))
+    assert ready
+    assert health['status'] == 'ok'
+    assert fake.calls['version'] == 4
+    # the preload pull only happens once the server answered the probe
+    assert fake.events.index('pull') > fake.events.index('version') + 2
+    assert 'tiny:latest' in health['models']
+
+
+def test_startup_gives_up_when_never_ready():
+    fake = FakeOllama(not_ready_probes=10 ** 6)
+
+    async def scenario(client, app):
+        return app.state.backend.ready, (await client.get('/health')).json()
+
+    ready, health = asyncio.run(run_app(fake, scenario, preload_models=('tiny',), ready_timeout=0.6))
+    assert not ready
+    assert health['status'] == 'starting'
+    assert fake.calls['pull'] == 0
+
+
+def test_stream_relay_true_and_false():
+    fake = FakeOllama(models=('tiny:latest',))
+
+    async def scenario(client, app):
+        streamed = await client.post('/api/generate', json={'model': 'tiny', 'prompt': 'x', 'stream': True})
+        buffered = await client.post('/api/generate', json={'model': 'tiny', 'prompt': 'x', 'stream': False})
+        default = await client.post('/api/generate', json={'model': 'tiny', 'prompt': 'y'})
+        return streamed, buffered, default
+
+    streamed, buffered, default = asyncio.run(run_app(fake, scenario, preload_models=()))
+
+    assert streamed.status_code == 200
+    assert streamed.headers['content-type'].startswith('application/x-ndjson')
+    chunks = [json.loads(line) for line in streamed.text.splitlines()]
+    assert ''.join(chunk['response'] for chunk in chunks) == 'hello world'
+    assert chunks[-1]['done'] is True
+
+    assert buffered.status_code == 200
+    assert buffered.json() == {'model': 'tiny', 'response': 'echo:x', 'done': True}
+    # the endpoint has always defaulted to non-streaming
+    assert default.json()['response'] == 'echo:y'
+    assert fake.calls['pull'] == 0